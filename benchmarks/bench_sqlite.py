@@ -0,0 +1,253 @@
+"""Бенчмарк конкурентного чтения и записи в SQLite.
+
+Скрипт наполняет базу постами и запускает одновременно процессы-читатели
+(первая страница ленты и страница поста) и процессы-писатели (пост с
+комментарием в одной транзакции, как post_create и add_comment) в двух
+режимах:
+
+- default - настройки SQLite по умолчанию: журнал DELETE,
+  synchronous=FULL, транзакции BEGIN DEFERRED и новое соединение на
+  каждую операцию (CONN_MAX_AGE = 0);
+- tuned - настройки core/db/base.py: журнал WAL, synchronous=NORMAL,
+  mmap, кэш страниц, BEGIN IMMEDIATE и постоянные соединения.
+
+Для каждого режима печатаются операции в секунду, p50/p99 задержки и
+число ошибок "database is locked" у читателей и писателей.
+
+Пример:
+    python benchmarks/bench_sqlite.py --readers 8 --writers 2 \\
+        --duration 10 --output sqlite.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, 'yatube'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+# Кэш в памяти процесса, чтобы замерять только базу данных
+os.environ['CACHE_BACKEND'] = 'locmem'
+os.environ['TASKS_BACKEND'] = 'immediate'
+
+MODES = {
+    'default': {
+        'pragmas': {
+            'journal_mode': 'DELETE',
+            'synchronous': 'FULL',
+            'mmap_size': 0,
+            'cache_size': -2000,
+            'temp_store': 'DEFAULT',
+        },
+        'transaction_mode': 'DEFERRED',
+        'conn_max_age': 0,
+    },
+    'tuned': {
+        'pragmas': {},
+        'transaction_mode': 'IMMEDIATE',
+        'conn_max_age': None,
+    },
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--db', default=os.path.join(
+        tempfile.gettempdir(), 'yatube_bench_sqlite.sqlite3'))
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--posts', type=int, default=20000)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--duration', type=float, default=10,
+                        help='длительность замера в каждом режиме, секунд')
+    parser.add_argument('--modes', nargs='+', choices=list(MODES),
+                        default=list(MODES))
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='файл для результатов в JSON')
+    return parser.parse_args()
+
+
+def setup_django(db_path, mode):
+    """Функция setup_django направляет соединение default на файл базы
+    и настраивает его по режиму mode."""
+    import django
+
+    django.setup()
+    from django.db import connections
+
+    settings_dict = connections['default'].settings_dict
+    settings_dict['NAME'] = db_path
+    settings_dict['CONN_MAX_AGE'] = MODES[mode]['conn_max_age']
+    settings_dict['OPTIONS'] = {
+        'pragmas': MODES[mode]['pragmas'],
+        'transaction_mode': MODES[mode]['transaction_mode'],
+    }
+
+
+def seed(args):
+    """Функция seed создает пользователей и посты через bulk_create и
+    переводит базу в журнал DELETE, чтобы файл можно было копировать."""
+    from django.contrib.auth import get_user_model
+    from django.core.management import call_command
+    from django.db import connection, transaction
+
+    from posts.models import Post
+
+    User = get_user_model()
+    call_command('migrate', verbosity=0)
+    with transaction.atomic():
+        User.objects.bulk_create(
+            User(username=f'bench_user_{i}') for i in range(args.users))
+        authors = list(User.objects.values_list('pk', flat=True))
+        rng = random.Random(args.seed)
+        Post.objects.bulk_create(
+            (Post(author_id=rng.choice(authors), text=f'Пост номер {i}')
+             for i in range(args.posts)), batch_size=500)
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA journal_mode = DELETE')
+    connection.close()
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def read(rng, post_ids):
+    """Операция читателя: первая страница ленты и страница поста."""
+    from posts.common import index_feed, post_comments_list
+    from posts.models import Post
+
+    list(index_feed()[:10])
+    post_id = rng.choice(post_ids)
+    Post.objects.select_related('author', 'group').get(pk=post_id)
+    list(post_comments_list(post_id)[:20])
+
+
+def write(rng, post_ids, author_ids):
+    """Операция писателя: пост и комментарий в одной транзакции."""
+    from django.db import transaction
+
+    from posts.models import Comment, Post
+
+    with transaction.atomic():
+        post = Post.objects.create(author_id=rng.choice(author_ids),
+                                   text='Новый пост')
+        Comment.objects.create(post_id=rng.choice(post_ids),
+                               author_id=post.author_id,
+                               text='Новый комментарий')
+
+
+def run_client(role, number, args, mode, start, results):
+    """Процесс-клиент: до истечения --duration выполняет операции роли
+    role и отдает в results задержки и число ошибок блокировки."""
+    setup_django(args.db, mode)
+    from django.contrib.auth import get_user_model
+    from django.db import OperationalError, close_old_connections, connection
+
+    from posts.models import Post
+
+    rng = random.Random(args.seed + number)
+    post_ids = list(Post.objects.values_list('pk', flat=True)[:5000])
+    author_ids = list(get_user_model().objects.values_list('pk', flat=True))
+    connection.close()
+    while time.time() < start:
+        time.sleep(0.001)
+    deadline = start + args.duration
+    latencies, errors = [], 0
+    while time.time() < deadline:
+        # Как в начале запроса: соединение закрывается при CONN_MAX_AGE = 0
+        close_old_connections()
+        started = time.perf_counter()
+        try:
+            if role == 'reader':
+                read(rng, post_ids)
+            else:
+                write(rng, post_ids, author_ids)
+        except OperationalError:
+            errors += 1
+            continue
+        finally:
+            close_old_connections()
+        latencies.append(time.perf_counter() - started)
+    results.put((role, latencies, errors))
+
+
+def measure(args, mode):
+    """Функция measure копирует засеянную базу, запускает читателей и
+    писателей в режиме mode и собирает статистику по ролям."""
+    db_path = f'{args.db}.{mode}'
+    for suffix in ('', '-wal', '-shm', '-journal'):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+    shutil.copy(args.db, db_path)
+    run_args = argparse.Namespace(**{**vars(args), 'db': db_path})
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    start = time.time() + 2
+    roles = ['reader'] * args.readers + ['writer'] * args.writers
+    processes = [
+        context.Process(target=run_client,
+                        args=(role, number, run_args, mode, start, results))
+        for number, role in enumerate(roles)
+    ]
+    for process in processes:
+        process.start()
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    report = {}
+    for role in ('reader', 'writer'):
+        latencies = [value for name, values, _ in collected if name == role
+                     for value in values]
+        errors = sum(count for name, _, count in collected if name == role)
+        report[role] = {
+            'ops_per_second': round(len(latencies) / args.duration, 1),
+            'p50_ms': round(percentile(latencies, 0.5) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+            'locked_errors': errors,
+        }
+    return report
+
+
+def main():
+    args = parse_args()
+    for suffix in ('', '-wal', '-shm', '-journal'):
+        if os.path.exists(args.db + suffix):
+            os.remove(args.db + suffix)
+    setup_django(args.db, 'default')
+    started = time.perf_counter()
+    seed(args)
+    print(f'Данные созданы за {time.perf_counter() - started:.1f} с')
+    results = {}
+    for mode in args.modes:
+        results[mode] = measure(args, mode)
+        for role, stats in results[mode].items():
+            print(f"{mode:8} {role:7} {stats['ops_per_second']:9.1f} op/s  "
+                  f"p50 {stats['p50_ms']:8.2f} ms  "
+                  f"p99 {stats['p99_ms']:8.2f} ms  "
+                  f"locked {stats['locked_errors']}")
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({
+                'meta': {
+                    'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                    'readers': args.readers,
+                    'writers': args.writers,
+                    'duration': args.duration,
+                    'posts': args.posts,
+                },
+                'results': results,
+            }, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,348 @@
+"""Нагрузочный бенчмарк view-функций приложения Posts.
+
+Скрипт наполняет отдельную базу SQLite реалистичным объемом данных
+(пользователи и группы через mixer, тексты постов через Faker, степенное
+распределение подписчиков, часть постов с картинками), прогоняет страницы
+index, group_posts, profile, post_detail и follow_index через тестовый
+клиент Django и сохраняет p50/p99 задержки, число запросов к БД на страницу
+и пропускную способность в JSON для сравнения прогонов.
+
+Пример:
+    python benchmarks/bench_views.py --db /tmp/bench.sqlite3 \\
+        --posts 2000000 --users 20000 --output results.json
+    python benchmarks/bench_views.py --db /tmp/bench.sqlite3 --no-seed \\
+        --compare results.json
+"""
+import argparse
+import io
+import itertools
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, 'yatube'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+# Кэш в памяти процесса: ленты, списки групп и популярных постов из общего
+# кэша сайта не относятся к базе бенчмарка, а --cold очищает кэш
+os.environ['CACHE_BACKEND'] = 'locmem'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--db', default=os.path.join(
+        tempfile.gettempdir(), 'yatube_bench.sqlite3'),
+        help='файл базы для бенчмарка (переиспользуется с --no-seed)')
+    parser.add_argument('--no-seed', action='store_true',
+                        help='не наполнять базу, использовать имеющуюся')
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--groups', type=int, default=50)
+    parser.add_argument('--posts', type=int, default=200000)
+    parser.add_argument('--comments', type=int, default=200000)
+    parser.add_argument('--follows-per-user', type=int, default=30)
+    parser.add_argument('--image-ratio', type=float, default=0.2,
+                        help='доля постов с картинкой')
+    parser.add_argument('--requests', type=int, default=200,
+                        help='число замеров на каждый сценарий')
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--cold', action='store_true',
+                        help='очищать кэш перед каждым запросом')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='файл для результатов в JSON')
+    parser.add_argument('--compare', help='JSON прошлого прогона')
+    return parser.parse_args()
+
+
+def setup_django(db_path):
+    """Функция setup_django направляет соединение default на файл базы
+    бенчмарка и применяет к нему миграции."""
+    import django
+    from django.conf import settings
+
+    django.setup()
+    from django.core.management import call_command
+    from django.db import connections
+
+    connections['default'].settings_dict['NAME'] = db_path
+    settings.MEDIA_ROOT = os.path.join(os.path.dirname(db_path),
+                                       'yatube_bench_media')
+    call_command('migrate', verbosity=0)
+
+
+@contextmanager
+def explicit_pub_date():
+    """Отключает auto_now_add у Post.pub_date, чтобы bulk_create сохранил
+    заданные даты публикации."""
+    from posts.models import Post
+
+    field = Post._meta.get_field('pub_date')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def zipf_weights(size):
+    """Функция zipf_weights возвращает накопленные веса степенного
+    распределения: элемент с рангом r выбирается с весом 1 / r."""
+    return list(itertools.accumulate(1 / rank for rank in range(1, size + 1)))
+
+
+def zipf_choices(rng, population, count, cum_weights=None):
+    """Функция zipf_choices выбирает count элементов population со
+    степенным распределением: первые элементы выбираются гораздо чаще."""
+    cum_weights = cum_weights or zipf_weights(len(population))
+    return rng.choices(population, cum_weights=cum_weights, k=count)
+
+
+def make_images(count):
+    """Функция make_images сохраняет count небольших JPEG в MEDIA_ROOT и
+    возвращает их имена для поля Post.image."""
+    from django.core.files.base import ContentFile
+    from django.core.files.storage import default_storage
+    from PIL import Image
+
+    names = []
+    for i in range(count):
+        buffer = io.BytesIO()
+        Image.new('RGB', (1600, 900), (i * 40 % 256, 90, 160)).save(
+            buffer, 'JPEG')
+        names.append(default_storage.save(f'posts/bench_{i}.jpg',
+                                          ContentFile(buffer.getvalue())))
+    return names
+
+
+def seed(args):
+    """Функция seed наполняет базу данными заданного объема. Вызывается в
+    одной транзакции, чтобы не фиксировать каждую вставку отдельно."""
+    from django.conf import settings
+    from django.contrib.auth import get_user_model
+    from django.core.management import call_command
+    from django.db import connection
+    from django.utils import timezone
+    from faker import Faker
+    from mixer.backend.django import mixer
+
+    from posts.models import Comment, Follow, Group, Post
+
+    User = get_user_model()
+    rng = random.Random(args.seed)
+    fake = Faker('ru_RU')
+    fake.seed_instance(args.seed)
+    batch = 5000
+
+    users = mixer.cycle(args.users).blend(
+        User, username=mixer.sequence('bench_user_{0}'),
+        first_name=mixer.FAKE, last_name=mixer.FAKE)
+    groups = mixer.cycle(args.groups).blend(
+        Group, slug=mixer.sequence('bench-group-{0}'))
+    user_ids = [user.pk for user in users]
+    group_ids = [group.pk for group in groups] + [None]
+    images = make_images(8)
+    texts = [fake.text(300) for _ in range(1000)]
+    now = timezone.now()
+
+    authors = zipf_choices(rng, user_ids, args.posts)
+    with explicit_pub_date():
+        for start in range(0, args.posts, batch):
+            Post.objects.bulk_create([
+                Post(author_id=authors[i], group_id=rng.choice(group_ids),
+                     text=rng.choice(texts),
+                     pub_date=now - timedelta(seconds=args.posts - i),
+                     image=(rng.choice(images)
+                            if rng.random() < args.image_ratio else ''))
+                for i in range(start, min(start + batch, args.posts))
+            ])
+
+    follows = set()
+    user_weights = zipf_weights(len(user_ids))
+    for user_id in user_ids:
+        for author_id in zipf_choices(rng, user_ids, args.follows_per_user,
+                                      user_weights):
+            if author_id != user_id:
+                follows.add((user_id, author_id))
+    Follow.objects.bulk_create(
+        [Follow(user_id=user_id, author_id=author_id)
+         for user_id, author_id in follows])
+
+    post_ids = list(Post.objects.order_by('-pub_date').values_list(
+        'pk', flat=True))
+    commented = zipf_choices(rng, post_ids, args.comments)
+    for start in range(0, args.comments, batch):
+        Comment.objects.bulk_create([
+            Comment(post_id=commented[i], author_id=rng.choice(user_ids),
+                    text=rng.choice(texts)[:120])
+            for i in range(start, min(start + batch, args.comments))
+        ])
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'INSERT OR IGNORE INTO posts_timelineentry '
+            '(user_id, post_id, pub_date) '
+            'SELECT f.user_id, p.id, p.pub_date FROM posts_follow f '
+            'JOIN posts_post p ON p.author_id = f.author_id '
+            'WHERE f.author_id IN (SELECT author_id FROM posts_follow '
+            'GROUP BY author_id HAVING COUNT(*) < %s)',
+            [settings.TIMELINE_FANOUT_LIMIT])
+    call_command('reconcile_counters', stdout=io.StringIO())
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def scenarios():
+    """Функция scenarios возвращает сценарии замера: имя, URL и
+    пользователя, от имени которого выполняется запрос (None - гость)."""
+    from django.contrib.auth import get_user_model
+    from django.db.models import Count
+    from django.urls import reverse
+
+    from posts.models import Group, Post
+
+    User = get_user_model()
+    popular = User.objects.annotate(n=Count('posts')).order_by('-n').first()
+    typical = User.objects.annotate(n=Count('posts')).filter(
+        n__gt=0).order_by('n').first()
+    reader = User.objects.annotate(n=Count('follower')).order_by(
+        '-n').first()
+    group = Group.objects.annotate(n=Count('posts')).order_by('-n').first()
+    post = Post.objects.order_by('-comments_count').first()
+    deep_page = max(Post.objects.count() // 10 // 2, 1)
+    return [
+        ('index', reverse('posts:index'), None),
+        ('index_deep_page', reverse('posts:index') + f'?page={deep_page}',
+         None),
+        ('group_posts', reverse('posts:group_list', args=[group.slug]),
+         None),
+        ('profile_popular', reverse('posts:profile', args=[popular]), None),
+        ('profile_typical', reverse('posts:profile', args=[typical]), None),
+        ('post_detail', reverse('posts:post_detail', args=[post.pk]), None),
+        ('follow_index', reverse('posts:follow_index'), reader),
+    ]
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def measure(url, user, args):
+    """Функция measure выполняет запросы к url и возвращает статистику
+    задержек и числа запросов к БД."""
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+
+    client = Client()
+    if user is not None:
+        client.force_login(user)
+    for _ in range(args.warmup):
+        client.get(url)
+    latencies, queries = [], []
+    started = time.perf_counter()
+    for _ in range(args.requests):
+        if args.cold:
+            cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            request_started = time.perf_counter()
+            response = client.get(url)
+            latencies.append(time.perf_counter() - request_started)
+        assert response.status_code == 200, (url, response.status_code)
+        queries.append(len(captured))
+    elapsed = time.perf_counter() - started
+    return {
+        'url': url,
+        'requests': args.requests,
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'mean_ms': round(statistics.mean(latencies) * 1000, 3),
+        'queries_per_request': round(statistics.mean(queries), 2),
+        'max_queries': max(queries),
+        'throughput_rps': round(args.requests / elapsed, 2),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR,
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, previous_path):
+    """Функция compare печатает изменение p50/p99 и числа запросов
+    относительно прошлого прогона."""
+    with open(previous_path) as file:
+        previous = json.load(file)['results']
+    print(f'\nСравнение с {previous_path}:')
+    for name, current in results.items():
+        old = previous.get(name)
+        if old is None:
+            continue
+        deltas = ', '.join(
+            f'{metric} {old[metric]} -> {current[metric]}'
+            for metric in ('p50_ms', 'p99_ms', 'queries_per_request'))
+        print(f'  {name}: {deltas}')
+
+
+def main():
+    args = parse_args()
+    if not args.no_seed and os.path.exists(args.db):
+        os.remove(args.db)
+    setup_django(args.db)
+    from django.conf import settings
+    from django.contrib.auth import get_user_model
+
+    if not args.no_seed:
+        from django.db import transaction
+
+        started = time.perf_counter()
+        with transaction.atomic():
+            seed(args)
+        print(f'Данные созданы за {time.perf_counter() - started:.1f} с')
+
+    results = {}
+    for name, url, user in scenarios():
+        results[name] = measure(url, user, args)
+        stats = results[name]
+        print(f"{name:18} p50 {stats['p50_ms']:8.2f} ms  "
+              f"p99 {stats['p99_ms']:8.2f} ms  "
+              f"queries {stats['queries_per_request']:5}  "
+              f"{stats['throughput_rps']:8.1f} rps")
+
+    from posts.models import Comment, Follow, Post
+    report = {
+        'meta': {
+            'revision': git_revision(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'cold_cache': args.cold,
+            'cache_backend': settings.CACHES['default']['BACKEND'],
+            'volumes': {
+                'users': get_user_model().objects.count(),
+                'posts': Post.objects.count(),
+                'comments': Comment.objects.count(),
+                'follows': Follow.objects.count(),
+            },
+        },
+        'results': results,
+    }
+    if args.compare:
+        compare(results, args.compare)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
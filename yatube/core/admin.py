@@ -0,0 +1,12 @@
+from django.contrib import admin
+
+from .models import Task
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    """Класс TaskAdmin показывает фоновые задачи: ожидающие, выполняемые и
+    упавшие после всех попыток."""
+    list_display = ('pk', 'name', 'status', 'attempts', 'run_at', 'created',)
+    list_filter = ('status', 'name',)
+    readonly_fields = ('created',)
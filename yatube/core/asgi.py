@@ -0,0 +1,141 @@
+import asyncio
+import io
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+def build_environ(scope, body):
+    """Функция build_environ переводит ASGI scope HTTP-запроса в WSGI
+    environ (PEP 3333)."""
+    script_name = scope.get('root_path', '')
+    path = scope['path']
+    if script_name and path.startswith(script_name):
+        path = path[len(script_name):]
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': script_name.encode('utf-8').decode('latin-1'),
+        'PATH_INFO': path.encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name not in ('CONTENT_LENGTH', 'CONTENT_TYPE'):
+            name = f'HTTP_{name}'
+        if name in environ:
+            value = f'{environ[name]},{value}'
+        environ[name] = value
+    return environ
+
+
+class ASGIHandler:
+    """ASGI-приложение поверх WSGI-обработчика Django. Цикл событий
+    только принимает запросы и отдает ответы, а каждый запрос целиком
+    (представление, итерация тела ответа и его закрытие) выполняется в
+    одном потоке из пула max_workers: соединения с БД в Django привязаны к
+    потоку. Медленный запрос не блокирует прием остальных, потоковые ответы
+    отдаются по частям через очередь из BUFFER_SIZE частей."""
+    BUFFER_SIZE = 16
+
+    def __init__(self, wsgi_application, max_workers):
+        self.wsgi_application = wsgi_application
+        self.executor = ThreadPoolExecutor(max_workers=max_workers,
+                                           thread_name_prefix='asgi')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            raise ValueError(f"Unsupported ASGI scope type {scope['type']}")
+        body = await self.read_body(receive)
+        if body is None:
+            return
+        loop = asyncio.get_event_loop()
+        queue = asyncio.Queue(maxsize=self.BUFFER_SIZE)
+        disconnected = threading.Event()
+        worker = loop.run_in_executor(
+            self.executor, self.respond, build_environ(scope, body), queue,
+            loop, disconnected)
+        try:
+            while True:
+                message = await queue.get()
+                if message is None:
+                    break
+                await send(message)
+        except BaseException:
+            # Клиент отключился: останавливаем итерацию ответа в потоке
+            disconnected.set()
+            while await queue.get() is not None:
+                pass
+            raise
+        finally:
+            await worker
+
+    def respond(self, environ, queue, loop, disconnected):
+        """Выполняет WSGI-приложение и передает сообщения ответа в очередь
+        цикла событий. Последнее сообщение - None."""
+        def put(message):
+            asyncio.run_coroutine_threadsafe(
+                queue.put(message), loop).result()
+
+        def start_response(status, headers, exc_info=None):
+            put({
+                'type': 'http.response.start',
+                'status': int(status.split(' ', 1)[0]),
+                'headers': [(name.lower().encode('latin-1'),
+                             value.encode('latin-1'))
+                            for name, value in headers],
+            })
+
+        try:
+            response = self.wsgi_application(environ, start_response)
+            try:
+                for chunk in response:
+                    if disconnected.is_set():
+                        return
+                    if chunk:
+                        put({'type': 'http.response.body', 'body': chunk,
+                             'more_body': True})
+                put({'type': 'http.response.body', 'body': b''})
+            finally:
+                if hasattr(response, 'close'):
+                    response.close()
+        finally:
+            put(None)
+
+    @staticmethod
+    async def read_body(receive):
+        """Собирает тело запроса. Возвращает None, если клиент отключился."""
+        body = []
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return None
+            body.append(message.get('body', b''))
+            if not message.get('more_body', False):
+                return b''.join(body)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
@@ -0,0 +1,175 @@
+"""Кэш-бэкенд на SQLite.
+
+Все процессы сервера открывают один и тот же файл базы, поэтому фрагменты
+страниц, версии лент и сессии общие для всех воркеров, а для работы не нужен
+внешний сервис. Целые числа хранятся как INTEGER, чтобы incr()/decr()
+выполнялись атомарно одним UPDATE, остальные значения — сериализованными
+pickle.
+"""
+import itertools
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)'
+)
+
+
+class SQLiteCache(BaseCache):
+    """Кэш в файле SQLite, указанном в LOCATION. Соединение открывается
+    одно на поток и работает в режиме WAL, чтобы чтение не блокировалось
+    записью из других процессов. COUNT(*) обходит всю таблицу, поэтому
+    размер кэша проверяется не при каждой записи, а раз в CULL_EVERY
+    записей процесса (OPTIONS, по умолчанию 100): между проверками в кэше
+    может оказаться чуть больше MAX_ENTRIES ключей."""
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = os.path.abspath(location)
+        self._busy_timeout = options.get('BUSY_TIMEOUT', 5)
+        self._cull_every = int(options.get('CULL_EVERY', 100))
+        self._writes = itertools.count(1)
+        self._local = threading.local()
+
+    @property
+    def _db(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            os.makedirs(os.path.dirname(self._path), exist_ok=True)
+            connection = sqlite3.connect(self._path,
+                                         timeout=self._busy_timeout,
+                                         isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(SCHEMA)
+            self._local.connection = connection
+        return connection
+
+    @contextmanager
+    def _transaction(self):
+        """Выполняет блок в транзакции с блокировкой на запись."""
+        self._db.execute('BEGIN IMMEDIATE')
+        try:
+            yield self._db
+        except BaseException:
+            self._db.execute('ROLLBACK')
+            raise
+        self._db.execute('COMMIT')
+
+    def _encode(self, value):
+        if type(value) is int:
+            return value
+        return pickle.dumps(value, self.pickle_protocol)
+
+    @staticmethod
+    def _decode(value):
+        if isinstance(value, int):
+            return value
+        return pickle.loads(value)
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _write(self, key, value, timeout, replace):
+        verb = 'REPLACE' if replace else 'IGNORE'
+        with self._transaction():
+            if not replace:
+                self._db.execute(
+                    'DELETE FROM cache WHERE key = ? AND expires <= ?',
+                    (key, time.time()))
+            cursor = self._db.execute(
+                f'INSERT OR {verb} INTO cache (key, value, expires) '
+                'VALUES (?, ?, ?)',
+                (key, self._encode(value), self.get_backend_timeout(timeout)))
+        self._cull()
+        return cursor.rowcount > 0
+
+    def _cull(self):
+        if next(self._writes) % self._cull_every:
+            return
+        count, = self._db.execute('SELECT COUNT(*) FROM cache').fetchone()
+        if count <= self._max_entries:
+            return
+        with self._transaction():
+            self._db.execute('DELETE FROM cache WHERE expires <= ?',
+                             (time.time(),))
+            if self._cull_frequency == 0:
+                self._db.execute('DELETE FROM cache')
+                return
+            self._db.execute(
+                'DELETE FROM cache WHERE rowid IN (SELECT rowid FROM cache '
+                'ORDER BY rowid LIMIT ?)', (count // self._cull_frequency,))
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._write(self._key(key, version), value, timeout,
+                           replace=False)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._write(self._key(key, version), value, timeout, replace=True)
+
+    def get(self, key, default=None, version=None):
+        row = self._db.execute(
+            'SELECT value FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self._key(key, version), time.time())).fetchone()
+        return default if row is None else self._decode(row[0])
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        if not keys:
+            return {}
+        placeholders = ', '.join('?' * len(keys))
+        rows = self._db.execute(
+            f'SELECT key, value FROM cache WHERE key IN ({placeholders}) '
+            'AND (expires IS NULL OR expires > ?)',
+            (*keys, time.time()))
+        return {keys[key]: self._decode(value) for key, value in rows}
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._transaction():
+            cursor = self._db.execute(
+                'UPDATE cache SET expires = ? WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (self.get_backend_timeout(timeout), self._key(key, version),
+                 time.time()))
+        return cursor.rowcount > 0
+
+    def delete(self, key, version=None):
+        with self._transaction():
+            self._db.execute('DELETE FROM cache WHERE key = ?',
+                             (self._key(key, version),))
+
+    def has_key(self, key, version=None):
+        return self.get(key, self, version) is not self
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        with self._transaction():
+            self._db.execute(
+                "UPDATE cache SET value = value + ? WHERE key = ? "
+                "AND typeof(value) = 'integer' "
+                "AND (expires IS NULL OR expires > ?)",
+                (delta, key, time.time()))
+            row = self._db.execute(
+                "SELECT value FROM cache WHERE key = ? "
+                "AND typeof(value) = 'integer' "
+                "AND (expires IS NULL OR expires > ?)",
+                (key, time.time())).fetchone()
+        if row is None:
+            raise ValueError(f"Key '{key}' not found")
+        return row[0]
+
+    def clear(self):
+        with self._transaction():
+            self._db.execute('DELETE FROM cache')
@@ -0,0 +1,61 @@
+import time
+from contextlib import contextmanager
+
+from django.core.cache import cache
+
+LOCK_SUFFIX = ':lock'
+# Изменение значения занимает миллисекунды: дольше блокировку держит
+# только упавший процесс
+LOCK_TIMEOUT = 5
+LOCK_WAIT = 1.0
+EXPIRES = 'expires'
+
+
+@contextmanager
+def cache_lock(key, wait=LOCK_WAIT):
+    """Контекст блокировки key, общей для всех процессов: отдает True,
+    если блокировку удалось получить за wait секунд, иначе False."""
+    lock = key + LOCK_SUFFIX
+    deadline = time.monotonic() + wait
+    while not cache.add(lock, 1, LOCK_TIMEOUT):
+        if time.monotonic() > deadline:
+            yield False
+            return
+        time.sleep(0.005)
+    try:
+        yield True
+    finally:
+        cache.delete(lock)
+
+
+def store_state(key, state, timeout):
+    """Функция store_state кладет значение state в общий кэш на timeout
+    секунд и запоминает в нем срок хранения: изменения на месте через
+    locked_state его не продлевают."""
+    state[EXPIRES] = time.time() + timeout
+    cache.set(key, state, timeout)
+    return state
+
+
+@contextmanager
+def locked_state(key, timeout):
+    """Контекст для изменения значения key в общем кэше на месте: отдает
+    значение (None, если его нет) под блокировкой и сохраняет его после
+    выхода до срока, заданного в store_state, но не дольше timeout
+    секунд. Если блокировку получить не удалось, значение удаляется, чтобы
+    его построили заново."""
+    with cache_lock(key) as locked:
+        if not locked:
+            cache.delete(key)
+            yield None
+            return
+        state = cache.get(key)
+        yield state
+        if state is None:
+            return
+        if EXPIRES in state:
+            timeout = min(timeout, state[EXPIRES] - time.time())
+        if timeout > 0:
+            cache.set(key, state, timeout)
+        else:
+            cache.delete(key)
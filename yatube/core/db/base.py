@@ -0,0 +1,49 @@
+"""Бэкенд БД SQLite с настройками для продакшена.
+
+Поверх стандартного бэкенда django.db.backends.sqlite3 каждое новое
+соединение настраивается PRAGMA из OPTIONS['pragmas'] (по умолчанию
+PRAGMAS: журнал WAL, synchronous=NORMAL, mmap, размер кэша страниц и
+ожидание блокировки), а транзакции atomic() начинаются с
+BEGIN OPTIONS['transaction_mode'].
+
+С журналом WAL читатели не блокируются писателем. BEGIN IMMEDIATE сразу
+берет блокировку на запись: транзакция, начатая как чтение (BEGIN DEFERRED),
+не может дождаться писателя по busy_timeout и сразу падает с
+"database is locked" при попытке записи.
+"""
+from django.db.backends.sqlite3 import base
+
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    # Отрицательное значение - размер в КиБ, а не в страницах
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        # Собственные параметры бэкенда не передаются в sqlite3.connect()
+        self.pragmas = {**PRAGMAS, **kwargs.pop('pragmas', {})}
+        self.transaction_mode = kwargs.pop(
+            'transaction_mode', 'IMMEDIATE').upper()
+        if self.transaction_mode not in TRANSACTION_MODES:
+            raise ValueError(
+                f'transaction_mode must be one of {TRANSACTION_MODES}')
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            if value is not None:
+                connection.execute(f'PRAGMA {name} = {value}')
+        return connection
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute(f'BEGIN {self.transaction_mode}')
@@ -0,0 +1,120 @@
+"""Чтение лент с реплики и "чтение своих записей".
+
+Роутер PrimaryReplicaRouter направляет все записи в основную базу
+(default), а чтения - на реплику REPLICA_DATABASE только внутри
+представлений, помеченных декоратором replica_reads (ленты постов).
+Остальные представления читают основную базу, чтобы не видеть устаревших
+данных там, где это заметно: страница поста, формы, подписки.
+
+Реплика отстает от основной базы, поэтому запрос, который что-то записал,
+до конца читает основную базу, а ответ на него ставит cookie
+REPLICA_STICKY_COOKIE: следующие REPLICA_STICKY_SECONDS секунд
+пользователь читает основную базу и видит свой пост, комментарий или
+подписку сразу после редиректа.
+
+Страницы и фрагменты, прочитанные с реплики, кэшируются под отдельными
+ключами и не дольше REPLICA_CACHE_TIMEOUT секунд: отставшая реплика
+может отдать данные старше текущей версии лент.
+"""
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Чтения текущего запроса можно отдать реплике
+_replica_allowed = ContextVar('replica_allowed', default=False)
+# Пользователь недавно писал или запрос уже записал в основную базу
+_primary_pinned = ContextVar('primary_pinned', default=False)
+# Запрос записал в основную базу
+_wrote = ContextVar('wrote', default=False)
+
+
+def replica_alias():
+    """Функция replica_alias возвращает псевдоним реплики или None, если
+    реплика не настроена или указывает на основную базу. Так бывает в
+    тестах, где реплика - зеркало тестовой основной базы (TEST['MIRROR']):
+    чтения идут в основную базу, потому что отдельное соединение не видит
+    незафиксированных данных транзакции теста."""
+    alias = settings.REPLICA_DATABASE
+    if alias not in connections.databases:
+        return None
+    if connections.databases[alias]['NAME'] == (
+            connections.databases[DEFAULT_DB_ALIAS]['NAME']):
+        return None
+    return alias
+
+
+def read_alias():
+    """Функция read_alias возвращает базу для чтения в текущем запросе."""
+    alias = replica_alias()
+    if alias and _replica_allowed.get() and not _primary_pinned.get():
+        return alias
+    return DEFAULT_DB_ALIAS
+
+
+def read_cache_timeout(timeout):
+    """Функция read_cache_timeout ограничивает время жизни в кэше данных,
+    прочитанных в текущем запросе: с реплики - REPLICA_CACHE_TIMEOUT
+    секундами."""
+    if read_alias() == DEFAULT_DB_ALIAS:
+        return timeout
+    return min(timeout, settings.REPLICA_CACHE_TIMEOUT)
+
+
+def pin_primary():
+    """Функция pin_primary переключает чтения до конца запроса на
+    основную базу и помечает запрос как записавший."""
+    _primary_pinned.set(True)
+    _wrote.set(True)
+
+
+def replica_reads(view):
+    """Декоратор replica_reads разрешает представлению читать реплику."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        token = _replica_allowed.set(True)
+        try:
+            return view(*args, **kwargs)
+        finally:
+            _replica_allowed.reset(token)
+    return wrapper
+
+
+class request_scope:
+    """Контекст запроса: pinned - пользователь недавно писал. После выхода
+    атрибут wrote показывает, писал ли запрос в основную базу. Значения
+    сбрасываются, поэтому потоки пула не переносят их между запросами."""
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+    def __enter__(self):
+        self._tokens = (_primary_pinned.set(self.pinned), _wrote.set(False))
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.wrote = _wrote.get()
+        pinned_token, wrote_token = self._tokens
+        _primary_pinned.reset(pinned_token)
+        _wrote.reset(wrote_token)
+
+
+class PrimaryReplicaRouter:
+    """Роутер основной базы и реплики (см. описание модуля)."""
+
+    def db_for_read(self, model, **hints):
+        return read_alias()
+
+    def db_for_write(self, model, **hints):
+        pin_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплика - копия основной базы, объекты из них связывать можно
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Схема реплики приходит из основной базы вместе с данными
+        return db != settings.REPLICA_DATABASE
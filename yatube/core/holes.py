@@ -0,0 +1,50 @@
+import base64
+import json
+import re
+
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+# Метка дыры в закэшированной странице. Пользовательский текст в шаблонах
+# экранируется, поэтому метка может появиться только из тега {% hole %}
+HOLE_RE = re.compile(r'<!--hole:([A-Za-z0-9_-]+=*)-->')
+
+# Зарегистрированные дыры: имя -> (шаблон, функция контекста)
+HOLES = {}
+
+
+def register_hole(name, template, get_context=None):
+    """Функция register_hole регистрирует дыру name - часть страницы,
+    которая зависит от пользователя и рисуется шаблоном template на каждый
+    запрос. get_context(request, **kwargs) возвращает контекст шаблона, по
+    умолчанию им служат сами kwargs."""
+    HOLES[name] = (template, get_context)
+
+
+def render_hole(request, name, kwargs):
+    """Функция render_hole рисует дыру name для пользователя запроса."""
+    template, get_context = HOLES[name]
+    context = get_context(request, **kwargs) if get_context else kwargs
+    return render_to_string(template, context, request)
+
+
+def hole_marker(name, kwargs):
+    """Функция hole_marker возвращает метку дыры для закэшированной
+    страницы. Параметры дыры хранятся в самой метке, поэтому они должны
+    сериализоваться в JSON: имена, id, строки."""
+    data = json.dumps([name, kwargs], separators=(',', ':'))
+    encoded = base64.urlsafe_b64encode(data.encode()).decode()
+    return mark_safe(f'<!--hole:{encoded}-->')
+
+
+def fill_holes(request, content):
+    """Функция fill_holes заменяет метки дыр в общей для всех странице
+    частями, нарисованными для пользователя запроса."""
+    def fill(match):
+        name, kwargs = json.loads(base64.urlsafe_b64decode(match.group(1)))
+        return render_hole(request, name, kwargs)
+
+    return HOLE_RE.sub(fill, content)
+
+
+register_hole('header', 'includes/header.html')
@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.ratelimit import ALLOWED, LIMITED, counters, reset_counters
+
+
+class Command(BaseCommand):
+    """Команда показывает лимиты частоты запросов и счетчики пропущенных
+    и отклоненных запросов по представлениям, чтобы подбирать лимиты под
+    нагрузкой."""
+    help = 'Показывает лимиты и счетчики ограничения частоты запросов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true',
+                            help='обнулить счетчики после вывода')
+
+    def handle(self, *args, **options):
+        for view_name, counts in counters().items():
+            limit = settings.RATE_LIMITS[view_name]
+            total = counts[ALLOWED] + counts[LIMITED]
+            share = counts[LIMITED] / total * 100 if total else 0.0
+            self.stdout.write(
+                f"{view_name}: {limit['rate']}, burst {limit['burst']}; "
+                f'пропущено {counts[ALLOWED]}, отклонено {counts[LIMITED]} '
+                f'({share:.1f}%)')
+        if options['reset']:
+            reset_counters()
+            self.stdout.write(self.style.SUCCESS('Счетчики обнулены'))
@@ -0,0 +1,58 @@
+import multiprocessing
+import signal
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.tasks import Worker, requeue_stale
+
+
+def work(poll_interval):
+    worker = Worker(poll_interval)
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    try:
+        worker.run()
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    """Команда запускает процессы-воркеры фоновой очереди (при
+    TASKS_BACKEND = 'database'). С --once выполняет готовые задачи в
+    текущем процессе и завершается, например из cron."""
+    help = 'Запускает воркеры фоновой очереди задач'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=2)
+        parser.add_argument('--poll-interval', type=float, default=None,
+                            help='Пауза при пустой очереди, секунд')
+        parser.add_argument('--once', action='store_true',
+                            help='Выполнить готовые задачи и выйти')
+
+    def handle(self, *args, **options):
+        if options['once']:
+            requeue_stale()
+            processed = Worker(options['poll_interval']).run_pending()
+            self.stdout.write(f'Выполнено задач: {processed}')
+            return
+        # Дочерние процессы не должны наследовать открытые соединения с БД
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        processes = [
+            context.Process(target=work, args=(options['poll_interval'],),
+                            name=f'worker-{number}')
+            for number in range(options['processes'])
+        ]
+        for process in processes:
+            process.start()
+        self.stdout.write(f'Запущено воркеров: {len(processes)}')
+
+        def stop(*args):
+            for process in processes:
+                process.terminate()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        for process in processes:
+            process.join()
@@ -0,0 +1,77 @@
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('yatube.queries')
+
+
+class QueryCounter:
+    """Класс QueryCounter считает запросы ко всем базам данных и их общее
+    время. Подключается через execute_wrapper, поэтому в отличие от
+    connection.queries работает и при DEBUG = False."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.queries = []
+        self._stack = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - start
+            self.queries.append(sql)
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stack.close()
+
+    @property
+    def duration_ms(self):
+        return self.duration * 1000
+
+
+def view_budget(view_name):
+    """Функция view_budget возвращает допустимое число запросов для
+    представления: из QUERY_BUDGET_VIEWS, а если его там нет -
+    QUERY_BUDGET."""
+    return settings.QUERY_BUDGET_VIEWS.get(view_name, settings.QUERY_BUDGET)
+
+
+class QueryBudgetMiddleware:
+    """Middleware считает запросы к БД за время обработки запроса и пишет
+    в лог yatube.queries представления, превысившие бюджет по числу
+    запросов или по их суммарному времени. При DEBUG = True итог
+    добавляется в заголовок Server-Timing."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with QueryCounter() as counter:
+            response = self.get_response(request)
+        match = request.resolver_match
+        view_name = match.view_name if match else request.path
+        budget = view_budget(view_name)
+        if (counter.count > budget
+                or counter.duration_ms > settings.QUERY_TIME_BUDGET_MS):
+            logger.warning(
+                '%s: %d queries in %.1f ms (budget %d queries, %d ms)',
+                view_name, counter.count, counter.duration_ms, budget,
+                settings.QUERY_TIME_BUDGET_MS)
+        if settings.DEBUG:
+            response['Server-Timing'] = (
+                f'db;dur={counter.duration_ms:.1f};'
+                f'desc="{counter.count} queries"')
+        return response
@@ -0,0 +1,36 @@
+import logging
+
+from core.ratelimit import check, client_ip
+from core.views import too_many_requests
+
+logger = logging.getLogger('yatube.ratelimit')
+
+
+class RateLimitMiddleware:
+    """Middleware ограничивает частоту запросов к представлениям из
+    RATE_LIMITS (см. core/ratelimit.py): запрос сверх лимита получает
+    ответ 429, остальные ответы - заголовки RateLimit-Limit и
+    RateLimit-Remaining."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        decision = getattr(request, 'rate_limit', None)
+        if decision is not None and decision.allowed:
+            response['RateLimit-Limit'] = decision.limit
+            response['RateLimit-Remaining'] = decision.remaining
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_name = request.resolver_match.view_name
+        decision = check(request, view_name)
+        if decision is None or decision.allowed:
+            request.rate_limit = decision
+            return None
+        logger.warning('%s: rate limit exceeded by %s', view_name,
+                       request.user.pk or client_ip(request))
+        response = too_many_requests(request)
+        response['Retry-After'] = decision.retry_after
+        return response
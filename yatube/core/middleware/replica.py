@@ -0,0 +1,25 @@
+from django.conf import settings
+
+from core.db.router import replica_alias, request_scope
+
+
+class PrimaryStickinessMiddleware:
+    """Middleware "чтения своих записей": запрос с cookie
+    REPLICA_STICKY_COOKIE читает основную базу, а ответ на запрос, который
+    писал в основную базу, ставит эту cookie на REPLICA_STICKY_SECONDS
+    секунд (см. core/db/router.py). Без реплики ничего не делает."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if replica_alias() is None:
+            return self.get_response(request)
+        cookie = settings.REPLICA_STICKY_COOKIE
+        with request_scope(pinned=cookie in request.COOKIES) as scope:
+            response = self.get_response(request)
+        if scope.wrote:
+            response.set_cookie(cookie, '1',
+                                max_age=settings.REPLICA_STICKY_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
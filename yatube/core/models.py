@@ -0,0 +1,41 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Task(models.Model):
+    """Модель хранит задачу фоновой очереди: имя функции-задачи, ее
+    аргументы в JSON и состояние (см. core/tasks.py)."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUSES = [
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (FAILED, 'Ошибка'),
+    ]
+    name = models.CharField(max_length=200, verbose_name='Задача')
+    arguments = models.TextField(default='{}', verbose_name='Аргументы')
+    status = models.CharField(max_length=10, choices=STATUSES,
+                              default=QUEUED, verbose_name='Состояние')
+    attempts = models.PositiveIntegerField(default=0,
+                                           verbose_name='Попыток')
+    run_at = models.DateTimeField(default=timezone.now,
+                                  verbose_name='Выполнить после')
+    locked_at = models.DateTimeField(null=True, blank=True,
+                                     verbose_name='Взята в работу')
+    last_error = models.TextField(blank=True, verbose_name='Ошибка')
+    created = models.DateTimeField(auto_now_add=True,
+                                   verbose_name='Создана')
+
+    class Meta:
+        """Класс описывает порядок сортировки и задает удобочитаемое имя."""
+        ordering = ['run_at']
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        indexes = [
+            models.Index(fields=['status', 'run_at'],
+                         name='task_status_run_at_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.status})'
@@ -0,0 +1,122 @@
+"""Ограничение частоты запросов к представлениям, которые пишут в БД.
+
+Для каждого представления из RATE_LIMITS и каждого клиента (пользователя,
+а анонима или при 'key': 'ip' - IP-адреса) в общем кэше хранится корзина
+жетонов (token bucket): в ней помещается burst жетонов, и она пополняется
+со скоростью rate ('10/m' - десять жетонов в минуту). Каждый запрос
+забирает жетон, запрос к пустой корзине получает ответ 429 с заголовком
+Retry-After. Корзины общие для всех процессов, а полная корзина из кэша
+удаляется, поэтому кэш хранит только клиентов, писавших недавно.
+
+Счетчики пропущенных и отклоненных запросов по представлениям копятся в
+кэше; их вместе с лимитами показывает команда rate_limits.
+"""
+import math
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .cache.state import cache_lock
+
+BUCKET_KEY = 'ratelimit:{}:{}'
+COUNTER_KEY = 'ratelimit:count:{}:{}'
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 60 * 60 * 24}
+# Корзину одного клиента держит только его же параллельный запрос: его не
+# ждут долго, а сразу отклоняют
+LOCK_WAIT = 0.1
+ALLOWED = 'allowed'
+LIMITED = 'limited'
+
+Decision = namedtuple('Decision', 'allowed limit remaining retry_after')
+
+
+def parse_rate(rate):
+    """Функция parse_rate переводит лимит вида '10/m' в жетоны в
+    секунду."""
+    count, _, period = rate.partition('/')
+    try:
+        return int(count) / PERIODS[period]
+    except (KeyError, ValueError):
+        raise ValueError(f'Invalid rate {rate!r}, expected e.g. "10/m"')
+
+
+def client_ip(request):
+    """Функция client_ip возвращает адрес клиента из заголовка
+    RATE_LIMIT_IP_HEADER; за прокси это первый адрес X-Forwarded-For."""
+    value = request.META.get(settings.RATE_LIMIT_IP_HEADER, '')
+    return value.split(',')[0].strip()
+
+
+def client_key(request, limit):
+    """Функция client_key возвращает ключ клиента, для которого считается
+    лимит limit."""
+    if limit.get('key') != 'ip' and request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    return f'ip:{client_ip(request)}'
+
+
+def take_token(view_name, client, rate, burst):
+    """Функция take_token забирает жетон из корзины клиента client для
+    представления view_name и возвращает решение Decision."""
+    key = BUCKET_KEY.format(view_name, client)
+    with cache_lock(key, wait=LOCK_WAIT) as locked:
+        if not locked:
+            return Decision(False, burst, 0, 1)
+        now = time.time()
+        state = cache.get(key)
+        tokens = burst if state is None else min(
+            burst, state[0] + (now - state[1]) * rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        # Корзина, пополнившаяся до burst, не отличается от отсутствующей
+        cache.set(key, (tokens, now), math.ceil((burst - tokens) / rate) + 1)
+    retry_after = 0 if allowed else math.ceil((1 - tokens) / rate)
+    return Decision(allowed, burst, int(tokens), retry_after)
+
+
+def count(view_name, outcome):
+    """Функция count увеличивает счетчик исхода outcome для view_name."""
+    key = COUNTER_KEY.format(view_name, outcome)
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def counters():
+    """Функция counters возвращает счетчики пропущенных и отклоненных
+    запросов по представлениям из RATE_LIMITS."""
+    keys = {COUNTER_KEY.format(view_name, outcome): (view_name, outcome)
+            for view_name in settings.RATE_LIMITS
+            for outcome in (ALLOWED, LIMITED)}
+    values = cache.get_many(keys)
+    result = {view_name: {ALLOWED: 0, LIMITED: 0}
+              for view_name in settings.RATE_LIMITS}
+    for key, value in values.items():
+        view_name, outcome = keys[key]
+        result[view_name][outcome] = value
+    return result
+
+
+def reset_counters():
+    """Функция reset_counters обнуляет счетчики."""
+    cache.delete_many([COUNTER_KEY.format(view_name, outcome)
+                       for view_name in settings.RATE_LIMITS
+                       for outcome in (ALLOWED, LIMITED)])
+
+
+def check(request, view_name):
+    """Функция check забирает жетон для запроса к view_name. Возвращает
+    Decision или None, если представление не ограничено."""
+    limit = settings.RATE_LIMITS.get(view_name)
+    if (not settings.RATE_LIMIT_ENABLED or limit is None
+            or request.method not in limit.get('methods', ('POST',))):
+        return None
+    decision = take_token(view_name, client_key(request, limit),
+                          parse_rate(limit['rate']), limit['burst'])
+    count(view_name, ALLOWED if decision.allowed else LIMITED)
+    return decision
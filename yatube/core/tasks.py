@@ -0,0 +1,158 @@
+import json
+import logging
+import time
+import traceback
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Task
+
+logger = logging.getLogger('yatube.tasks')
+
+
+def task(func=None, *, max_attempts=None):
+    """Декоратор task делает функцию фоновой задачей: func.delay(*args,
+    **kwargs) ставит ее в очередь. Аргументы должны сериализоваться в JSON,
+    поэтому передаются id, а не объекты. При TASKS_BACKEND = 'immediate'
+    задача выполняется сразу в вызывающем процессе, при 'database' -
+    сохраняется в таблицу Task и выполняется командой run_workers с
+    повторами до max_attempts (по умолчанию TASK_MAX_ATTEMPTS) раз."""
+    if func is None:
+        return lambda func: task(func, max_attempts=max_attempts)
+
+    @wraps(func)
+    def delay(*args, **kwargs):
+        return enqueue(func, args, kwargs)
+
+    func.task_name = f'{func.__module__}.{func.__qualname__}'
+    func.max_attempts = max_attempts or settings.TASK_MAX_ATTEMPTS
+    func.delay = delay
+    return func
+
+
+def run_inline(func, args, kwargs):
+    """Функция run_inline выполняет задачу в режиме immediate в
+    собственной транзакции. Ошибка задачи записывается в лог и не
+    прерывает вызывающий код."""
+    try:
+        with transaction.atomic():
+            func(*args, **kwargs)
+    except Exception:
+        logger.exception('Task %s failed', func.task_name)
+
+
+def enqueue(func, args, kwargs):
+    """Функция enqueue ставит задачу в очередь. Строка задачи пишется в
+    текущей транзакции, поэтому воркеры увидят задачу только после ее
+    фиксации, а при откате задача пропадет вместе с изменениями. В режиме
+    immediate задача так же выполняется только после фиксации транзакции:
+    письмо не уйдет, если запрос откатится."""
+    if settings.TASKS_BACKEND == 'immediate':
+        transaction.on_commit(lambda: run_inline(func, args, kwargs))
+        return None
+    return Task.objects.create(
+        name=func.task_name,
+        arguments=json.dumps({'args': args, 'kwargs': kwargs}))
+
+
+def retry_delay(attempts):
+    """Пауза перед повтором растет вдвое с каждой неудачной попыткой."""
+    return timedelta(seconds=settings.TASK_RETRY_DELAY * 2 ** (attempts - 1))
+
+
+def claim_task():
+    """Функция claim_task берет в работу самую раннюю готовую задачу.
+    SQLite не поддерживает SELECT ... FOR UPDATE SKIP LOCKED, поэтому задача
+    захватывается условным UPDATE: если ее уже взял другой воркер, берется
+    следующая. Возвращает задачу или None, если очередь пуста."""
+    now = timezone.now()
+    candidates = Task.objects.filter(
+        status=Task.QUEUED, run_at__lte=now).values_list('pk', flat=True)
+    for pk in candidates[:settings.TASK_CLAIM_BATCH]:
+        claimed = Task.objects.filter(pk=pk, status=Task.QUEUED).update(
+            status=Task.RUNNING, locked_at=now, attempts=F('attempts') + 1)
+        if claimed:
+            return Task.objects.get(pk=pk)
+    return None
+
+
+def run_task(task):
+    """Функция run_task выполняет взятую задачу. Выполненная задача
+    удаляется, упавшая возвращается в очередь с паузой retry_delay, а после
+    max_attempts попыток остается в таблице в состоянии FAILED. Задача
+    выполняется вне транзакции: транзакция SQLite с BEGIN IMMEDIATE держала
+    бы блокировку на запись, пока строится миниатюра или отправляется
+    письмо, поэтому задачи сами оборачивают в atomic() только свои
+    записи в БД."""
+    try:
+        func = import_string(task.name)
+        if not hasattr(func, 'max_attempts'):
+            raise ImportError(f'{task.name} is not a task')
+    except ImportError:
+        Task.objects.filter(pk=task.pk).update(
+            status=Task.FAILED, last_error=traceback.format_exc())
+        logger.error('Unknown task %s', task.name)
+        return False
+    arguments = json.loads(task.arguments)
+    try:
+        func(*arguments['args'], **arguments['kwargs'])
+    except Exception:
+        error = traceback.format_exc()
+        if task.attempts >= func.max_attempts:
+            Task.objects.filter(pk=task.pk).update(
+                status=Task.FAILED, last_error=error)
+            logger.error('Task %s failed after %s attempts:\n%s',
+                         task.name, task.attempts, error)
+        else:
+            Task.objects.filter(pk=task.pk).update(
+                status=Task.QUEUED, last_error=error, locked_at=None,
+                run_at=timezone.now() + retry_delay(task.attempts))
+            logger.warning('Task %s failed, retrying:\n%s', task.name, error)
+        return False
+    Task.objects.filter(pk=task.pk).delete()
+    return True
+
+
+def requeue_stale():
+    """Функция requeue_stale возвращает в очередь задачи, которые дольше
+    TASK_TIMEOUT секунд числятся выполняемыми: их воркер, скорее всего,
+    завершился, не успев отметить результат."""
+    expired = timezone.now() - timedelta(seconds=settings.TASK_TIMEOUT)
+    return Task.objects.filter(
+        status=Task.RUNNING, locked_at__lt=expired).update(
+        status=Task.QUEUED, locked_at=None)
+
+
+class Worker:
+    """Класс Worker в цикле берет и выполняет задачи из таблицы Task.
+    Когда очередь пуста, воркер спит poll_interval секунд."""
+
+    def __init__(self, poll_interval=None):
+        self.poll_interval = poll_interval or settings.TASK_POLL_INTERVAL
+        self.stopped = False
+
+    def stop(self, *args):
+        self.stopped = True
+
+    def run_pending(self):
+        """Выполняет все готовые задачи и возвращает их число."""
+        processed = 0
+        while not self.stopped:
+            task = claim_task()
+            if task is None:
+                break
+            run_task(task)
+            processed += 1
+        return processed
+
+    def run(self):
+        while not self.stopped:
+            requeue_stale()
+            if not self.run_pending():
+                time.sleep(self.poll_interval)
@@ -0,0 +1,16 @@
+from django import template
+
+from core.holes import hole_marker, render_hole
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def hole(context, name, **kwargs):
+    """Часть страницы, зависящая от пользователя. При отрисовке общей
+    страницы для кэша (punch_holes в контексте) на ее месте остается
+    метка, которую fill_holes заполняет на каждый запрос; иначе часть
+    рисуется сразу."""
+    if context.get('punch_holes'):
+        return hole_marker(name, kwargs)
+    return render_hole(context.request, name, kwargs)
@@ -0,0 +1,62 @@
+from contextlib import contextmanager
+from http import HTTPStatus
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .middleware.query_budget import QueryCounter
+
+
+@contextmanager
+def run_on_commit(using=DEFAULT_DB_ALIAS):
+    """Контекст выполняет на выходе функции transaction.on_commit(),
+    отложенные внутри него, например задачи в режиме immediate. TestCase
+    откатывает транзакцию теста, и без этого они не выполняются (в
+    Django 3.2 то же делает TestCase.captureOnCommitCallbacks)."""
+    connection = connections[using]
+    start = len(connection.run_on_commit)
+    yield
+    while len(connection.run_on_commit) > start:
+        callbacks = connection.run_on_commit[start:]
+        del connection.run_on_commit[start:]
+        for _, callback in callbacks:
+            callback()
+
+
+class QueryBudgetMixin:
+    """Примесь к TestCase с проверками числа запросов к БД."""
+
+    @contextmanager
+    def assertQueryBudget(self, budget):
+        """Блок падает, если внутри него выполнено больше budget
+        запросов. В сообщении перечисляются все выполненные запросы."""
+        with QueryCounter() as counter:
+            yield counter
+        if counter.count > budget:
+            queries = '\n'.join(
+                f'{number}. {sql}'
+                for number, sql in enumerate(counter.queries, start=1))
+            self.fail(f'{counter.count} queries executed, budget is '
+                      f'{budget}:\n{queries}')
+
+    def count_queries(self, client, url):
+        """Запрашивает url с пустым кэшем и возвращает число запросов."""
+        cache.clear()
+        with QueryCounter() as counter:
+            response = client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return counter.count
+
+    def assertQueriesDoNotScale(self, client, url, add_objects,
+                                sizes=(1, 10)):
+        """Проверяет, что число запросов страницы не растет вместе с
+        количеством объектов на ней. add_objects(n) добавляет n объектов,
+        страница запрашивается после наполнения до каждого из sizes."""
+        counts = {}
+        created = 0
+        for size in sizes:
+            add_objects(size - created)
+            created = size
+            counts[size] = self.count_queries(client, url)
+        self.assertEqual(len(set(counts.values())), 1,
+                         f'{url}: query count grows with page size {counts}')
@@ -1,6 +1,53 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
 from http import HTTPStatus
+from io import StringIO
+from unittest import mock
 
-from django.test import Client, TestCase
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.wsgi import get_wsgi_application
+from django.db import OperationalError, transaction
+from django.http import StreamingHttpResponse
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import Comment, Post, TimelineEntry
+
+from .asgi import ASGIHandler
+from .cache.sqlite import SQLiteCache
+from .db.base import DatabaseWrapper
+from .models import Task
+from .ratelimit import counters
+from .tasks import Worker, requeue_stale, task
+from .testing import run_on_commit
+
+User = get_user_model()
+# Вызовы тестовых задач
+calls = []
+
+
+@task
+def record(value):
+    calls.append(value)
+
+
+@task
+def break_query():
+    Task.objects.create(name=None)
+
+
+@task(max_attempts=2)
+def explode():
+    calls.append('boom')
+    raise RuntimeError('boom')
 
 
 class ViewTestClass(TestCase):
@@ -13,3 +60,446 @@ class ViewTestClass(TestCase):
         response = self.user.get('/nonexist-page/')
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class SQLiteCacheTest(TestCase):
+    """Тестируем общий кэш на SQLite: два экземпляра бэкенда на одном файле
+    ведут себя как кэши двух воркеров."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        location = os.path.join(self.directory, 'cache.sqlite3')
+        self.worker_1 = SQLiteCache(location, {})
+        self.worker_2 = SQLiteCache(location, {})
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_workers_share_values(self):
+        """Значение, записанное одним воркером, видно другому."""
+        self.worker_1.set('index_page', {'html': '<p>Пост</p>'})
+        self.assertEqual(self.worker_2.get('index_page'),
+                         {'html': '<p>Пост</p>'})
+        self.worker_2.delete('index_page')
+        self.assertIsNone(self.worker_1.get('index_page'))
+
+    def test_add_get_many_and_expiry(self):
+        """add не перезаписывает значение, просроченные ключи не видны."""
+        self.assertTrue(self.worker_1.add('key', 1))
+        self.assertFalse(self.worker_2.add('key', 2))
+        self.worker_1.set('expired', 'value', timeout=-1)
+        self.assertEqual(self.worker_2.get_many(['key', 'expired']),
+                         {'key': 1})
+        self.assertTrue(self.worker_2.add('expired', 'new'))
+
+    def test_incr_is_shared_and_atomic(self):
+        """incr из нескольких потоков двух воркеров не теряет приращений."""
+        self.worker_1.set('feed_version', 0, None)
+
+        def bump(worker):
+            for _ in range(50):
+                worker.incr('feed_version')
+
+        threads = [threading.Thread(target=bump, args=(worker,))
+                   for worker in (self.worker_1, self.worker_2) * 2]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.worker_1.get('feed_version'), 200)
+        with self.assertRaises(ValueError):
+            self.worker_1.incr('missing')
+
+    def test_cull_keeps_max_entries(self):
+        """При переполнении удаляется часть самых старых ключей."""
+        cache = SQLiteCache(
+            os.path.join(self.directory, 'small.sqlite3'),
+            {'OPTIONS': {'MAX_ENTRIES': 10, 'CULL_FREQUENCY': 2,
+                         'CULL_EVERY': 1}})
+        for i in range(30):
+            cache.set(f'key_{i}', i)
+        self.assertIsNone(cache.get('key_0'))
+        self.assertEqual(cache.get('key_29'), 29)
+
+    def test_cull_checked_every_n_writes(self):
+        """Размер кэша проверяется раз в CULL_EVERY записей."""
+        cache = SQLiteCache(
+            os.path.join(self.directory, 'small.sqlite3'),
+            {'OPTIONS': {'MAX_ENTRIES': 5, 'CULL_FREQUENCY': 2,
+                         'CULL_EVERY': 10}})
+        for i in range(9):
+            cache.set(f'key_{i}', i)
+        self.assertEqual(len(cache.get_many(f'key_{i}' for i in range(9))),
+                         9)
+        cache.set('key_9', 9)
+        self.assertIsNone(cache.get('key_0'))
+        self.assertEqual(cache.get('key_9'), 9)
+
+
+class QueryBudgetMiddlewareTest(TestCase):
+    """Тестируем учет запросов к БД в QueryBudgetMiddleware."""
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    @override_settings(QUERY_BUDGET=0)
+    def test_over_budget_view_is_logged(self):
+        """Представление, превысившее бюджет, попадает в лог."""
+        with self.assertLogs('yatube.queries', 'WARNING') as logs:
+            self.guest_client.get('/')
+        self.assertIn('posts:index', logs.output[0])
+
+    @override_settings(QUERY_BUDGET=0,
+                       QUERY_BUDGET_VIEWS={'posts:index': 100})
+    def test_view_budget_overrides_default(self):
+        """Бюджет из QUERY_BUDGET_VIEWS заменяет общий."""
+        with self.assertRaises(AssertionError):
+            with self.assertLogs('yatube.queries', 'WARNING'):
+                self.guest_client.get('/')
+
+    @override_settings(DEBUG=True)
+    def test_server_timing_header_in_debug(self):
+        """При DEBUG = True число запросов отдается в Server-Timing."""
+        response = self.guest_client.get('/')
+        self.assertRegex(response['Server-Timing'],
+                         r'^db;dur=[\d.]+;desc="\d+ queries"$')
+
+
+class ASGIHandlerTest(SimpleTestCase):
+    """Тестируем ASGI-обработчик поверх WSGI-приложения Django."""
+
+    def call(self, application, scope, messages):
+        """Вызывает ASGI-приложение и возвращает отправленные им
+        сообщения."""
+        sent = []
+        incoming = list(messages)
+
+        async def receive():
+            return incoming.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        asyncio.run(application(scope, receive, send))
+        return sent
+
+    def http_scope(self, path, query_string=b''):
+        return {
+            'type': 'http',
+            'method': 'GET',
+            'path': path,
+            'query_string': query_string,
+            'headers': [(b'host', b'testserver')],
+        }
+
+    def test_page_served(self):
+        """Страница отдается со статусом и заголовками ответа Django."""
+        application = ASGIHandler(get_wsgi_application(), 2)
+        sent = self.call(application, self.http_scope('/about/tech/'),
+                         [{'type': 'http.request', 'body': b''}])
+        start, *body = sent
+        self.assertEqual(start['type'], 'http.response.start')
+        self.assertEqual(start['status'], HTTPStatus.OK)
+        self.assertIn((b'content-type', b'text/html; charset=utf-8'),
+                      start['headers'])
+        self.assertIn('Технологии'.encode(),
+                      b''.join(message['body'] for message in body))
+        self.assertFalse(body[-1].get('more_body', False))
+
+    def test_streaming_response_sent_in_chunks(self):
+        """Потоковый ответ отдается по частям по мере генерации."""
+        def streaming_app(environ, start_response):
+            response = StreamingHttpResponse(
+                f'{number}\n' for number in range(3))
+            start_response('200 OK', list(response.items()))
+            return response
+
+        application = ASGIHandler(streaming_app, 1)
+        sent = self.call(application, self.http_scope('/export/'),
+                         [{'type': 'http.request', 'body': b''}])
+        self.assertEqual([message.get('body') for message in sent[1:]],
+                         [b'0\n', b'1\n', b'2\n', b''])
+
+    def test_lifespan(self):
+        """Сервер получает подтверждение запуска и остановки."""
+        application = ASGIHandler(get_wsgi_application(), 1)
+        sent = self.call(application, {'type': 'lifespan'},
+                         [{'type': 'lifespan.startup'},
+                          {'type': 'lifespan.shutdown'}])
+        self.assertEqual([message['type'] for message in sent],
+                         ['lifespan.startup.complete',
+                          'lifespan.shutdown.complete'])
+
+
+@override_settings(TASKS_BACKEND='database')
+class TaskQueueTest(TestCase):
+    """Тестируем фоновую очередь задач в таблице Task."""
+
+    def setUp(self):
+        calls.clear()
+        self.worker = Worker()
+
+    def test_task_runs_in_worker(self):
+        """Задача выполняется воркером, а не при постановке в очередь, и
+        удаляется после выполнения."""
+        record.delay('привет')
+        self.assertEqual(calls, [])
+        self.assertEqual(Task.objects.get().name, 'core.tests.record')
+        self.assertEqual(self.worker.run_pending(), 1)
+        self.assertEqual(calls, ['привет'])
+        self.assertFalse(Task.objects.exists())
+
+    @override_settings(TASKS_BACKEND='immediate')
+    def test_immediate_backend(self):
+        """В режиме immediate задача выполняется после фиксации
+        транзакции, а ее ошибка не прерывает вызывающий код."""
+        with self.assertLogs('yatube.tasks', 'ERROR'):
+            with run_on_commit():
+                record.delay(1)
+                explode.delay()
+                self.assertEqual(calls, [])
+        self.assertEqual(calls, [1, 'boom'])
+        self.assertFalse(Task.objects.exists())
+
+    @override_settings(TASKS_BACKEND='immediate')
+    def test_immediate_task_isolated_from_request(self):
+        """Ошибка БД в задаче immediate не ломает транзакцию вызывающего
+        кода, а при откате транзакции задача не выполняется."""
+        with self.assertLogs('yatube.tasks', 'ERROR'):
+            with run_on_commit():
+                break_query.delay()
+        self.assertFalse(Task.objects.exists())
+        with run_on_commit():
+            with transaction.atomic():
+                record.delay('откат')
+                transaction.set_rollback(True)
+        self.assertEqual(calls, [])
+
+    def test_retries_then_fails(self):
+        """Упавшая задача повторяется с паузой, после max_attempts попыток
+        остается в состоянии FAILED."""
+        explode.delay()
+        with self.assertLogs('yatube.tasks', 'WARNING'):
+            self.worker.run_pending()
+        queued = Task.objects.get()
+        self.assertEqual(queued.status, Task.QUEUED)
+        self.assertEqual(queued.attempts, 1)
+        self.assertGreater(queued.run_at, timezone.now())
+        self.assertIn('RuntimeError', queued.last_error)
+        self.assertEqual(self.worker.run_pending(), 0)
+        Task.objects.update(run_at=timezone.now())
+        with self.assertLogs('yatube.tasks', 'ERROR'):
+            self.worker.run_pending()
+        self.assertEqual(Task.objects.get().status, Task.FAILED)
+        self.assertEqual(calls, ['boom', 'boom'])
+
+    def test_stale_task_requeued(self):
+        """Задача, зависшая у завершившегося воркера, возвращается в
+        очередь."""
+        record.delay(2)
+        Task.objects.update(status=Task.RUNNING, locked_at=timezone.now()
+                            - timedelta(hours=1))
+        self.assertEqual(self.worker.run_pending(), 0)
+        self.assertEqual(requeue_stale(), 1)
+        self.assertEqual(self.worker.run_pending(), 1)
+        self.assertEqual(calls, [2])
+
+    def test_side_effects_handed_off(self):
+        """Раскладка поста по лентам, письмо о комментарии и приветственное
+        письмо выполняются командой run_workers."""
+        author = User.objects.create_user(username='Pupkin',
+                                          email='pupkin@example.com')
+        reader = User.objects.create_user(username='Pechkin')
+        author.follower.create(author=reader)
+        post = Post.objects.create(author=reader, text='Пост')
+        client = Client()
+        client.force_login(reader)
+        own_post = Post.objects.create(author=author, text='Пост автора')
+        client.post(reverse('posts:add_comment',
+                            kwargs={'post_id': own_post.pk}),
+                    data={'text': 'Комментарий'})
+        Client().post(reverse('users:signup'), data={
+            'username': 'newbie', 'email': 'newbie@example.com',
+            'password1': 'Sup3r-secret-pass', 'password2':
+                'Sup3r-secret-pass'})
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(mail.outbox, [])
+        call_command('run_workers', once=True, stdout=StringIO())
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=author, post=post).exists())
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox),
+                         ['newbie@example.com', 'pupkin@example.com'])
+        self.assertFalse(Task.objects.exists())
+
+
+class SQLiteBackendTest(SimpleTestCase):
+    """Тестируем бэкенд core.db на отдельном файле базы."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.name = os.path.join(self.directory, 'db.sqlite3')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def connect(self, **options):
+        connection = DatabaseWrapper({
+            'NAME': self.name, 'OPTIONS': options, 'CONN_MAX_AGE': 0,
+            'AUTOCOMMIT': True, 'ATOMIC_REQUESTS': False, 'TIME_ZONE': None,
+            'USER': '', 'PASSWORD': '', 'HOST': '', 'PORT': '',
+        })
+        self.addCleanup(connection.close)
+        return connection
+
+    def pragma(self, connection, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_default_pragmas(self):
+        """Новое соединение работает в WAL и ждет блокировку."""
+        connection = self.connect()
+        self.assertEqual(self.pragma(connection, 'journal_mode'), 'wal')
+        self.assertEqual(self.pragma(connection, 'synchronous'), 1)
+        self.assertEqual(self.pragma(connection, 'busy_timeout'), 5000)
+
+    def test_pragmas_override_defaults(self):
+        """PRAGMA из OPTIONS переопределяют настройки по умолчанию."""
+        connection = self.connect(pragmas={'busy_timeout': 100,
+                                           'synchronous': 'FULL'})
+        self.assertEqual(self.pragma(connection, 'busy_timeout'), 100)
+        self.assertEqual(self.pragma(connection, 'synchronous'), 2)
+
+    def test_transaction_takes_write_lock(self):
+        """Транзакция сразу берет блокировку на запись (BEGIN IMMEDIATE):
+        вторая транзакция не начинается, пока первая не завершится."""
+        writer = self.connect()
+        other = self.connect(pragmas={'busy_timeout': 0})
+        writer.ensure_connection()
+        other.ensure_connection()
+        writer._start_transaction_under_autocommit()
+        with self.assertRaisesMessage(OperationalError, 'locked'):
+            other._start_transaction_under_autocommit()
+        writer.connection.rollback()
+        other._start_transaction_under_autocommit()
+        other.connection.rollback()
+
+    def test_invalid_transaction_mode(self):
+        """Неизвестный режим транзакций - ошибка конфигурации."""
+        with self.assertRaises(ValueError):
+            self.connect(transaction_mode='LAZY').ensure_connection()
+
+
+@override_settings(RATE_LIMITS={
+    'posts:add_comment': {'rate': '1/m', 'burst': 2},
+    'users:signup': {'rate': '1/h', 'burst': 1, 'key': 'ip'},
+})
+class RateLimitTest(TestCase):
+    """Тестируем ограничение частоты запросов корзиной жетонов."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Pupkin')
+        cls.reader = User.objects.create_user(username='Pechkin')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        self.user_client = Client()
+        self.user_client.force_login(self.user)
+        self.url = reverse('posts:add_comment',
+                           kwargs={'post_id': self.post.pk})
+
+    def comment(self, client):
+        return client.post(self.url, {'text': 'Комментарий'})
+
+    def test_burst_then_429(self):
+        """Сверх burst запросов клиент получает 429 с Retry-After, и
+        комментарий не создается."""
+        first = self.comment(self.user_client)
+        self.assertEqual(first['RateLimit-Remaining'], '1')
+        self.assertEqual(self.comment(self.user_client)['RateLimit-Remaining'],
+                         '0')
+        with self.assertLogs('yatube.ratelimit', 'WARNING'):
+            response = self.comment(self.user_client)
+        self.assertEqual(response.status_code, HTTPStatus.TOO_MANY_REQUESTS)
+        self.assertTemplateUsed(response, 'core/429.html')
+        self.assertEqual(response['Retry-After'], '60')
+        self.assertEqual(Comment.objects.count(), 2)
+
+    def test_bucket_refills(self):
+        """Корзина пополняется со скоростью rate."""
+        now = 1_000_000.0
+        with mock.patch('core.ratelimit.time.time', return_value=now):
+            for _ in range(2):
+                self.comment(self.user_client)
+            self.assertEqual(self.comment(self.user_client).status_code,
+                             HTTPStatus.TOO_MANY_REQUESTS)
+        with mock.patch('core.ratelimit.time.time', return_value=now + 61):
+            response = self.comment(self.user_client)
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        self.assertEqual(response['RateLimit-Remaining'], '0')
+
+    def test_limits_are_per_client(self):
+        """Лимит считается отдельно для каждого пользователя, а для
+        регистрации - для каждого IP-адреса; GET не ограничен."""
+        for _ in range(3):
+            self.comment(self.user_client)
+        reader_client = Client()
+        reader_client.force_login(self.reader)
+        self.assertEqual(self.comment(reader_client).status_code,
+                         HTTPStatus.FOUND)
+        signup = reverse('users:signup')
+        for _ in range(3):
+            self.assertEqual(self.user_client.get(signup).status_code,
+                             HTTPStatus.OK)
+        self.user_client.post(signup, {}, REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(
+            self.user_client.post(signup, {},
+                                  REMOTE_ADDR='10.0.0.1').status_code,
+            HTTPStatus.TOO_MANY_REQUESTS)
+        self.assertEqual(
+            self.user_client.post(signup, {},
+                                  REMOTE_ADDR='10.0.0.2').status_code,
+            HTTPStatus.OK)
+
+    @override_settings(RATE_LIMITS={
+        'posts:profile_follow': {'rate': '1/m', 'burst': 1,
+                                 'methods': ['GET', 'POST']},
+        'posts:profile_unfollow': {'rate': '1/m', 'burst': 1,
+                                   'methods': ['GET', 'POST']},
+    })
+    def test_unfollow_limited(self):
+        """Отписка ограничена, как и подписка: чередование подписки и
+        отписки не обходит лимит."""
+        urls = [reverse(name, kwargs={'username': self.reader})
+                for name in ('posts:profile_follow', 'posts:profile_unfollow')]
+        for url in urls:
+            self.assertEqual(self.user_client.get(url).status_code,
+                             HTTPStatus.FOUND)
+        with self.assertLogs('yatube.ratelimit', 'WARNING'):
+            for url in urls:
+                self.assertEqual(self.user_client.get(url).status_code,
+                                 HTTPStatus.TOO_MANY_REQUESTS)
+
+    def test_counters(self):
+        """Счетчики пропущенных и отклоненных запросов видны в counters и
+        команде rate_limits."""
+        for _ in range(3):
+            self.comment(self.user_client)
+        self.assertEqual(counters()['posts:add_comment'],
+                         {'allowed': 2, 'limited': 1})
+        out = StringIO()
+        call_command('rate_limits', '--reset', stdout=out)
+        self.assertIn('posts:add_comment: 1/m, burst 2; пропущено 2, '
+                      'отклонено 1 (33.3%)', out.getvalue())
+        self.assertEqual(counters()['posts:add_comment'],
+                         {'allowed': 0, 'limited': 0})
+
+    @override_settings(RATE_LIMIT_ENABLED=False)
+    def test_disabled(self):
+        """При RATE_LIMIT_ENABLED = False лимиты не действуют."""
+        for _ in range(3):
+            self.assertEqual(self.comment(self.user_client).status_code,
+                             HTTPStatus.FOUND)
@@ -17,3 +17,7 @@ def csrf_failure(request, reason=''):
 
 def server_error(request):
     return render(request, 'core/500.html', status=500)
+
+
+def too_many_requests(request):
+    return render(request, 'core/429.html', status=429)
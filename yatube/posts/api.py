@@ -0,0 +1,183 @@
+from http import HTTPStatus
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils.http import urlencode
+from django.views.decorators.http import require_safe
+
+from .common import (KeysetPaginator, author_feed, group_feed, index_feed,
+                     post_comments_list)
+from .conditional import latest, make_etag, not_modified, set_validators
+from .counters import get_stats
+from .models import Group, Post
+from .thumbnails import resolve_thumbnails
+from .timeline import follow_feed
+
+User = get_user_model()
+
+
+def post_data(post):
+    """Функция post_data возвращает пост в виде словаря для JSON."""
+    return {
+        'id': post.pk,
+        'text': post.text,
+        'pub_date': post.pub_date,
+        'updated': post.updated,
+        'author': post.author.username,
+        'group': post.group.slug if post.group_id else None,
+        'image': post.image.url if post.image else None,
+        'thumbnail': post.image_thumbnail or None,
+        'comments_count': post.comments_count,
+    }
+
+
+def post_key(post):
+    """Значения поста, от которых зависит его представление в JSON."""
+    return (post.pk, post.updated, post.comments_count,
+            post.author.username, post.group.slug if post.group_id else None)
+
+
+def comment_data(comment):
+    """Функция comment_data возвращает комментарий в виде словаря."""
+    return {
+        'id': comment.pk,
+        'post': comment.post_id,
+        'author': comment.author.username,
+        'text': comment.text,
+        'created': comment.created,
+    }
+
+
+def comment_key(comment):
+    return comment.pk, comment.created, comment.author.username
+
+
+def api_response(request, etag, last_modified, build):
+    """Функция api_response отвечает 304, если у клиента актуальная
+    версия, иначе вызывает build() и отдает результат в JSON. Так
+    неизмененная страница не сериализуется."""
+    response = not_modified(request, etag, last_modified)
+    if response is None:
+        response = JsonResponse(build(),
+                                json_dumps_params={'ensure_ascii': False})
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def page_link(request, cursor):
+    if cursor is None:
+        return None
+    return f"{request.path}?{urlencode({'cursor': cursor})}"
+
+
+def paginated(request, page_obj, serialize, key, date):
+    """Функция paginated отдает страницу keyset-паджинатора: объекты,
+    ссылки на соседние страницы и заголовки ETag и Last-Modified,
+    посчитанные по ключам объектов страницы и самой поздней дате date."""
+    objects = list(page_obj)
+    etag = make_etag(page_obj.cursor, [key(obj) for obj in objects])
+    last_modified = latest(getattr(obj, date) for obj in objects)
+    return api_response(request, etag, last_modified, lambda: {
+        'results': [serialize(obj) for obj in objects],
+        'next': page_link(request, page_obj.next_cursor),
+        'previous': page_link(request, page_obj.previous_cursor),
+    })
+
+
+def posts_page(request, post_list):
+    """Функция posts_page отдает страницу ленты постов post_list."""
+    paginator = KeysetPaginator(post_list, settings.COUNT_OF_POSTS)
+    return posts_response(request,
+                          paginator.get_page(request.GET.get('cursor')))
+
+
+def posts_response(request, page_obj):
+    resolve_thumbnails(list(page_obj))
+    return paginated(request, page_obj, post_data, post_key, 'updated')
+
+
+@require_safe
+def posts_list(request):
+    """Лента всех постов, как на главной странице."""
+    return posts_page(request, index_feed())
+
+
+@require_safe
+def group_posts(request, slug):
+    """Лента постов группы."""
+    group = get_object_or_404(Group, slug=slug)
+    return posts_page(request, group_feed(group))
+
+
+@require_safe
+def profile_posts(request, username):
+    """Лента постов автора."""
+    author = get_object_or_404(User, username=username)
+    return posts_page(request, author_feed(author))
+
+
+@require_safe
+def follow_posts(request):
+    """Лента постов авторов, на которых подписан пользователь."""
+    if not request.user.is_authenticated:
+        return JsonResponse({'detail': 'Authentication required'},
+                            status=HTTPStatus.UNAUTHORIZED)
+    paginator = KeysetPaginator(follow_feed(request.user),
+                                settings.COUNT_OF_POSTS)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
+    response = posts_response(request, page_obj)
+    response['Vary'] = 'Cookie'
+    return response
+
+
+@require_safe
+def post_detail(request, post_id):
+    """Пост со связанными автором и группой."""
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group'), pk=post_id)
+    resolve_thumbnails([post])
+    return api_response(request, make_etag(post_key(post)), post.updated,
+                        lambda: post_data(post))
+
+
+@require_safe
+def post_comments(request, post_id):
+    """Комментарии поста, от новых к старым."""
+    get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    paginator = KeysetPaginator(post_comments_list(post_id),
+                                settings.COMMENTS_PER_PAGE, field='created')
+    page_obj = paginator.get_page(request.GET.get('cursor'))
+    return paginated(request, page_obj, comment_data, comment_key, 'created')
+
+
+@require_safe
+def groups_list(request):
+    """Все группы."""
+    groups = list(Group.objects.order_by('title', 'pk'))
+    etag = make_etag([(group.pk, group.slug, group.title, group.description)
+                      for group in groups])
+    return api_response(request, etag, None, lambda: {
+        'results': [{
+            'slug': group.slug,
+            'title': group.title,
+            'description': group.description,
+        } for group in groups],
+    })
+
+
+@require_safe
+def profile(request, username):
+    """Профиль автора со счетчиками постов и подписок."""
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username)
+    stats = get_stats(author)
+    data = {
+        'username': author.username,
+        'full_name': author.get_full_name(),
+        'posts_count': stats.posts_count,
+        'followers_count': stats.followers_count,
+        'following_count': stats.following_count,
+    }
+    return api_response(request, make_etag(data), None, lambda: data)
@@ -0,0 +1,18 @@
+from django.urls import path
+
+from . import api
+
+app_name = 'api'
+
+urlpatterns = [
+    path('posts/', api.posts_list, name='posts'),
+    path('posts/<int:post_id>/', api.post_detail, name='post_detail'),
+    path('posts/<int:post_id>/comments/', api.post_comments,
+         name='post_comments'),
+    path('groups/', api.groups_list, name='groups'),
+    path('groups/<slug:slug>/posts/', api.group_posts, name='group_posts'),
+    path('profiles/<str:username>/', api.profile, name='profile'),
+    path('profiles/<str:username>/posts/', api.profile_posts,
+         name='profile_posts'),
+    path('follow/', api.follow_posts, name='follow'),
+]
@@ -1,10 +1,148 @@
+import base64
+import binascii
+
 from django.conf import settings
-from django.core.paginator import Paginator
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from .models import Comment, Post
+
+CURSOR_NEXT = 'n'
+CURSOR_PREVIOUS = 'p'
+
+
+def encode_cursor(obj, direction=CURSOR_NEXT, field='pub_date'):
+    """Функция encode_cursor упаковывает ключ (дата field, id) поста или
+    комментария и направление листания в непрозрачный токен для параметра
+    ?cursor=."""
+    raw = f'{direction}|{getattr(obj, field).isoformat()}|{obj.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Функция decode_cursor распаковывает токен курсора. Для пустого или
+    поврежденного токена возвращается None (первая страница)."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        direction, pub_date, pk = raw.decode().split('|')
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if direction not in (CURSOR_NEXT, CURSOR_PREVIOUS) or pub_date is None:
+        return None
+    return direction, pub_date, pk
+
+
+class KeysetPage(Page):
+    """Страница keyset-паджинатора. Общее количество постов и номер
+    страницы неизвестны, вместо них хранятся курсоры соседних страниц."""
+
+    def __init__(self, object_list, paginator, cursor, next_cursor,
+                 previous_cursor):
+        super().__init__(object_list, None, paginator)
+        self.cursor = cursor or ''
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<Keyset page {self.cursor}>'
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
 
+class KeysetPaginator:
+    """Класс KeysetPaginator листает выборку постов (или записей ленты) по
+    ключу (pub_date, id) без COUNT(*) и OFFSET, поэтому стоимость любой
+    страницы одинакова. Поле даты задается параметром field, например
+    created для комментариев."""
+    keyset = True
 
-def page_list(request, post_list):
+    def __init__(self, object_list, per_page, field='pub_date'):
+        self.object_list = object_list.order_by(f'-{field}', '-pk')
+        self.per_page = per_page
+        self.field = field
+
+    def get_page(self, cursor):
+        """Возвращает страницу, следующую за курсором (или предшествующую
+        ему), либо первую страницу, если курсор не передан."""
+        position = decode_cursor(cursor)
+        if position is None:
+            return self._forward(self.object_list, None, has_previous=False)
+        direction, date, pk = position
+        field = self.field
+        if direction == CURSOR_NEXT:
+            after = self.object_list.filter(
+                Q(**{f'{field}__lt': date}) | Q(**{field: date, 'pk__lt': pk}))
+            return self._forward(after, cursor, has_previous=True)
+        before = self.object_list.filter(
+            Q(**{f'{field}__gt': date}) | Q(**{field: date, 'pk__gt': pk}))
+        return self._backward(before.reverse(), cursor)
+
+    def _forward(self, queryset, cursor, has_previous):
+        posts = list(queryset[:self.per_page + 1])
+        has_next = len(posts) > self.per_page
+        posts = posts[:self.per_page]
+        return self._page(posts, cursor, has_next, has_previous)
+
+    def _backward(self, queryset, cursor):
+        posts = list(queryset[:self.per_page + 1])
+        has_previous = len(posts) > self.per_page
+        posts = posts[:self.per_page][::-1]
+        return self._page(posts, cursor, True, has_previous)
+
+    def _page(self, posts, cursor, has_next, has_previous):
+        next_cursor = previous_cursor = None
+        if posts and has_next:
+            next_cursor = encode_cursor(posts[-1], CURSOR_NEXT, self.field)
+        if posts and has_previous:
+            previous_cursor = encode_cursor(posts[0], CURSOR_PREVIOUS,
+                                            self.field)
+        return KeysetPage(posts, self, cursor, next_cursor, previous_cursor)
+
+
+def page_list(request, post_list, count=None, keyset=True):
     """Функция page_list возвращает список постов, разбитый постранично,
-    с количеством постов на странице, равным константе COUNT_OF_POSTS."""
+    с количеством постов на странице, равным константе COUNT_OF_POSTS.
+    Если в запросе передан параметр cursor или PAGINATION_MODE равен
+    'keyset', используется keyset-паджинация по (pub_date, id).
+    Заранее известное количество постов count избавляет паджинатор от
+    запроса COUNT(*). Выборки со своим порядком (например, результаты
+    поиска) передаются с keyset=False и всегда листаются по номерам."""
+    cursor = request.GET.get('cursor')
+    if keyset and (cursor is not None
+                   or settings.PAGINATION_MODE == 'keyset'):
+        paginator = KeysetPaginator(post_list, settings.COUNT_OF_POSTS)
+        return paginator.get_page(cursor)
     paginator = Paginator(post_list, settings.COUNT_OF_POSTS)
+    if count is not None:
+        paginator.count = count
     page_number = request.GET.get('page')
     return paginator.get_page(page_number)
+
+
+def index_feed():
+    """Функция index_feed возвращает выборку постов главной страницы."""
+    return Post.objects.select_related('author', 'group')
+
+
+def group_feed(group):
+    """Функция group_feed возвращает выборку постов группы group."""
+    return group.posts.select_related('author')
+
+
+def author_feed(author):
+    """Функция author_feed возвращает выборку постов автора author."""
+    return author.posts.select_related('group')
+
+
+def post_comments_list(post_id):
+    """Функция post_comments_list возвращает выборку комментариев поста."""
+    return Comment.objects.filter(post=post_id).select_related('author')
@@ -0,0 +1,91 @@
+import hashlib
+from calendar import timegm
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date, quote_etag
+
+from core.db.router import read_alias
+
+from .fragments import feed_changed_at, feed_version
+
+
+def make_etag(*parts):
+    """Функция make_etag строит ETag по значениям, от которых зависит
+    ответ: ключам страницы, датам изменения, счетчикам."""
+    return quote_etag(hashlib.md5(repr(parts).encode()).hexdigest())
+
+
+def latest(dates):
+    """Функция latest возвращает самую позднюю из дат или None."""
+    return max((date for date in dates if date is not None), default=None)
+
+
+def not_modified(request, etag, last_modified=None):
+    """Функция not_modified возвращает ответ 304, если у клиента уже есть
+    актуальная версия (If-None-Match / If-Modified-Since), иначе None."""
+    timestamp = last_modified and timegm(last_modified.utctimetuple())
+    response = get_conditional_response(request, etag=etag,
+                                        last_modified=timestamp)
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag, last_modified=None):
+    """Функция set_validators добавляет в ответ заголовки ETag и
+    Last-Modified."""
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(
+            timegm(last_modified.utctimetuple()))
+    return response
+
+
+def page_key(request, *parts):
+    """Функция page_key строит ключ версии HTML-страницы, общий для всех
+    пользователей: кроме parts он зависит от адреса с параметрами и версии
+    лент, которая меняется при правке и удалении постов, групп и
+    пользователей, и от базы, из которой читается страница."""
+    return make_etag(request.get_full_path(), feed_version(), read_alias(),
+                     *parts)
+
+
+def page_etag(request, key):
+    """Функция page_etag строит ETag страницы с ключом key для
+    пользователя запроса: части страницы зависят от пользователя."""
+    user = request.user.pk if request.user.is_authenticated else None
+    return make_etag(key, user)
+
+
+def feed_validators(request, posts):
+    """Функция feed_validators возвращает ключ версии и Last-Modified
+    страницы ленты posts. Последняя дата публикации читается одним запросом по
+    индексу pub_date; правки и удаления учитываются временем смены
+    версии лент."""
+    last_post = posts.aggregate(last=Max('pub_date'))['last']
+    return last_post_validators(request, last_post)
+
+
+def last_post_validators(request, last_post):
+    """Функция last_post_validators возвращает ключ версии и Last-Modified
+    страницы ленты по уже известной дате последнего поста last_post."""
+    return (page_key(request, last_post),
+            latest([last_post, feed_changed_at()]))
+
+
+def cache_headers(request, response):
+    """Функция cache_headers добавляет Cache-Control. Ответы анонимам
+    одинаковы для всех, поэтому их может хранить обратный прокси
+    PAGE_PROXY_MAX_AGE секунд; авторизованным - только браузер, с
+    проверкой по ETag при каждом обращении."""
+    if request.user.is_authenticated:
+        patch_cache_control(response, private=True, no_cache=True)
+    else:
+        patch_cache_control(response, public=True,
+                            max_age=settings.PAGE_MAX_AGE,
+                            s_maxage=settings.PAGE_PROXY_MAX_AGE)
+    patch_vary_headers(response, ['Cookie'])
+    return response
@@ -0,0 +1,58 @@
+from django.db.models import F
+
+from .models import Comment, Follow, Post, UserStats
+
+
+def recount_user(user_id):
+    """Функция recount_user пересчитывает счетчики пользователя по таблицам
+    постов и подписок и сохраняет их."""
+    stats, _ = UserStats.objects.update_or_create(
+        user_id=user_id,
+        defaults={
+            'posts_count': Post.objects.filter(author_id=user_id).count(),
+            'followers_count': Follow.objects.filter(
+                author_id=user_id).count(),
+            'following_count': Follow.objects.filter(
+                user_id=user_id).count(),
+        },
+    )
+    return stats
+
+
+def recount_post(post_id):
+    """Функция recount_post пересчитывает число комментариев поста."""
+    Post.objects.filter(pk=post_id).update(
+        comments_count=Comment.objects.filter(post_id=post_id).count())
+
+
+def get_stats(user):
+    """Функция get_stats возвращает счетчики пользователя. Строка со
+    счетчиками создается при первом посте или подписке (миграция 0015
+    заполнила их для существующих пользователей), поэтому без строки
+    счетчики нулевые; они не сохраняются, чтобы чтение не писало в БД."""
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        return UserStats(user=user)
+
+
+def change_user_counter(user_id, field, delta):
+    """Функция change_user_counter атомарно изменяет счетчик field
+    пользователя на delta. При увеличении отсутствующая строка счетчиков
+    создается пересчетом; при уменьшении нет — пользователь может
+    удаляться каскадом."""
+    stats = UserStats.objects.filter(user_id=user_id)
+    if delta < 0:
+        stats = stats.filter(**{f'{field}__gte': -delta})
+    updated = stats.update(**{field: F(field) + delta})
+    if not updated and delta > 0:
+        recount_user(user_id)
+
+
+def change_comments_counter(post_id, delta):
+    """Функция change_comments_counter атомарно изменяет число комментариев
+    поста на delta."""
+    posts = Post.objects.filter(pk=post_id)
+    if delta < 0:
+        posts = posts.filter(comments_count__gte=-delta)
+    posts.update(comments_count=F('comments_count') + delta)
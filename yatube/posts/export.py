@@ -0,0 +1,150 @@
+import csv
+import datetime as dt
+import io
+import json
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import Comment, Follow, Group, Post
+
+# Выгружаемые таблицы: модель, поля (values), поле даты для фильтра по
+# периоду и поле автора для фильтра по автору
+EXPORTS = {
+    'posts': {
+        'model': Post,
+        'fields': ['id', 'text', 'pub_date', 'author__username',
+                   'group__slug', 'image', 'comments_count'],
+        'date_field': 'pub_date',
+        'author_field': 'author__username',
+    },
+    'comments': {
+        'model': Comment,
+        'fields': ['id', 'post_id', 'author__username', 'text', 'created'],
+        'date_field': 'created',
+        'author_field': 'author__username',
+    },
+    'follows': {
+        'model': Follow,
+        'fields': ['id', 'user__username', 'author__username'],
+        'date_field': None,
+        'author_field': 'author__username',
+    },
+    'groups': {
+        'model': Group,
+        'fields': ['id', 'title', 'slug', 'description'],
+        'date_field': None,
+        'author_field': None,
+    },
+}
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+CHUNK_SIZE = 2000
+
+
+class ExportError(ValueError):
+    """Неверные параметры выгрузки."""
+
+
+def start_of_day(date):
+    return timezone.make_aware(dt.datetime.combine(date, dt.time.min))
+
+
+def parse_day(value, name):
+    if not value:
+        return None
+    date = parse_date(value)
+    if date is None:
+        raise ExportError(f'{name}: ожидается дата ГГГГ-ММ-ДД, а не {value}')
+    return date
+
+
+def export_queryset(name, since=None, until=None, author=None):
+    """Функция export_queryset возвращает выборку словарей таблицы name,
+    отфильтрованную по периоду [since, until] (даты включительно) и по
+    имени автора, упорядоченную по id."""
+    if name not in EXPORTS:
+        raise ExportError(f'Неизвестная таблица {name}, доступны: '
+                          f'{", ".join(EXPORTS)}')
+    export = EXPORTS[name]
+    queryset = export['model'].objects.order_by('pk')
+    since = parse_day(since, 'since')
+    until = parse_day(until, 'until')
+    if since or until:
+        if export['date_field'] is None:
+            raise ExportError(f'Таблицу {name} нельзя фильтровать по дате')
+        if since:
+            queryset = queryset.filter(
+                **{f"{export['date_field']}__gte": start_of_day(since)})
+        if until:
+            queryset = queryset.filter(**{
+                f"{export['date_field']}__lt":
+                    start_of_day(until + dt.timedelta(days=1))})
+    if author:
+        if export['author_field'] is None:
+            raise ExportError(f'Таблицу {name} нельзя фильтровать по автору')
+        queryset = queryset.filter(**{export['author_field']: author})
+    return queryset.values(*export['fields'])
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder,
+                         ensure_ascii=False) + '\n'
+
+
+def csv_lines(rows, fields):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def encode(lines, batch_size):
+    """Склеивает строки в куски по batch_size строк, чтобы не отдавать
+    клиенту по одной строке."""
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= batch_size:
+            yield ''.join(batch).encode()
+            batch = []
+    if batch:
+        yield ''.join(batch).encode()
+
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_chunks(name, fmt='ndjson', compress=False,
+                  chunk_size=CHUNK_SIZE, **filters):
+    """Функция export_chunks выгружает таблицу name кусками байтов в
+    формате NDJSON или CSV, при compress - сжатыми gzip. Строки читаются из
+    БД через iterator(chunk_size), поэтому расход памяти не зависит от
+    размера таблицы. Параметры проверяются сразу, до начала выгрузки."""
+    if fmt not in FORMATS:
+        raise ExportError(f'Неизвестный формат {fmt}, доступны: '
+                          f'{", ".join(FORMATS)}')
+    queryset = export_queryset(name, **filters)
+    rows = queryset.iterator(chunk_size=chunk_size)
+    if fmt == 'csv':
+        lines = csv_lines(rows, EXPORTS[name]['fields'])
+    else:
+        lines = ndjson_lines(rows)
+    chunks = encode(lines, batch_size=100)
+    return gzip_chunks(chunks) if compress else chunks
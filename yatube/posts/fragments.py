@@ -0,0 +1,61 @@
+import datetime as dt
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from core.db.router import read_alias, read_cache_timeout
+
+FEED_VERSION_KEY = 'posts:feed_version'
+FEED_CHANGED_KEY = 'posts:feed_changed'
+
+
+def feed_version():
+    """Функция feed_version возвращает текущую версию лент. Версия входит в
+    ключ кэша фрагментов страниц, поэтому после ее смены старые фрагменты
+    больше не читаются. Если версия вытеснена из кэша, новая начинается с
+    текущего времени, чтобы не совпасть ни с одной из прежних."""
+    version = cache.get(FEED_VERSION_KEY)
+    if version is None:
+        version = int(time.time() * 1000)
+        if not cache.add(FEED_VERSION_KEY, version, None):
+            version = cache.get(FEED_VERSION_KEY, version)
+    return version
+
+
+def bump_feed_version():
+    """Функция bump_feed_version инвалидирует кэшированные фрагменты лент,
+    увеличивая их версию."""
+    try:
+        cache.incr(FEED_VERSION_KEY)
+    except ValueError:
+        cache.set(FEED_VERSION_KEY, int(time.time() * 1000), None)
+    cache.set(FEED_CHANGED_KEY, time.time(), None)
+
+
+def feed_changed_at():
+    """Функция feed_changed_at возвращает время последней смены версии
+    лент. Если оно вытеснено из кэша, отсчет начинается заново с текущего
+    времени."""
+    changed = cache.get(FEED_CHANGED_KEY)
+    if changed is None:
+        changed = time.time()
+        if not cache.add(FEED_CHANGED_KEY, changed, None):
+            changed = cache.get(FEED_CHANGED_KEY, changed)
+    return dt.datetime.fromtimestamp(changed, dt.timezone.utc)
+
+
+def feed_cache_context():
+    """Функция feed_cache_context возвращает переменные контекста для тега
+    {% cache %} в шаблонах лент: время жизни и версию фрагмента.
+    Фрагменты, прочитанные с реплики, хранятся отдельно и недолго (см.
+    core/db/router.py)."""
+    version = feed_version()
+    alias = read_alias()
+    if alias != DEFAULT_DB_ALIAS:
+        version = f'{version}:{alias}'
+    return {
+        'feed_cache_timeout': read_cache_timeout(settings.FEED_CACHE_TIMEOUT),
+        'feed_version': version,
+    }
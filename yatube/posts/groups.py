@@ -0,0 +1,163 @@
+"""Кэш групп и предрасчитанные ленты групп.
+
+Группы меняются редко, поэтому get_group держит их в памяти процесса по
+slug. Изменение или удаление группы меняет версию GROUPS_VERSION_KEY в
+общем кэше, и каждый процесс перечитывает свои группы при следующем
+обращении.
+
+Для каждой группы в общем кэше хранится начало ленты: пары
+(pub_date, id) первых GROUP_FEED_PAGES страниц и общее число постов.
+Создание, перенос и удаление постов меняют эти списки на месте (см.
+posts/signals.py), так что страницы из начала ленты читаются одним
+запросом по первичному ключу, без сортировки и COUNT(*). Списки меняются
+после фиксации транзакции, поэтому откаченный пост в них не попадает.
+Отсутствующий список строится заново одним запросом; GROUP_FEED_TIMEOUT
+ограничивает время жизни списка, если обновление было пропущено.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.shortcuts import get_object_or_404
+
+from core.cache.state import locked_state, store_state
+from core.db.router import read_cache_timeout
+
+from .common import group_feed
+from .models import Group, Post
+
+GROUPS_VERSION_KEY = 'posts:groups_version'
+GROUP_FEED_KEY = 'posts:group_feed:{}'
+
+_groups = {}
+
+
+def groups_version():
+    """Функция groups_version возвращает текущую версию групп; если она
+    вытеснена из кэша, новая начинается с текущего времени."""
+    version = cache.get(GROUPS_VERSION_KEY)
+    if version is None:
+        version = int(time.time() * 1000)
+        if not cache.add(GROUPS_VERSION_KEY, version, None):
+            version = cache.get(GROUPS_VERSION_KEY, version)
+    return version
+
+
+def get_group(slug):
+    """Функция get_group возвращает группу по slug из памяти процесса, а
+    если ее там нет или версия групп сменилась - из БД (404, если группы
+    нет)."""
+    version = groups_version()
+    cached = _groups.get(slug)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    group = get_object_or_404(Group, slug=slug)
+    _groups[slug] = (version, group)
+    return group
+
+
+def invalidate_groups():
+    """Функция invalidate_groups сбрасывает группы в памяти всех
+    процессов."""
+    _groups.clear()
+    try:
+        cache.incr(GROUPS_VERSION_KEY)
+    except ValueError:
+        cache.set(GROUPS_VERSION_KEY, int(time.time() * 1000), None)
+
+
+def group_feed_limit():
+    return settings.GROUP_FEED_PAGES * settings.COUNT_OF_POSTS
+
+
+def build_group_feed(group_id):
+    """Функция build_group_feed строит список начала ленты группы и кладет
+    его в кэш. Список, прочитанный с реплики, может не содержать свежих
+    постов, поэтому хранится не дольше REPLICA_CACHE_TIMEOUT секунд."""
+    posts = Post.objects.filter(group_id=group_id).order_by('-pub_date',
+                                                            '-pk')
+    limit = group_feed_limit()
+    entries = list(posts.values_list('pub_date', 'pk')[:limit])
+    count = len(entries) if len(entries) < limit else posts.count()
+    return store_state(GROUP_FEED_KEY.format(group_id),
+                       {'entries': entries, 'count': count},
+                       read_cache_timeout(settings.GROUP_FEED_TIMEOUT))
+
+
+def reset_group_feed(group_id):
+    """Функция reset_group_feed удаляет список ленты группы; он будет
+    построен заново при следующем чтении."""
+    cache.delete(GROUP_FEED_KEY.format(group_id))
+
+
+def add_to_group_feed(group_id, pub_date, post_id):
+    """Функция add_to_group_feed добавляет пост в список ленты группы на
+    место по (pub_date, id)."""
+    with locked_state(GROUP_FEED_KEY.format(group_id),
+                      settings.GROUP_FEED_TIMEOUT) as state:
+        if state is None:
+            return
+        entries = state['entries']
+        entry = (pub_date, post_id)
+        position = next((index for index, other in enumerate(entries)
+                         if other < entry), len(entries))
+        # Пост за концом неполного списка лежит на страницах, которые
+        # читаются из БД
+        if position < len(entries) or len(entries) == state['count']:
+            entries.insert(position, entry)
+            del entries[group_feed_limit():]
+        state['count'] += 1
+
+
+def remove_from_group_feed(group_id, post_id):
+    """Функция remove_from_group_feed убирает пост из списка ленты
+    группы."""
+    with locked_state(GROUP_FEED_KEY.format(group_id),
+                      settings.GROUP_FEED_TIMEOUT) as state:
+        if state is None:
+            return
+        state['entries'] = [entry for entry in state['entries']
+                            if entry[1] != post_id]
+        state['count'] = max(state['count'] - 1, 0)
+
+
+class GroupFeed:
+    """Лента постов группы для Paginator. Срезы из начала ленты читаются
+    по списку id из кэша, остальные - из БД. Количество постов и дата
+    последнего поста берутся из того же списка."""
+
+    def __init__(self, group):
+        self.group = group
+        self.queryset = group_feed(group)
+        key = GROUP_FEED_KEY.format(group.pk)
+        self.state = cache.get(key) or build_group_feed(group.pk)
+
+    @property
+    def last_pub_date(self):
+        entries = self.state['entries']
+        return entries[0][0] if entries else None
+
+    def count(self):
+        return self.state['count']
+
+    def __len__(self):
+        return self.count()
+
+    def order_by(self, *fields):
+        # Keyset-паджинация листает обычную выборку постов группы
+        return self.queryset.order_by(*fields)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        entries = self.state['entries']
+        if stop is None or (stop > len(entries)
+                            and len(entries) < self.count()):
+            return list(self.queryset[index])
+        ids = [pk for _, pk in entries[start:stop]]
+        posts = self.queryset.in_bulk(ids)
+        if len(posts) < len(ids):
+            # Список устарел: пост удален без сигнала
+            reset_group_feed(self.group.pk)
+        return [posts[pk] for pk in ids if pk in posts]
@@ -0,0 +1,27 @@
+from core.holes import register_hole
+
+from .forms import CommentForm
+from .models import Follow
+
+
+def follow_context(request, author):
+    """Кнопка подписки: подписан ли пользователь на автора author."""
+    following = request.user.is_authenticated and Follow.objects.filter(
+        user=request.user, author__username=author).exists()
+    return {'author': author, 'following': following}
+
+
+def post_actions_context(request, post_id, author):
+    """Ссылка на редактирование и форма комментария поста post_id."""
+    return {
+        'post_id': post_id,
+        'author': author,
+        'form': CommentForm() if request.user.is_authenticated else None,
+    }
+
+
+register_hole('switcher', 'posts/includes/switcher.html')
+register_hole('follow_button', 'posts/includes/follow_button.html',
+              follow_context)
+register_hole('post_actions', 'posts/includes/post_actions.html',
+              post_actions_context)
@@ -0,0 +1,399 @@
+import csv
+import json
+import time
+from collections import Counter
+from contextlib import contextmanager
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .counters import (change_comments_counter, change_user_counter,
+                       recount_user)
+from .fragments import bump_feed_version
+from .groups import reset_group_feed
+from .popular import post_score, rescore_posts, reset_popular
+from .models import Comment, Follow, Group, Post, TimelineEntry
+from .search import TermSearch, index_comment, index_post, search_backend
+
+User = get_user_model()
+
+# Наибольшее число параметров в одном запросе IN (...): ограничение SQLite
+IN_CHUNK = 500
+
+
+class InvalidRow(ValueError):
+    """Строка импорта не прошла проверку."""
+
+
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def read_rows(stream, fmt):
+    """Функция read_rows читает строки NDJSON или CSV из потока и отдает
+    пары (номер строки, словарь) по одной, не загружая файл в память."""
+    if fmt == 'csv':
+        for number, row in enumerate(csv.DictReader(stream), start=2):
+            yield number, row
+        return
+    for number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as error:
+            yield number, InvalidRow(f'неверный JSON: {error}')
+            continue
+        if not isinstance(row, dict):
+            row = InvalidRow('ожидается JSON-объект')
+        yield number, row
+
+
+@contextmanager
+def explicit_dates(model, field_name):
+    """Отключает auto_now_add у поля даты, чтобы bulk_create сохранил
+    даты из импортируемых строк."""
+    field = model._meta.get_field(field_name)
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+class UserMap:
+    """Словарь имя пользователя -> id. Неизвестные имена догружаются
+    одним запросом на пачку строк."""
+
+    def __init__(self):
+        self.ids = {}
+
+    def load(self, usernames):
+        missing = {name for name in usernames if name not in self.ids}
+        for names in chunks(missing, IN_CHUNK):
+            self.ids.update(User.objects.filter(
+                username__in=names).values_list('username', 'pk'))
+        for name in missing:
+            self.ids.setdefault(name, None)
+
+    def get(self, username):
+        user_id = self.ids.get(username)
+        if user_id is None:
+            raise InvalidRow(f'нет пользователя {username!r}')
+        return user_id
+
+
+def field(row, *names, required=True):
+    """Возвращает значение первого из полей names (имена из выгрузки
+    export_data и короткие синонимы)."""
+    for name in names:
+        value = row.get(name)
+        if value not in (None, ''):
+            return value
+    if required:
+        raise InvalidRow(f'не заполнено поле {names[0]}')
+    return None
+
+
+def date_field(row, *names):
+    value = field(row, *names, required=False)
+    if value is None:
+        return timezone.now()
+    date = parse_datetime(value)
+    if date is None:
+        raise InvalidRow(f'неверная дата {value!r}')
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date
+
+
+def pk_field(row, name, keep_ids):
+    if not keep_ids or row.get(name) in (None, ''):
+        return None
+    try:
+        return int(row[name])
+    except (TypeError, ValueError):
+        raise InvalidRow(f'неверный {name} {row[name]!r}')
+
+
+class BaseImporter:
+    """Базовый импортер: читает строки пачками по batch_size, проверяет
+    каждую пачку целиком (связанные объекты загружаются одним запросом на
+    пачку) и вставляет ее через bulk_create в отдельной транзакции.
+    Неверные строки пропускаются и попадают в errors."""
+    usernames = ()
+
+    def __init__(self, batch_size=500, keep_ids=False):
+        self.batch_size = batch_size
+        self.keep_ids = keep_ids
+        self.users = UserMap()
+        self.imported = 0
+        self.skipped = 0
+        self.errors = []
+        self.seconds = 0.0
+
+    def run(self, rows, progress=None):
+        start = time.perf_counter()
+        for batch in chunks(rows, self.batch_size):
+            valid = [(number, row) for number, row in batch
+                     if not self.reject(number, row)]
+            self.users.load(str(row.get(name))
+                            for _, row in valid
+                            for names in self.usernames
+                            for name in names if row.get(name))
+            self.prepare(row for _, row in valid)
+            built = []
+            for number, row in valid:
+                try:
+                    built.append((number, self.build(row)))
+                except InvalidRow as error:
+                    self.reject(number, error)
+            objects = self.drop_taken_ids(built)
+            with transaction.atomic():
+                self.imported += self.insert(objects)
+            if progress:
+                progress(self)
+        if self.imported:
+            bump_feed_version()
+        self.seconds = time.perf_counter() - start
+        return self
+
+    def reject(self, number, row):
+        if not isinstance(row, InvalidRow):
+            return False
+        self.skipped += 1
+        self.errors.append((number, str(row)))
+        return True
+
+    def drop_taken_ids(self, built):
+        """Отбрасывает как неверные строки с явным id (--keep-ids), который
+        уже есть в БД или повторяется в пачке: иначе bulk_create упадет с
+        IntegrityError и прервет весь импорт. Занятые id проверяются одним
+        запросом на пачку."""
+        ids = {obj.pk for _, obj in built if obj.pk is not None}
+        taken = set()
+        if ids:
+            model = type(built[0][1])
+            for chunk in chunks(ids, IN_CHUNK):
+                taken.update(model.objects.filter(
+                    pk__in=chunk).values_list('pk', flat=True))
+        objects = []
+        for number, obj in built:
+            if obj.pk is not None:
+                if obj.pk in taken:
+                    self.reject(number, InvalidRow(f'id {obj.pk} уже занят'))
+                    continue
+                taken.add(obj.pk)
+            objects.append(obj)
+        return objects
+
+    @property
+    def rate(self):
+        return (self.imported + self.skipped) / self.seconds if (
+            self.seconds) else 0.0
+
+    def prepare(self, rows):
+        """Загружает связанные объекты пачки, кроме пользователей."""
+
+    def build(self, row):
+        raise NotImplementedError
+
+    def insert(self, objects):
+        raise NotImplementedError
+
+
+class PostImporter(BaseImporter):
+    """Импорт постов. После вставки обновляются счетчики авторов, ленты
+    подписчиков, списки лент групп и популярных постов и (без FTS5)
+    поисковый индекс."""
+    usernames = (('author__username', 'author'),)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.groups = dict(Group.objects.values_list('slug', 'pk'))
+
+    def build(self, row):
+        group = field(row, 'group__slug', 'group', required=False)
+        if group is not None and group not in self.groups:
+            raise InvalidRow(f'нет группы {group!r}')
+        pub_date = date_field(row, 'pub_date')
+        return Post(
+            pk=pk_field(row, 'id', self.keep_ids),
+            text=field(row, 'text'),
+            author_id=self.users.get(field(row, 'author__username',
+                                           'author')),
+            group_id=self.groups.get(group),
+            pub_date=pub_date,
+            image=field(row, 'image', required=False) or '',
+            score=post_score(pub_date),
+        )
+
+    def insert(self, posts):
+        if not posts:
+            return 0
+        last_pk = Post.objects.aggregate(last=Max('pk'))['last'] or 0
+        with explicit_dates(Post, 'pub_date'):
+            Post.objects.bulk_create(posts)
+        for author_id, count in Counter(
+                post.author_id for post in posts).items():
+            change_user_counter(author_id, 'posts_count', count)
+        for group_id in {post.group_id for post in posts} - {None}:
+            reset_group_feed(group_id)
+        reset_popular()
+        explicit = [post.pk for post in posts if post.pk is not None]
+        new_posts = Post.objects.filter(
+            Q(pk__gt=last_pk) | Q(pk__in=explicit),
+            author__in={post.author_id for post in posts})
+        fan_out_posts(new_posts)
+        if search_backend() is TermSearch:
+            for post in new_posts.iterator():
+                index_post(post)
+        return len(posts)
+
+
+class CommentImporter(BaseImporter):
+    """Импорт комментариев. После вставки обновляются счетчики
+    комментариев и рейтинги постов."""
+    usernames = (('author__username', 'author'),)
+
+    def prepare(self, rows):
+        post_ids = set()
+        for row in rows:
+            try:
+                post_ids.add(int(field(row, 'post_id', 'post')))
+            except (InvalidRow, TypeError, ValueError):
+                pass
+        self.posts = set()
+        for ids in chunks(post_ids, IN_CHUNK):
+            self.posts.update(Post.objects.filter(
+                pk__in=ids).values_list('pk', flat=True))
+
+    def build(self, row):
+        try:
+            post_id = int(field(row, 'post_id', 'post'))
+        except ValueError:
+            raise InvalidRow(f"неверный post_id {row.get('post_id')!r}")
+        if post_id not in self.posts:
+            raise InvalidRow(f'нет поста {post_id}')
+        return Comment(
+            pk=pk_field(row, 'id', self.keep_ids),
+            post_id=post_id,
+            author_id=self.users.get(field(row, 'author__username',
+                                           'author')),
+            text=field(row, 'text'),
+            created=date_field(row, 'created'),
+        )
+
+    def insert(self, comments):
+        if not comments:
+            return 0
+        with explicit_dates(Comment, 'created'):
+            Comment.objects.bulk_create(comments)
+        for post_id, count in Counter(
+                comment.post_id for comment in comments).items():
+            change_comments_counter(post_id, count)
+        rescore_posts({comment.post_id for comment in comments})
+        reset_popular()
+        if search_backend() is TermSearch:
+            for comment in comments:
+                index_comment(comment)
+        return len(comments)
+
+
+class FollowImporter(BaseImporter):
+    """Импорт подписок. Подписки на себя отбрасываются при проверке, а
+    уже существующие пары - одним запросом на пачку; оставшиеся
+    вставляются с ignore_conflicts на случай параллельной подписки."""
+    usernames = (('user__username', 'user'), ('author__username', 'author'))
+
+    def build(self, row):
+        user_id = self.users.get(field(row, 'user__username', 'user'))
+        author_id = self.users.get(field(row, 'author__username', 'author'))
+        if user_id == author_id:
+            raise InvalidRow('нельзя подписаться на самого себя')
+        return Follow(user_id=user_id, author_id=author_id)
+
+    def insert(self, follows):
+        pairs = {(follow.user_id, follow.author_id): follow
+                 for follow in follows}
+        existing = set()
+        for users in chunks({user for user, _ in pairs}, IN_CHUNK):
+            existing.update(Follow.objects.filter(
+                user__in=users,
+                author__in={author for _, author in pairs},
+            ).values_list('user_id', 'author_id'))
+        self.skipped += len(follows) - len(pairs)
+        new_pairs = [pair for pair in pairs if pair not in existing]
+        self.skipped += len(pairs) - len(new_pairs)
+        if not new_pairs:
+            return 0
+        Follow.objects.bulk_create([pairs[pair] for pair in new_pairs],
+                                   ignore_conflicts=True)
+        for user_id in {user for user, _ in new_pairs}:
+            recount_user(user_id)
+        for author_id in {author for _, author in new_pairs}:
+            recount_user(author_id)
+        backfill_pairs(new_pairs)
+        return len(new_pairs)
+
+
+def popular_authors(author_ids):
+    """Функция popular_authors одним запросом находит среди author_ids
+    авторов, у которых не меньше TIMELINE_FANOUT_LIMIT подписчиков."""
+    return set(Follow.objects.filter(author__in=author_ids).values(
+        'author').annotate(followers=Count('pk')).filter(
+        followers__gte=settings.TIMELINE_FANOUT_LIMIT).values_list(
+        'author', flat=True))
+
+
+def fan_out_posts(posts):
+    """Функция fan_out_posts раскладывает пачку импортированных постов по
+    лентам подписчиков их авторов (кроме популярных авторов)."""
+    posts = list(posts.values_list('pk', 'author_id', 'pub_date'))
+    authors = {author_id for _, author_id, _ in posts}
+    authors -= popular_authors(authors)
+    followers = {}
+    for user_id, author_id in Follow.objects.filter(
+            author__in=authors).values_list('user_id', 'author_id'):
+        followers.setdefault(author_id, []).append(user_id)
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+         for pk, author_id, pub_date in posts
+         for user_id in followers.get(author_id, [])],
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill_pairs(pairs):
+    """Функция backfill_pairs заполняет ленты новых подписчиков последними
+    TIMELINE_BACKFILL постами авторов, по запросу на автора."""
+    authors = {author for _, author in pairs}
+    authors -= popular_authors(authors)
+    for author_id in authors:
+        posts = list(Post.objects.filter(author=author_id).values_list(
+            'pk', 'pub_date')[:settings.TIMELINE_BACKFILL])
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+             for user_id, author in pairs if author == author_id
+             for pk, pub_date in posts],
+            batch_size=settings.TIMELINE_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+
+
+IMPORTERS = {
+    'posts': PostImporter,
+    'comments': CommentImporter,
+    'follows': FollowImporter,
+}
@@ -0,0 +1,64 @@
+import gzip
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.export import FORMATS
+from posts.importer import IMPORTERS, read_rows
+
+# Сколько ошибок в строках показывать после импорта
+MAX_ERRORS = 20
+
+
+def detect_format(path):
+    name = path[:-3] if path.endswith('.gz') else path
+    return 'csv' if name.endswith('.csv') else 'ndjson'
+
+
+class Command(BaseCommand):
+    """Команда потоково загружает посты, комментарии или подписки из NDJSON
+    или CSV (в том числе из выгрузки export_data): строки проверяются и
+    вставляются пачками через bulk_create, каждая пачка - в своей
+    транзакции."""
+    help = 'Загружает таблицу из NDJSON или CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('table', choices=list(IMPORTERS))
+        parser.add_argument('input', help='Файл (.gz - сжатый) или - для '
+                                          'stdin')
+        parser.add_argument('--format', choices=list(FORMATS), dest='fmt',
+                            help='По умолчанию - по расширению файла')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--keep-ids', action='store_true',
+                            help='Сохранить id из файла; строки с занятыми '
+                                 'id пропускаются')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть положительным')
+        path = options['input']
+        fmt = options['fmt'] or detect_format(path)
+        importer = IMPORTERS[options['table']](
+            batch_size=options['batch_size'], keep_ids=options['keep_ids'])
+        if path == '-':
+            self.load(importer, sys.stdin, fmt, options['verbosity'])
+        else:
+            opener = gzip.open if path.endswith('.gz') else open
+            try:
+                with opener(path, 'rt', encoding='utf-8', newline='') as file:
+                    self.load(importer, file, fmt, options['verbosity'])
+            except OSError as error:
+                raise CommandError(error)
+        for number, error in importer.errors[:MAX_ERRORS]:
+            self.stderr.write(f'Строка {number}: {error}')
+        self.stdout.write(
+            f'Загружено: {importer.imported}, пропущено: '
+            f'{importer.skipped}, {importer.seconds:.1f} с, '
+            f'{importer.rate:.0f} строк/с')
+
+    def load(self, importer, file, fmt, verbosity):
+        def progress(importer):
+            self.stderr.write(f'Загружено: {importer.imported}')
+
+        importer.run(read_rows(file, fmt),
+                     progress=progress if verbosity > 1 else None)
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.export import (CHUNK_SIZE, EXPORTS, FORMATS, ExportError,
+                          export_chunks)
+
+
+class Command(BaseCommand):
+    """Команда потоково выгружает посты, комментарии, подписки или группы
+    в NDJSON или CSV, не загружая таблицу в память целиком."""
+    help = 'Выгружает таблицу в NDJSON или CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('table', choices=list(EXPORTS))
+        parser.add_argument('--format', choices=list(FORMATS),
+                            default='ndjson', dest='fmt')
+        parser.add_argument('--output', default='-',
+                            help='Файл для выгрузки, по умолчанию stdout')
+        parser.add_argument('--gzip', action='store_true',
+                            help='Сжать выгрузку (только в файл)')
+        parser.add_argument('--since', help='С даты ГГГГ-ММ-ДД')
+        parser.add_argument('--until', help='По дату ГГГГ-ММ-ДД')
+        parser.add_argument('--author', help='Имя пользователя автора')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        if options['gzip'] and options['output'] == '-':
+            raise CommandError('Сжатая выгрузка пишется только в файл, '
+                               'укажите --output')
+        try:
+            chunks = export_chunks(
+                options['table'], fmt=options['fmt'],
+                compress=options['gzip'], chunk_size=options['chunk_size'],
+                since=options['since'], until=options['until'],
+                author=options['author'])
+        except ExportError as error:
+            raise CommandError(error)
+        size = 0
+        if options['output'] == '-':
+            for chunk in chunks:
+                self.stdout.write(chunk.decode(), ending='')
+                size += len(chunk)
+        else:
+            with open(options['output'], 'wb') as output:
+                for chunk in chunks:
+                    output.write(chunk)
+                    size += len(chunk)
+        self.stderr.write(f'Выгружено байт: {size}')
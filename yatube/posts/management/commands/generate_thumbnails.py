@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.thumbnails import generate_thumbnail
+
+
+class Command(BaseCommand):
+    """Команда строит миниатюры для постов с картинкой, у которых их еще
+    нет (например, созданных до появления фоновой генерации)."""
+    help = 'Строит недостающие миниатюры картинок постов'
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').filter(
+            image_thumbnail='').values_list('pk', flat=True)
+        generated = 0
+        for post_id in posts.iterator():
+            if generate_thumbnail(post_id):
+                generated += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Построено миниатюр: {generated}'))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from posts.models import Post
+from posts.search import (TermSearch, index_post, install_fts5,
+                          rebuild_fts5, search_backend)
+
+
+class Command(BaseCommand):
+    """Команда заново строит поисковый индекс постов и комментариев:
+    таблицы FTS5 либо обратный индекс SearchTerm, смотря по бэкенду."""
+    help = 'Перестраивает поисковый индекс постов'
+
+    def handle(self, *args, **options):
+        if search_backend() is TermSearch:
+            indexed = 0
+            for post in Post.objects.iterator():
+                with transaction.atomic():
+                    index_post(post)
+                indexed += 1
+            self.stdout.write(self.style.SUCCESS(
+                f'Проиндексировано постов: {indexed}'))
+            return
+        install_fts5(connection)
+        rebuild_fts5(connection)
+        self.stdout.write(self.style.SUCCESS('Индекс FTS5 перестроен'))
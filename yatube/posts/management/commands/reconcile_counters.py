@@ -0,0 +1,55 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from posts.counters import recount_post, recount_user
+from posts.models import Comment, Follow, Post, UserStats
+
+User = get_user_model()
+
+
+def count_subquery(queryset, field):
+    """Функция count_subquery возвращает подзапрос с количеством строк
+    queryset, у которых field ссылается на внешнего пользователя/пост."""
+    counts = queryset.filter(**{field: OuterRef('pk')}).order_by().values(
+        field).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+class Command(BaseCommand):
+    """Команда сверяет денормализованные счетчики постов, комментариев и
+    подписок с реальными данными и исправляет расхождения."""
+    help = 'Пересчитывает счетчики UserStats и Post.comments_count'
+
+    def handle(self, *args, **options):
+        users = User.objects.annotate(
+            real_posts=count_subquery(Post.objects, 'author'),
+            real_followers=count_subquery(Follow.objects, 'author'),
+            real_following=count_subquery(Follow.objects, 'user'),
+        ).values_list('pk', 'real_posts', 'real_followers', 'real_following')
+        stored = {
+            stats[0]: stats[1:] for stats in UserStats.objects.values_list(
+                'user_id', 'posts_count', 'followers_count',
+                'following_count')
+        }
+        users_fixed = 0
+        for user_id, *real in users.iterator():
+            if stored.get(user_id) != tuple(real):
+                with transaction.atomic():
+                    recount_user(user_id)
+                users_fixed += 1
+
+        posts = Post.objects.annotate(
+            real_comments=count_subquery(Comment.objects, 'post'),
+        ).exclude(comments_count=F('real_comments')).values_list(
+            'pk', flat=True)
+        posts_fixed = 0
+        for post_id in posts.iterator():
+            recount_post(post_id)
+            posts_fixed += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено счетчиков: пользователей {users_fixed}, '
+            f'постов {posts_fixed}'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.popular import build_popular, rescore_posts
+
+
+class Command(BaseCommand):
+    """Команда заново строит список популярных постов по индексу рейтинга
+    и убирает из него затухшие посты. Запускается по расписанию (cron),
+    например раз в несколько минут; с --rescore сначала пересчитывает
+    рейтинги всех постов по комментариям."""
+    help = 'Обновляет список популярных постов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rescore', action='store_true',
+                            help='пересчитать рейтинги всех постов')
+
+    def handle(self, *args, **options):
+        if options['rescore']:
+            rescore_posts(Post.objects.values_list('pk', flat=True))
+        state = build_popular()
+        self.stdout.write(self.style.SUCCESS(
+            f"Популярных постов: {len(state['entries'])}"))
@@ -0,0 +1,76 @@
+# Generated by Django 2.2.16 on 2026-10-18 01:59
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, OuterRef, Q, Subquery
+
+
+def fill_comments_count(apps, schema_editor):
+    """Заполняет счетчики комментариев уже существующих постов."""
+    Comment = apps.get_model('posts', 'Comment')
+    Post = apps.get_model('posts', 'Post')
+    comments = Comment.objects.filter(post=OuterRef('pk')).order_by().values(
+        'post').annotate(total=Count('pk')).values('total')
+    Post.objects.filter(comments__isnull=False).distinct().update(
+        comments_count=Subquery(comments))
+
+
+def fill_user_stats(apps, schema_editor):
+    """Заполняет счетчики пользователей, у которых есть посты или
+    подписки."""
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    UserStats = apps.get_model('posts', 'UserStats')
+
+    def count(queryset, field):
+        return Subquery(queryset.filter(**{field: OuterRef('pk')}).order_by(
+            ).values(field).annotate(total=Count('pk')).values('total'))
+
+    users = User.objects.filter(
+        Q(posts__isnull=False) | Q(follower__isnull=False)
+        | Q(following__isnull=False)).distinct().annotate(
+        posts_total=count(Post.objects, 'author'),
+        followers_total=count(Follow.objects, 'author'),
+        following_total=count(Follow.objects, 'user'),
+    ).values_list('pk', 'posts_total', 'followers_total', 'following_total')
+    UserStats.objects.bulk_create(
+        (UserStats(user_id=pk, posts_count=posts or 0,
+                   followers_count=followers or 0,
+                   following_count=following or 0)
+         for pk, posts, followers, following in users.iterator()),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0014_timelineentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Комментариев'),
+        ),
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Постов')),
+                ('followers_count', models.PositiveIntegerField(default=0, verbose_name='Подписчиков')),
+                ('following_count', models.PositiveIntegerField(default=0, verbose_name='Подписок')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Счетчики пользователя',
+                'verbose_name_plural': 'Счетчики пользователей',
+            },
+        ),
+        migrations.RunPython(fill_comments_count, migrations.RunPython.noop),
+        migrations.RunPython(fill_user_stats, migrations.RunPython.noop),
+    ]
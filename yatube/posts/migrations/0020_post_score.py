@@ -0,0 +1,45 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:47
+
+from django.db import migrations, models
+
+from posts.popular import comment_score, log_add, post_score
+
+CHUNK = 500
+
+
+def fill_scores(apps, schema_editor):
+    """Считает рейтинги существующих постов по дате публикации и
+    комментариям, чтобы они сразу попали во вкладку "Популярное"."""
+    Comment = apps.get_model('posts', 'Comment')
+    Post = apps.get_model('posts', 'Post')
+    post_ids = list(Post.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(post_ids), CHUNK):
+        chunk = post_ids[start:start + CHUNK]
+        scores = {pk: post_score(pub_date) for pk, pub_date in
+                  Post.objects.filter(pk__in=chunk).values_list(
+                      'pk', 'pub_date')}
+        for post_id, created in Comment.objects.filter(
+                post__in=chunk).values_list('post_id', 'created'):
+            scores[post_id] = log_add(scores[post_id], comment_score(created))
+        for pk, score in scores.items():
+            Post.objects.filter(pk=pk).update(score=score)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_post_updated'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='score',
+            field=models.FloatField(default=0, editable=False, verbose_name='Рейтинг'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['score'], name='post_score_idx'),
+        ),
+        migrations.RunPython(fill_scores, migrations.RunPython.noop),
+    ]
@@ -24,6 +24,8 @@ class Post(models.Model):
     """Модель создает таблицу поста с его наименованием и содержанием."""
     text = models.TextField(verbose_name='Пост')
     pub_date = models.DateTimeField(auto_now_add=True, verbose_name="Дата")
+    updated = models.DateTimeField(auto_now=True,
+                                   verbose_name='Дата изменения')
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -38,12 +40,28 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    image_thumbnail = models.CharField(
+        max_length=255, blank=True, editable=False,
+        verbose_name='Миниатюра картинки')
+    comments_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Комментариев')
+    # Рейтинг для вкладки "Популярное" (см. posts/popular.py)
+    score = models.FloatField(default=0, editable=False,
+                              verbose_name='Рейтинг')
 
     class Meta:
         """Класс описывает порядок сортировки и задает удобочитаемое имя."""
         ordering = ['-pub_date']
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            models.Index(fields=['pub_date'], name='post_pub_date_idx'),
+            models.Index(fields=['author', 'pub_date'],
+                         name='post_author_pub_date_idx'),
+            models.Index(fields=['group', 'pub_date'],
+                         name='post_group_pub_date_idx'),
+            models.Index(fields=['score'], name='post_score_idx'),
+        ]
 
     def __str__(self):
         return self.text[:settings.OUTPUT_ELEMENTS_OF_POSTS]
@@ -68,6 +86,10 @@ class Comment(models.Model):
         ordering = ['-created']
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            models.Index(fields=['post', 'created'],
+                         name='comment_post_created_idx'),
+        ]
 
 
 class Follow(models.Model):
@@ -94,3 +116,71 @@ class Follow(models.Model):
                 name='user_cannot_follow_yourself'
             )
         ]
+
+
+class TimelineEntry(models.Model):
+    """Модель хранит материализованную ленту подписок пользователя:
+    ссылку на пост автора, на которого он подписан, и дату поста."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='timeline',
+                             verbose_name='Пользователь')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name='timeline_entries',
+                             verbose_name='Пост')
+    pub_date = models.DateTimeField(verbose_name='Дата')
+
+    class Meta:
+        """Класс описывает порядок сортировки и задает удобочитаемое имя."""
+        ordering = ['-pub_date']
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_user_post'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'pub_date', 'post'],
+                         name='timeline_user_date_post_idx'),
+        ]
+
+
+class UserStats(models.Model):
+    """Модель хранит денормализованные счетчики пользователя: число его
+    постов, подписчиков и подписок."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE,
+                                related_name='stats',
+                                verbose_name='Пользователь')
+    posts_count = models.PositiveIntegerField(default=0,
+                                              verbose_name='Постов')
+    followers_count = models.PositiveIntegerField(default=0,
+                                                  verbose_name='Подписчиков')
+    following_count = models.PositiveIntegerField(default=0,
+                                                  verbose_name='Подписок')
+
+    class Meta:
+        """Класс задает удобочитаемое имя."""
+        verbose_name = 'Счетчики пользователя'
+        verbose_name_plural = 'Счетчики пользователей'
+
+
+class SearchTerm(models.Model):
+    """Модель хранит обратный индекс постов для поиска без FTS5: вес слова
+    в тексте поста и в комментариях к нему."""
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name='search_terms',
+                             verbose_name='Пост')
+    term = models.CharField(max_length=100, verbose_name='Слово')
+    weight = models.FloatField(default=0, verbose_name='Вес')
+
+    class Meta:
+        """Класс задает удобочитаемое имя."""
+        verbose_name = 'Слово поискового индекса'
+        verbose_name_plural = 'Поисковый индекс'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['term', 'post'],
+                name='unique_term_post'
+            ),
+        ]
@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+
+from core.db.router import read_cache_timeout
+from core.holes import fill_holes
+
+from .conditional import cache_headers, not_modified, page_etag, set_validators
+
+PAGE_CACHE_PREFIX = 'posts:page:'
+
+
+def page_response(request, key, last_modified, template, build):
+    """Функция page_response отдает HTML-страницу версии key. Если у
+    клиента актуальная версия, отвечает 304. Иначе берет из кэша страницу,
+    общую для всех пользователей, а при промахе рисует ее по контексту
+    build() с метками на месте частей, зависящих от пользователя (см.
+    core/holes.py), и кладет в кэш на PAGE_CACHE_TIMEOUT (страницы с
+    реплики - короче, см. core/db/router.py). Метки заполняются для
+    пользователя запроса, так что анонимам и авторизованным отдается одна
+    закэшированная страница. При
+    PAGE_CACHE_TIMEOUT = 0 кэш страниц выключен."""
+    etag = page_etag(request, key)
+    response = not_modified(request, etag, last_modified)
+    if response is None:
+        cache_key = PAGE_CACHE_PREFIX + key.strip('"')
+        timeout = read_cache_timeout(settings.PAGE_CACHE_TIMEOUT)
+        content = cache.get(cache_key) if timeout else None
+        if content is None:
+            content = render_to_string(
+                template, {**build(), 'punch_holes': True}, request)
+            if timeout:
+                cache.set(cache_key, content, timeout)
+        response = HttpResponse(fill_holes(request, content))
+        set_validators(response, etag, last_modified)
+    return cache_headers(request, response)
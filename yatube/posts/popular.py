@@ -0,0 +1,197 @@
+"""Вкладка "Популярное": посты по затухающей вовлеченности.
+
+Вклад поста (POPULAR_POST_WEIGHT) и каждого комментария к нему
+(POPULAR_COMMENT_WEIGHT) затухает вдвое за POPULAR_HALF_LIFE секунд.
+Рейтинг поста хранится в Post.score как двоичный логарифм суммы вкладов,
+отсчитанных от постоянной точки SCORE_ORIGIN:
+
+    score = log2(sum(weight * 2 ** ((t - SCORE_ORIGIN) / POPULAR_HALF_LIFE)))
+
+Текущая вовлеченность поста равна 2 ** (score - exponent(now)) и у всех
+постов затухает одинаково, поэтому порядок по score совпадает с порядком
+по вовлеченности в любой момент и рейтинги не пересчитываются с течением
+времени: новый комментарий прибавляет свой вклад к рейтингу одного поста.
+
+Первые POPULAR_SIZE постов хранятся в общем кэше списком пар (score, id),
+который обновляется при изменении рейтингов. Посты, чья вовлеченность
+затухла ниже POPULAR_MIN_ENGAGEMENT, не показываются. Команда
+update_popular, запускаемая по расписанию, строит список заново по индексу
+post_score_idx, а с --rescore пересчитывает рейтинги по комментариям.
+"""
+import datetime as dt
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from core.cache.state import locked_state, store_state
+from core.db.router import read_cache_timeout
+
+from .models import Comment, Post
+
+SCORE_ORIGIN = dt.datetime(2020, 1, 1, tzinfo=dt.timezone.utc)
+POPULAR_KEY = 'posts:popular'
+RESCORE_CHUNK = 500
+
+
+def exponent(moment):
+    """Функция exponent возвращает число периодов полураспада от
+    SCORE_ORIGIN до moment."""
+    return (moment - SCORE_ORIGIN).total_seconds() / (
+        settings.POPULAR_HALF_LIFE)
+
+
+def contribution(weight, moment):
+    """Функция contribution возвращает вклад веса weight в момент moment
+    в логарифмической шкале рейтинга."""
+    return math.log2(weight) + exponent(moment)
+
+
+def log_add(score, value):
+    """Функция log_add складывает вклады в логарифмической шкале."""
+    high, low = max(score, value), min(score, value)
+    return high + math.log2(1 + 2 ** (low - high))
+
+
+def post_score(pub_date):
+    """Функция post_score возвращает рейтинг поста без комментариев."""
+    return contribution(settings.POPULAR_POST_WEIGHT, pub_date)
+
+
+def comment_score(created):
+    return contribution(settings.POPULAR_COMMENT_WEIGHT, created)
+
+
+def engagement(score, now=None):
+    """Функция engagement возвращает текущую вовлеченность поста с
+    рейтингом score."""
+    return 2 ** (score - exponent(now or timezone.now()))
+
+
+def min_score(now=None):
+    """Функция min_score возвращает рейтинг, ниже которого вовлеченность
+    поста сейчас меньше POPULAR_MIN_ENGAGEMENT."""
+    return contribution(settings.POPULAR_MIN_ENGAGEMENT,
+                        now or timezone.now())
+
+
+def rescore_posts(post_ids):
+    """Функция rescore_posts пересчитывает рейтинги постов post_ids по их
+    комментариям (по запросу на пачку из RESCORE_CHUNK постов)."""
+    post_ids = list(post_ids)
+    for start in range(0, len(post_ids), RESCORE_CHUNK):
+        chunk = post_ids[start:start + RESCORE_CHUNK]
+        scores = {pk: post_score(pub_date) for pk, pub_date in
+                  Post.objects.filter(pk__in=chunk).values_list(
+                      'pk', 'pub_date')}
+        comments = Comment.objects.filter(post__in=chunk).values_list(
+            'post_id', 'created')
+        for post_id, created in comments.iterator():
+            scores[post_id] = log_add(scores[post_id], comment_score(created))
+        with transaction.atomic():
+            for pk, score in scores.items():
+                Post.objects.filter(pk=pk).update(score=score)
+
+
+def change_score(post_id, created, sign=1):
+    """Функция change_score прибавляет к рейтингу поста post_id вклад
+    комментария, созданного в created, а при sign = -1 вычитает его.
+    Возвращает новый рейтинг или None, если поста уже нет."""
+    with transaction.atomic():
+        score = Post.objects.select_for_update().filter(
+            pk=post_id).values_list('score', flat=True).first()
+        if score is None:
+            return None
+        value = comment_score(created)
+        if sign > 0:
+            score = log_add(score, value)
+        elif value < score - 1e-9:
+            score += math.log2(1 - 2 ** (value - score))
+        else:
+            # Вклад сравнялся с рейтингом из-за округления: пересчет
+            rescore_posts([post_id])
+            return Post.objects.values_list('score', flat=True).get(
+                pk=post_id)
+        Post.objects.filter(pk=post_id).update(score=score)
+    return score
+
+
+def build_popular():
+    """Функция build_popular строит список популярных постов по индексу
+    рейтинга и кладет его в кэш. Список, прочитанный с реплики, хранится
+    не дольше REPLICA_CACHE_TIMEOUT секунд."""
+    posts = Post.objects.filter(score__gte=min_score()).order_by(
+        '-score', '-pk').values_list('score', 'pk')
+    entries = list(posts[:settings.POPULAR_SIZE])
+    state = {
+        'entries': entries,
+        'complete': len(entries) < settings.POPULAR_SIZE,
+        'version': time.time(),
+    }
+    return store_state(POPULAR_KEY, state,
+                       read_cache_timeout(settings.POPULAR_TIMEOUT))
+
+
+def reset_popular():
+    """Функция reset_popular удаляет список популярных постов; он будет
+    построен заново при следующем чтении."""
+    cache.delete(POPULAR_KEY)
+
+
+def update_popular(post_id, score=None):
+    """Функция update_popular переставляет пост в списке популярных по
+    новому рейтингу score, а без рейтинга - убирает пост из списка."""
+    with locked_state(POPULAR_KEY, settings.POPULAR_TIMEOUT) as state:
+        if state is None:
+            return
+        entries = [entry for entry in state['entries']
+                   if entry[1] != post_id]
+        if score is not None:
+            entry = (score, post_id)
+            position = next((index for index, other in enumerate(entries)
+                             if other < entry), len(entries))
+            # Пост за концом неполного списка может уступать постам,
+            # которых в списке нет
+            if position < len(entries) or state['complete']:
+                entries.insert(position, entry)
+            if len(entries) > settings.POPULAR_SIZE:
+                del entries[settings.POPULAR_SIZE:]
+                state['complete'] = False
+        state['entries'] = entries
+        state['version'] = time.time()
+
+
+class PopularFeed:
+    """Лента популярных постов для Paginator: посты страницы читаются
+    одним запросом по списку id из кэша."""
+
+    def __init__(self):
+        self.state = cache.get(POPULAR_KEY) or build_popular()
+        cutoff = min_score()
+        self.ids = [pk for score, pk in self.state['entries']
+                    if score >= cutoff]
+        self.queryset = Post.objects.select_related('author', 'group')
+
+    @property
+    def changed_at(self):
+        return dt.datetime.fromtimestamp(self.state['version'],
+                                         dt.timezone.utc)
+
+    def count(self):
+        return len(self.ids)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        ids = self.ids[index]
+        posts = self.queryset.in_bulk(ids)
+        if len(posts) < len(ids):
+            # Список устарел: пост удален без сигнала
+            reset_popular()
+        return [posts[pk] for pk in ids if pk in posts]
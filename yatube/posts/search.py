@@ -0,0 +1,311 @@
+import math
+import re
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import F
+from django.db.utils import OperationalError
+
+from .models import Post, SearchTerm
+
+# Слово - последовательность букв и цифр, как у токенизатора unicode61
+WORD_RE = re.compile(r'[^\W_]+')
+MAX_QUERY_TERMS = 10
+TERM_LENGTH = 100
+
+FTS5_TABLES = {
+    'posts_post_fts': (
+        "CREATE VIRTUAL TABLE posts_post_fts USING fts5("
+        "text, content='posts_post', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2')"
+    ),
+    'posts_comment_fts': (
+        "CREATE VIRTUAL TABLE posts_comment_fts USING fts5("
+        "text, post_id UNINDEXED, content='posts_comment', "
+        "content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+    ),
+}
+# Триггеры пересоздаются после каждой миграции: SQLite удаляет их вместе
+# с таблицей, когда Django пересобирает ее при изменении полей
+FTS5_TRIGGERS = [
+    "CREATE TRIGGER IF NOT EXISTS posts_post_fts_ai "
+    "AFTER INSERT ON posts_post BEGIN "
+    "INSERT INTO posts_post_fts(rowid, text) VALUES (new.id, new.text); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS posts_post_fts_ad "
+    "AFTER DELETE ON posts_post BEGIN "
+    "INSERT INTO posts_post_fts(posts_post_fts, rowid, text) "
+    "VALUES ('delete', old.id, old.text); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS posts_post_fts_au "
+    "AFTER UPDATE OF text ON posts_post BEGIN "
+    "INSERT INTO posts_post_fts(posts_post_fts, rowid, text) "
+    "VALUES ('delete', old.id, old.text); "
+    "INSERT INTO posts_post_fts(rowid, text) VALUES (new.id, new.text); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS posts_comment_fts_ai "
+    "AFTER INSERT ON posts_comment BEGIN "
+    "INSERT INTO posts_comment_fts(rowid, text, post_id) "
+    "VALUES (new.id, new.text, new.post_id); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS posts_comment_fts_ad "
+    "AFTER DELETE ON posts_comment BEGIN "
+    "INSERT INTO posts_comment_fts(posts_comment_fts, rowid, text, post_id) "
+    "VALUES ('delete', old.id, old.text, old.post_id); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS posts_comment_fts_au "
+    "AFTER UPDATE OF text, post_id ON posts_comment BEGIN "
+    "INSERT INTO posts_comment_fts(posts_comment_fts, rowid, text, post_id) "
+    "VALUES ('delete', old.id, old.text, old.post_id); "
+    "INSERT INTO posts_comment_fts(rowid, text, post_id) "
+    "VALUES (new.id, new.text, new.post_id); "
+    "END",
+]
+
+# Наличие таблиц FTS5 по псевдонимам баз данных
+_fts5_installed = {}
+
+
+def tokenize(text):
+    """Функция tokenize разбивает текст на слова в нижнем регистре."""
+    return [word[:TERM_LENGTH] for word in WORD_RE.findall(text.lower())]
+
+
+def query_terms(query):
+    """Функция query_terms возвращает неповторяющиеся слова запроса, не
+    больше MAX_QUERY_TERMS."""
+    return list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+
+
+def install_fts5(connection):
+    """Функция install_fts5 создает недостающие таблицы FTS5, заполняет их
+    по текущим постам и комментариям и (пере)создает триггеры, которые
+    поддерживают их в актуальном состоянии. Возвращает False, если база не
+    SQLite или SQLite собран без FTS5."""
+    if connection.vendor != 'sqlite':
+        return False
+    existing = set(connection.introspection.table_names())
+    with connection.cursor() as cursor:
+        for table, sql in FTS5_TABLES.items():
+            if table in existing:
+                continue
+            try:
+                with transaction.atomic(using=connection.alias):
+                    cursor.execute(sql)
+            except OperationalError:
+                _fts5_installed[connection.alias] = False
+                return False
+            cursor.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+        for sql in FTS5_TRIGGERS:
+            cursor.execute(sql)
+    _fts5_installed[connection.alias] = True
+    return True
+
+
+def rebuild_fts5(connection):
+    """Функция rebuild_fts5 заново строит таблицы FTS5 по постам и
+    комментариям."""
+    with connection.cursor() as cursor:
+        for table in FTS5_TABLES:
+            cursor.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+
+
+def fts5_installed(using=DEFAULT_DB_ALIAS):
+    """Функция fts5_installed проверяет, созданы ли в базе таблицы FTS5."""
+    if using not in _fts5_installed:
+        connection = connections[using]
+        _fts5_installed[using] = (
+            connection.vendor == 'sqlite'
+            and set(FTS5_TABLES) <= set(
+                connection.introspection.table_names()))
+    return _fts5_installed[using]
+
+
+def search_backend(using=DEFAULT_DB_ALIAS):
+    """Функция search_backend выбирает поисковый бэкенд по настройке
+    SEARCH_BACKEND: 'fts5', 'python' или 'auto' (FTS5, если он доступен)."""
+    if settings.SEARCH_BACKEND == 'python':
+        return TermSearch
+    if settings.SEARCH_BACKEND == 'fts5' or fts5_installed(using):
+        return FTS5Search
+    return TermSearch
+
+
+class FTS5Search:
+    """Поиск по таблицам FTS5, которые SQLite обновляет триггерами.
+    Каждое слово запроса ищется отдельно, и, как в TermSearch, пост
+    находится, если каждое слово есть в его тексте или в каком-нибудь из
+    комментариев. Релевантность поста - сумма bm25 по его тексту и по
+    комментариям, взятым с весом SEARCH_COMMENT_WEIGHT."""
+    TERM_MATCHES = (
+        'SELECT rowid AS post_id, {term} AS term, '
+        'bm25(posts_post_fts) AS score '
+        'FROM posts_post_fts WHERE posts_post_fts MATCH %s '
+        'UNION ALL '
+        'SELECT post_id, {term}, bm25(posts_comment_fts) * %s '
+        'FROM posts_comment_fts WHERE posts_comment_fts MATCH %s'
+    )
+
+    def __init__(self, terms):
+        matches = []
+        self.params = []
+        for number, term in enumerate(terms):
+            matches.append(self.TERM_MATCHES.format(term=number))
+            match = f'"{term}"*'
+            self.params += [match, settings.SEARCH_COMMENT_WEIGHT, match]
+        self.found = (
+            f'SELECT post_id, SUM(score) AS score '
+            f'FROM ({" UNION ALL ".join(matches)}) GROUP BY post_id '
+            f'HAVING COUNT(DISTINCT term) = {len(terms)}'
+        )
+
+    def _fetch(self, sql, params):
+        with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def count(self):
+        sql = f'SELECT COUNT(*) FROM ({self.found})'
+        return self._fetch(sql, self.params)[0][0]
+
+    def ranked_ids(self, offset, limit):
+        # bm25 тем меньше, чем документ релевантнее
+        sql = (f'SELECT post_id FROM ({self.found}) '
+               f'ORDER BY score, post_id DESC LIMIT %s OFFSET %s')
+        rows = self._fetch(sql, self.params + [limit, offset])
+        return [post_id for post_id, in rows]
+
+    def filter(self, queryset):
+        # RawSQL внутри pk__in оборачивается в лишние скобки, и SQLite
+        # сравнивает id только с первой строкой подзапроса
+        return queryset.extra(
+            where=[f'posts_post.id IN (SELECT post_id FROM ({self.found}))'],
+            params=self.params)
+
+
+class TermSearch:
+    """Поиск по обратному индексу SearchTerm для баз без FTS5. Индекс
+    ведется сигналами, релевантность считается в Python по формуле BM25
+    с насыщением веса слова."""
+
+    def __init__(self, terms):
+        self.terms = terms
+        self._ranking = None
+
+    def ranking(self):
+        if self._ranking is None:
+            total = Post.objects.count()
+            scores = defaultdict(float)
+            matched = Counter()
+            for term in self.terms:
+                weights = defaultdict(float)
+                postings = SearchTerm.objects.filter(
+                    term__startswith=term).values_list('post_id', 'weight')
+                for post_id, weight in postings:
+                    weights[post_id] += weight
+                found = len(weights)
+                idf = math.log(1 + (total - found + 0.5) / (found + 0.5))
+                for post_id, weight in weights.items():
+                    scores[post_id] += idf * weight * 2.2 / (weight + 1.2)
+                    matched[post_id] += 1
+            ranking = [post_id for post_id in scores
+                       if matched[post_id] == len(self.terms)]
+            ranking.sort(key=lambda post_id: (-scores[post_id], -post_id))
+            self._ranking = ranking
+        return self._ranking
+
+    def count(self):
+        return len(self.ranking())
+
+    def ranked_ids(self, offset, limit):
+        return self.ranking()[offset:offset + limit]
+
+    def filter(self, queryset):
+        for term in self.terms:
+            queryset = queryset.filter(pk__in=SearchTerm.objects.filter(
+                term__startswith=term).values('post'))
+        return queryset
+
+
+class SearchResults:
+    """Класс SearchResults - найденные по запросу посты, отсортированные
+    по релевантности. Поддерживает count() и срезы, поэтому передается в
+    Paginator вместо queryset; срез загружает только посты страницы."""
+
+    def __init__(self, query):
+        self.terms = query_terms(query)
+        self.backend = search_backend()(self.terms)
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            self._count = self.backend.count() if self.terms else 0
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        start = key.start or 0
+        stop = self.count() if key.stop is None else key.stop
+        if not self.terms or stop <= start:
+            return []
+        ids = self.backend.ranked_ids(start, stop - start)
+        posts = Post.objects.select_related('author', 'group').in_bulk(ids)
+        return [posts[post_id] for post_id in ids if post_id in posts]
+
+
+def search_posts(query):
+    """Функция search_posts ищет посты по тексту и комментариям."""
+    return SearchResults(query)
+
+
+def filter_posts(queryset, query):
+    """Функция filter_posts оставляет в queryset только посты, найденные по
+    запросу, сохраняя его сортировку. Используется поиском в админке."""
+    terms = query_terms(query)
+    if not terms:
+        return queryset.none()
+    return search_backend()(terms).filter(queryset)
+
+
+def term_weights(post):
+    """Функция term_weights возвращает веса слов поста: каждое вхождение в
+    текст весит 1, в комментарий - SEARCH_COMMENT_WEIGHT."""
+    weights = Counter(tokenize(post.text))
+    for text in post.comments.values_list('text', flat=True):
+        for term in tokenize(text):
+            weights[term] += settings.SEARCH_COMMENT_WEIGHT
+    return weights
+
+
+def index_post(post):
+    """Функция index_post заново строит записи SearchTerm поста."""
+    SearchTerm.objects.filter(post=post).delete()
+    SearchTerm.objects.bulk_create(
+        SearchTerm(post=post, term=term, weight=weight)
+        for term, weight in term_weights(post).items())
+
+
+def index_comment(comment, sign=1):
+    """Функция index_comment добавляет (sign=1) или вычитает (sign=-1) веса
+    слов комментария из индекса поста. Вычитание не создает записей, поэтому
+    безопасно при каскадном удалении поста."""
+    terms = Counter(tokenize(comment.text))
+    missing = []
+    for term, occurrences in terms.items():
+        weight = occurrences * settings.SEARCH_COMMENT_WEIGHT * sign
+        updated = SearchTerm.objects.filter(
+            post_id=comment.post_id, term=term).update(
+            weight=F('weight') + weight)
+        if not updated and sign > 0:
+            missing.append(SearchTerm(post_id=comment.post_id, term=term,
+                                      weight=weight))
+    if missing:
+        SearchTerm.objects.bulk_create(missing, ignore_conflicts=True)
+    if sign < 0:
+        SearchTerm.objects.filter(post_id=comment.post_id, term__in=terms,
+                                  weight__lte=0).delete()
@@ -0,0 +1,194 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections, transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .counters import change_comments_counter, change_user_counter
+from .fragments import bump_feed_version
+from .groups import (add_to_group_feed, invalidate_groups,
+                     remove_from_group_feed, reset_group_feed)
+from .models import Comment, Follow, Group, Post
+from .popular import change_score, post_score, update_popular
+from .search import (TermSearch, index_comment, index_post, install_fts5,
+                     search_backend)
+from .timeline import backfill_timeline, fan_out, prune_timeline
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, **kwargs):
+    """Увеличивает счетчик постов автора и ставит в очередь раскладку
+    нового поста по лентам подписчиков."""
+    if created:
+        change_user_counter(instance.author_id, 'posts_count', 1)
+        fan_out.delay(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    """Уменьшает счетчик постов автора."""
+    change_user_counter(instance.author_id, 'posts_count', -1)
+
+
+@receiver(pre_save, sender=Post)
+def post_group_loaded(sender, instance, update_fields=None, **kwargs):
+    """Запоминает группу изменяемого поста до сохранения, чтобы перенести
+    пост между списками лент групп."""
+    instance._saved_group_id = instance.group_id
+    if instance.pk is not None and (update_fields is None
+                                    or 'group' in update_fields):
+        instance._saved_group_id = Post.objects.filter(
+            pk=instance.pk).values_list('group_id', flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+def post_group_changed(sender, instance, created, **kwargs):
+    """Обновляет списки лент групп: новый пост добавляется в ленту своей
+    группы, перенесенный - переходит из старой ленты в новую. Списки
+    меняются после фиксации транзакции."""
+    old_group_id = None if created else getattr(
+        instance, '_saved_group_id', instance.group_id)
+    if old_group_id == instance.group_id:
+        return
+    group_id, pub_date, post_id = (instance.group_id, instance.pub_date,
+                                   instance.pk)
+    if old_group_id is not None:
+        transaction.on_commit(
+            lambda: remove_from_group_feed(old_group_id, post_id))
+    if group_id is not None:
+        transaction.on_commit(
+            lambda: add_to_group_feed(group_id, pub_date, post_id))
+
+
+@receiver(post_delete, sender=Post)
+def post_group_deleted(sender, instance, **kwargs):
+    """Убирает удаленный пост из списка ленты его группы после фиксации
+    транзакции."""
+    if instance.group_id is not None:
+        group_id, post_id = instance.group_id, instance.pk
+        transaction.on_commit(
+            lambda: remove_from_group_feed(group_id, post_id))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    """Сбрасывает группы в памяти процессов; у новой или удаленной группы
+    сбрасывается и список ленты."""
+    invalidate_groups()
+    if kwargs.get('created', True):
+        reset_group_feed(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    """Увеличивает счетчик комментариев и рейтинг поста."""
+    if created:
+        change_comments_counter(instance.post_id, 1)
+        score = change_score(instance.post_id, instance.created)
+        if score is not None:
+            update_popular(instance.post_id, score)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    """Уменьшает счетчик комментариев и рейтинг поста."""
+    change_comments_counter(instance.post_id, -1)
+    score = change_score(instance.post_id, instance.created, sign=-1)
+    if score is not None:
+        update_popular(instance.post_id, score)
+
+
+@receiver(pre_save, sender=Post)
+def post_scored(sender, instance, **kwargs):
+    """Задает рейтинг нового поста по времени публикации."""
+    if instance._state.adding and not instance.score:
+        instance.score = post_score(instance.pub_date or timezone.now())
+
+
+@receiver(post_save, sender=Post)
+def post_popular(sender, instance, created, **kwargs):
+    """Добавляет новый пост в список популярных."""
+    if created:
+        update_popular(instance.pk, instance.score)
+
+
+@receiver(post_delete, sender=Post)
+def post_unpopular(sender, instance, **kwargs):
+    """Убирает удаленный пост из списка популярных."""
+    update_popular(instance.pk)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    """Обновляет счетчики подписок и заполняет ленту пользователя постами
+    нового автора."""
+    if created and instance.author_id is not None:
+        change_user_counter(instance.user_id, 'following_count', 1)
+        change_user_counter(instance.author_id, 'followers_count', 1)
+        backfill_timeline(instance.user, instance.author)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    """Обновляет счетчики подписок и очищает ленту пользователя от постов
+    автора после отписки."""
+    if instance.author_id is not None:
+        change_user_counter(instance.user_id, 'following_count', -1)
+        change_user_counter(instance.author_id, 'followers_count', -1)
+        prune_timeline(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+@receiver(post_delete, sender=User)
+def feed_changed(sender, **kwargs):
+    """Инвалидирует кэшированные фрагменты лент при изменении данных."""
+    bump_feed_version()
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, update_fields=None, **kwargs):
+    """Инвалидирует фрагменты лент при изменении пользователя, кроме
+    обновления времени последнего входа."""
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        bump_feed_version()
+
+
+def install_search(sender, using, **kwargs):
+    """После миграций создает недостающие таблицы FTS5 и восстанавливает
+    триггеры, удаленные при пересборке таблиц постов и комментариев."""
+    if settings.SEARCH_BACKEND != 'python':
+        install_fts5(connections[using])
+
+
+@receiver(post_save, sender=Post)
+def post_indexed(sender, instance, **kwargs):
+    """Обновляет обратный индекс поста, если FTS5 недоступен."""
+    if search_backend() is TermSearch:
+        index_post(instance)
+
+
+@receiver(post_save, sender=Comment)
+def comment_indexed(sender, instance, created, **kwargs):
+    """Добавляет слова нового комментария в обратный индекс поста, а при
+    изменении комментария строит индекс поста заново."""
+    if search_backend() is TermSearch:
+        if created:
+            index_comment(instance)
+        else:
+            index_post(instance.post)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_unindexed(sender, instance, **kwargs):
+    """Вычитает слова удаленного комментария из обратного индекса поста."""
+    if search_backend() is TermSearch:
+        index_comment(instance, sign=-1)
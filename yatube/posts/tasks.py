@@ -0,0 +1,27 @@
+from django.core.mail import send_mail
+from django.urls import reverse
+
+from core.tasks import task
+
+from .models import Comment
+
+
+@task
+def notify_post_author(comment_id):
+    """Задача notify_post_author сообщает автору поста по почте о новом
+    комментарии, если у автора указан e-mail и комментарий не его."""
+    comment = Comment.objects.select_related(
+        'author', 'post__author').filter(pk=comment_id).first()
+    if comment is None:
+        return
+    recipient = comment.post.author
+    if not recipient.email or recipient == comment.author:
+        return
+    url = reverse('posts:post_detail', kwargs={'post_id': comment.post_id})
+    send_mail(
+        'Новый комментарий к вашему посту',
+        f'{comment.author.get_full_name() or comment.author.username} '
+        f'прокомментировал ваш пост:\n\n{comment.text}\n\n{url}',
+        None,
+        [recipient.email],
+    )
@@ -0,0 +1,19 @@
+from django import template
+from django.conf import settings
+from django.templatetags.static import static
+from django.utils.html import format_html
+
+register = template.Library()
+
+PLACEHOLDER = 'img/thumbnail_placeholder.svg'
+
+
+@register.simple_tag
+def thumbnail_placeholder():
+    """Заглушка на месте миниатюры, которую еще строит воркер: легкая
+    картинка размера POST_THUMBNAIL_GEOMETRY вместо исходной картинки
+    поста, чтобы лента не грузила оригиналы и не прыгала при загрузке."""
+    width, height = settings.POST_THUMBNAIL_GEOMETRY.split('x')
+    return format_html(
+        '<img class="card-img my-2" src="{}" width="{}" height="{}" '
+        'alt="Картинка готовится">', static(PLACEHOLDER), width, height)
@@ -0,0 +1,122 @@
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from core.testing import QueryBudgetMixin, run_on_commit
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ApiTest(QueryBudgetMixin, TestCase):
+    """Тестируем JSON API лент, постов, групп и профилей."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Pupkin',
+                                            first_name='Василий')
+        cls.follower = User.objects.create_user(username='Pechkin')
+        cls.group = Group.objects.create(title='Собаки', slug='dogs',
+                                         description='Блог о собаках')
+        Follow.objects.create(user=cls.follower, author=cls.user)
+        with run_on_commit():
+            cls.posts = [
+                Post.objects.create(author=cls.user, text=f'Пост номер {i}',
+                                    group=cls.group)
+                for i in range(1, 14)
+            ]
+        cls.post = cls.posts[-1]
+        Comment.objects.create(post=cls.post, author=cls.follower,
+                               text='Комментарий')
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.follower_client = Client()
+        self.follower_client.force_login(self.follower)
+
+    def walk(self, client, url):
+        """Проходит ленту по ссылкам next и возвращает тексты постов."""
+        texts = []
+        while url:
+            data = client.get(url).json()
+            texts.extend(post['text'] for post in data['results'])
+            url = data['next']
+        return texts
+
+    def test_feeds_paginated_by_cursor(self):
+        """Ленты отдаются страницами по курсорам без повторов."""
+        expected = [f'Пост номер {i}' for i in range(13, 0, -1)]
+        feeds = [
+            (self.guest_client, reverse('api:posts')),
+            (self.guest_client, reverse('api:group_posts',
+                                        kwargs={'slug': self.group.slug})),
+            (self.guest_client, reverse('api:profile_posts',
+                                        kwargs={'username': self.user})),
+            (self.follower_client, reverse('api:follow')),
+        ]
+        for client, url in feeds:
+            with self.subTest(url=url):
+                self.assertEqual(self.walk(client, url), expected)
+
+    def test_post_detail_and_comments(self):
+        """Пост и его комментарии отдаются в JSON."""
+        data = self.guest_client.get(reverse(
+            'api:post_detail', kwargs={'post_id': self.post.pk})).json()
+        self.assertEqual(data['text'], self.post.text)
+        self.assertEqual(data['author'], self.user.username)
+        self.assertEqual(data['group'], self.group.slug)
+        self.assertEqual(data['comments_count'], 1)
+        data = self.guest_client.get(reverse(
+            'api:post_comments', kwargs={'post_id': self.post.pk})).json()
+        self.assertEqual([comment['text'] for comment in data['results']],
+                         ['Комментарий'])
+
+    def test_groups_and_profile(self):
+        """Список групп и профиль автора со счетчиками."""
+        data = self.guest_client.get(reverse('api:groups')).json()
+        self.assertEqual(data['results'][0]['slug'], self.group.slug)
+        data = self.guest_client.get(reverse(
+            'api:profile', kwargs={'username': self.user})).json()
+        self.assertEqual(data['full_name'], 'Василий')
+        self.assertEqual(data['posts_count'], 13)
+        self.assertEqual(data['followers_count'], 1)
+
+    def test_follow_requires_authentication(self):
+        """Лента подписок недоступна анонимному пользователю."""
+        response = self.guest_client.get(reverse('api:follow'))
+        self.assertEqual(response.status_code, HTTPStatus.UNAUTHORIZED)
+
+    def test_unchanged_page_not_modified(self):
+        """Повторный запрос с ETag или Last-Modified получает 304 без
+        тела, а после изменения поста - новую страницу."""
+        url = reverse('api:posts')
+        response = self.guest_client.get(url)
+        etag = response['ETag']
+        last_modified = response['Last-Modified']
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+        response = self.guest_client.get(
+            url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        Comment.objects.create(post=self.post, author=self.user,
+                               text='Новый комментарий')
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_feed_does_not_scale(self):
+        """Число запросов ленты API не зависит от числа постов."""
+        url = reverse('api:posts')
+        Post.objects.all().delete()
+        self.assertQueriesDoNotScale(
+            self.guest_client, url,
+            lambda amount: [Post.objects.create(author=self.user,
+                                                text='Пост',
+                                                group=self.group)
+                            for _ in range(amount)])
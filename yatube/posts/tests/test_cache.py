@@ -3,7 +3,9 @@ from django.core.cache import cache
 from django.test import Client, TestCase
 from django.urls import reverse
 
-from ..models import Post
+from core.testing import run_on_commit
+
+from ..models import Follow, Group, Post
 
 User = get_user_model()
 
@@ -13,18 +15,74 @@ class CacheTest(TestCase):
     def setUpClass(cls):
         super().setUpClass()
         cls.user = User.objects.create_user(username='Pupkin')
+        cls.follower = User.objects.create_user(username='Pechkin')
+        cls.group = Group.objects.create(title='Собаки', slug='dogs',
+                                         description='Блог о собаках')
+        Follow.objects.create(user=cls.follower, author=cls.user)
 
     def setUp(self):
+        cache.clear()
         self.authorized_user = Client()
+        self.authorized_user.force_login(self.follower)
+        self.pages = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+            reverse('posts:follow_index'),
+        ]
 
     def test_cache_index_page(self):
-        """Проверяем кэширование на Главной странице."""
+        """Проверяем кэширование на Главной странице: фрагмент не
+        перестраивается, пока данные не изменились через модели."""
         page = reverse('posts:index')
         test_post = Post.objects.create(author=self.user, text='Пост номер 1')
         response_1 = self.authorized_user.get(page)
-        test_post.delete()
+        Post.objects.filter(pk=test_post.pk).update(text='Изменен в обход')
         response_2 = self.authorized_user.get(page)
         self.assertEqual(response_1.content, response_2.content)
         cache.clear()
         response_3 = self.authorized_user.get(page)
         self.assertNotEqual(response_1.content, response_3.content)
+
+    def test_feed_pages_invalidated_by_post_changes(self):
+        """Новый и удаленный пост сразу отражаются на страницах лент."""
+        for page in self.pages:
+            self.authorized_user.get(page)
+        with run_on_commit():
+            post = Post.objects.create(author=self.user, text='Новый пост',
+                                       group=self.group)
+        for page in self.pages:
+            with self.subTest(page=page):
+                response = self.authorized_user.get(page)
+                self.assertContains(response, post.text)
+        post.delete()
+        for page in self.pages:
+            with self.subTest(page=page):
+                response = self.authorized_user.get(page)
+                self.assertNotContains(response, post.text)
+
+    def test_feed_pages_invalidated_by_user_changes(self):
+        """Изменение имени автора сразу отражается на страницах лент."""
+        with run_on_commit():
+            Post.objects.create(author=self.user, text='Пост',
+                                group=self.group)
+        for page in self.pages:
+            self.authorized_user.get(page)
+        self.user.first_name = 'Василий'
+        self.user.save()
+        for page in self.pages:
+            with self.subTest(page=page):
+                response = self.authorized_user.get(page)
+                self.assertContains(response, 'Василий')
+
+    def test_post_detail_fragment_keyed_on_modification(self):
+        """Фрагмент поста не перестраивается, пока пост не сохранен, и
+        обновляется после редактирования."""
+        post = Post.objects.create(author=self.user, text='Пост номер 1')
+        page = reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        self.authorized_user.get(page)
+        Post.objects.filter(pk=post.pk).update(text='Изменен в обход')
+        self.assertContains(self.authorized_user.get(page), 'Пост номер 1')
+        post.text = 'Отредактирован'
+        post.save()
+        self.assertContains(self.authorized_user.get(page), 'Отредактирован')
@@ -0,0 +1,107 @@
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from core.testing import QueryBudgetMixin
+
+from ..models import Comment, Group, Post
+
+User = get_user_model()
+
+
+class ConditionalGetTest(QueryBudgetMixin, TestCase):
+    """Тестируем ответы 304 и Cache-Control публичных страниц."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Pupkin')
+        cls.reader = User.objects.create_user(username='Pechkin')
+        cls.group = Group.objects.create(title='Собаки', slug='dogs',
+                                         description='Блог о собаках')
+        cls.post = Post.objects.create(author=cls.user, text='Пост',
+                                       group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        ]
+
+    def test_not_modified(self):
+        """Повторный запрос с If-None-Match или If-Modified-Since получает
+        304 без отрисовки шаблона."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                for headers in (
+                        {'HTTP_IF_NONE_MATCH': response['ETag']},
+                        {'HTTP_IF_MODIFIED_SINCE':
+                            response['Last-Modified']}):
+                    again = self.guest_client.get(url, **headers)
+                    self.assertEqual(again.status_code,
+                                     HTTPStatus.NOT_MODIFIED)
+                    self.assertEqual(again.templates, [])
+                    self.assertEqual(again['ETag'], response['ETag'])
+
+    def test_not_modified_is_cheap(self):
+        """Ответ 304 на страницу поста стоит одного запроса."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        etag = self.guest_client.get(url)['ETag']
+        with self.assertQueryBudget(1):
+            self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_etag_changes(self):
+        """ETag меняется после нового поста, правки поста и нового
+        комментария."""
+        etags = {url: self.guest_client.get(url)['ETag'] for url in self.urls}
+        changes = [
+            lambda: Post.objects.create(author=self.user, text='Новый пост',
+                                        group=self.group),
+            lambda: Post.objects.filter(pk=self.post.pk).first().save(),
+        ]
+        for change in changes:
+            change()
+            for url in self.urls[:3]:
+                with self.subTest(url=url):
+                    etag = self.guest_client.get(url)['ETag']
+                    self.assertNotEqual(etag, etags[url])
+                    etags[url] = etag
+        Comment.objects.create(post=self.post, author=self.reader,
+                               text='Комментарий')
+        detail_url = self.urls[3]
+        response = self.guest_client.get(
+            detail_url, HTTP_IF_NONE_MATCH=etags[detail_url])
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_etag_depends_on_user(self):
+        """Страница авторизованного пользователя не совпадает с гостевой."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                etag = self.guest_client.get(url)['ETag']
+                response = self.reader_client.get(url,
+                                                  HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_cache_control(self):
+        """Гостевые страницы может хранить прокси, страницы авторизованных -
+        только браузер с проверкой."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertIn('public', response['Cache-Control'])
+                self.assertIn('s-maxage=60', response['Cache-Control'])
+                self.assertIn('Cookie', response['Vary'])
+                response = self.reader_client.get(url)
+                self.assertIn('private', response['Cache-Control'])
+                self.assertIn('no-cache', response['Cache-Control'])
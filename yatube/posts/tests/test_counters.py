@@ -0,0 +1,108 @@
+from importlib import import_module
+from io import StringIO
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..counters import get_stats
+from ..models import Comment, Follow, Post, UserStats
+
+User = get_user_model()
+
+
+class CountersTest(TestCase):
+    """Тестируем денормализованные счетчики постов, комментариев и
+    подписок."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Pupkin')
+        cls.author = User.objects.create_user(username='Pechkin')
+
+    def setUp(self):
+        self.authorized_user = Client()
+        self.authorized_user.force_login(self.user)
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_posts_count_follows_create_and_delete(self):
+        """Счетчик постов автора меняется при создании и удалении поста."""
+        self.authorized_user.post(reverse('posts:post_create'),
+                                  data={'text': 'Пост номер 1'})
+        self.assertEqual(self.stats(self.user).posts_count, 1)
+        Post.objects.filter(author=self.user).delete()
+        self.assertEqual(self.stats(self.user).posts_count, 0)
+
+    def test_comments_count_follows_add_comment(self):
+        """Счетчик комментариев поста меняется при комментировании."""
+        post = Post.objects.create(author=self.author, text='Пост номер 1')
+        self.authorized_user.post(
+            reverse('posts:add_comment', kwargs={'post_id': post.id}),
+            data={'text': 'Комментарий'})
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        Comment.objects.filter(post=post).delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+
+    def test_follow_counters(self):
+        """Счетчики подписчиков и подписок меняются при подписке и
+        отписке."""
+        kwargs = {'username': self.author}
+        self.authorized_user.get(reverse('posts:profile_follow',
+                                         kwargs=kwargs))
+        self.assertEqual(self.stats(self.user).following_count, 1)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.authorized_user.get(reverse('posts:profile_unfollow',
+                                         kwargs=kwargs))
+        self.assertEqual(self.stats(self.user).following_count, 0)
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+
+    def test_profile_reads_counters(self):
+        """Страница профиля берет количество постов из счетчика."""
+        Post.objects.create(author=self.author, text='Пост номер 1')
+        response = self.authorized_user.get(
+            reverse('posts:profile', kwargs={'username': self.author}))
+        self.assertEqual(response.context['count_posts'], 1)
+        self.assertEqual(response.context['page_obj'].paginator.count, 1)
+
+    def test_reconcile_counters_fixes_drift(self):
+        """Команда reconcile_counters исправляет расхождение счетчиков."""
+        post = Post.objects.create(author=self.author, text='Пост номер 1')
+        Comment.objects.create(post=post, author=self.user, text='Текст')
+        Follow.objects.create(user=self.user, author=self.author)
+        UserStats.objects.update(posts_count=7, followers_count=7)
+        Post.objects.update(comments_count=7)
+        call_command('reconcile_counters', stdout=StringIO())
+        stats = self.stats(self.author)
+        post.refresh_from_db()
+        self.assertEqual((stats.posts_count, stats.followers_count), (1, 1))
+        self.assertEqual(post.comments_count, 1)
+
+    def test_profile_without_counters_does_not_write(self):
+        """Профиль пользователя без строки счетчиков показывает нули и
+        не создает ее при чтении."""
+        with self.assertNumQueries(1):
+            stats = get_stats(self.author)
+        self.assertEqual(stats.posts_count, 0)
+        response = self.authorized_user.get(
+            reverse('posts:profile', kwargs={'username': self.author}))
+        self.assertEqual(response.context['count_posts'], 0)
+        self.assertFalse(UserStats.objects.filter(user=self.author).exists())
+
+    def test_migration_fills_counters(self):
+        """Миграция 0015 заполняет счетчики существующих пользователей."""
+        Post.objects.create(author=self.author, text='Пост номер 1')
+        Follow.objects.create(user=self.user, author=self.author)
+        UserStats.objects.all().delete()
+        migration = import_module('posts.migrations.0015_counters')
+        migration.fill_user_stats(apps, None)
+        self.assertEqual(
+            (self.stats(self.author).posts_count,
+             self.stats(self.author).followers_count,
+             self.stats(self.user).following_count), (1, 1, 1))
@@ -0,0 +1,116 @@
+import csv
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from http import HTTPStatus
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ExportTest(TestCase):
+    """Тестируем потоковую выгрузку таблиц командой и по HTTP."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Pupkin')
+        cls.reader = User.objects.create_user(username='Pechkin')
+        cls.staff = User.objects.create_user(username='Admin', is_staff=True)
+        cls.group = Group.objects.create(title='Собаки', slug='dogs',
+                                         description='Блог о собаках')
+        cls.post = Post.objects.create(author=cls.user, text='Пост номер 1',
+                                       group=cls.group)
+        cls.old_post = Post.objects.create(author=cls.reader,
+                                           text='Старый пост')
+        Post.objects.filter(pk=cls.old_post.pk).update(
+            pub_date=timezone.now() - timedelta(days=30))
+        Comment.objects.create(post=cls.post, author=cls.reader,
+                               text='Комментарий')
+        Follow.objects.create(user=cls.reader, author=cls.user)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.staff_client = Client()
+        self.staff_client.force_login(self.staff)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def export(self, *args, **options):
+        stdout = StringIO()
+        call_command('export_data', *args, stdout=stdout, stderr=StringIO(),
+                     **options)
+        return stdout.getvalue()
+
+    def test_ndjson_export(self):
+        """Посты выгружаются в NDJSON по одному объекту в строке."""
+        rows = [json.loads(line)
+                for line in self.export('posts').splitlines()]
+        self.assertEqual([row['text'] for row in rows],
+                         ['Пост номер 1', 'Старый пост'])
+        self.assertEqual(rows[0]['author__username'], 'Pupkin')
+        self.assertEqual(rows[0]['group__slug'], 'dogs')
+
+    def test_csv_export(self):
+        """Выгрузка в CSV начинается с заголовка."""
+        rows = list(csv.DictReader(StringIO(
+            self.export('follows', fmt='csv'))))
+        self.assertEqual(rows, [{'id': str(Follow.objects.get().pk),
+                                 'user__username': 'Pechkin',
+                                 'author__username': 'Pupkin'}])
+
+    def test_filters(self):
+        """Выгрузку можно ограничить периодом и автором."""
+        since = (timezone.localdate() - timedelta(days=1)).isoformat()
+        rows = self.export('posts', since=since).splitlines()
+        self.assertEqual([json.loads(row)['text'] for row in rows],
+                         ['Пост номер 1'])
+        rows = self.export('posts', author='Pechkin').splitlines()
+        self.assertEqual([json.loads(row)['text'] for row in rows],
+                         ['Старый пост'])
+        with self.assertRaises(CommandError):
+            self.export('groups', since=since)
+
+    def test_gzip_export_to_file(self):
+        """Сжатая выгрузка пишется в файл gzip."""
+        path = os.path.join(self.directory, 'comments.ndjson.gz')
+        self.export('comments', gzip=True, output=path, chunk_size=1)
+        with gzip.open(path, 'rt') as export:
+            rows = [json.loads(line) for line in export]
+        self.assertEqual(rows[0]['text'], 'Комментарий')
+
+    def test_endpoint_streams_for_staff(self):
+        """Сотрудник получает потоковую выгрузку, остальные - нет."""
+        url = reverse('posts:export', kwargs={'table': 'posts'})
+        reader = Client()
+        reader.force_login(self.reader)
+        response = reader.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        response = self.staff_client.get(url, {'format': 'csv', 'gzip': '1'})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        content = gzip.decompress(b''.join(response.streaming_content))
+        self.assertEqual(len(content.decode().splitlines()), 3)
+
+    def test_endpoint_rejects_bad_parameters(self):
+        """Неверные параметры выгрузки - ответ 400."""
+        for table, params in (('users', {}), ('posts', {'format': 'xml'}),
+                              ('posts', {'since': 'вчера'})):
+            with self.subTest(table=table, params=params):
+                response = self.staff_client.get(
+                    reverse('posts:export', kwargs={'table': table}), params)
+                self.assertEqual(response.status_code,
+                                 HTTPStatus.BAD_REQUEST)
@@ -0,0 +1,151 @@
+import datetime as dt
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.http import Http404
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.testing import run_on_commit
+
+from ..groups import GROUP_FEED_KEY, GroupFeed, get_group
+from ..importer import PostImporter
+from ..models import Group, Post
+
+User = get_user_model()
+
+
+@override_settings(COUNT_OF_POSTS=2, GROUP_FEED_PAGES=2)
+class GroupFeedTest(TestCase):
+    """Тестируем кэш групп и списки id первых страниц лент групп."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Pupkin')
+        cls.group = Group.objects.create(title='Собаки', slug='dogs',
+                                         description='Блог о собаках')
+        cls.other = Group.objects.create(title='Кошки', slug='cats',
+                                         description='Блог о кошках')
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.posts = [Post.objects.create(author=self.author,
+                                          text=f'Пост {number}',
+                                          group=self.group)
+                      for number in range(5)]
+
+    def feed_ids(self, group):
+        return [post.pk for post in GroupFeed(group)[0:10]]
+
+    def db_ids(self, group):
+        return list(Post.objects.filter(group=group).order_by(
+            '-pub_date', '-pk').values_list('pk', flat=True))
+
+    def test_group_cached_in_process(self):
+        """Группа читается из БД один раз и перечитывается после
+        изменения; для неизвестного slug - 404."""
+        get_group('dogs')
+        with self.assertNumQueries(0):
+            self.assertEqual(get_group('dogs'), self.group)
+        Group.objects.filter(pk=self.group.pk).update(title='Псы')
+        self.assertEqual(get_group('dogs').title, 'Собаки')
+        self.group.title = 'Псы'
+        self.group.save()
+        self.assertEqual(get_group('dogs').title, 'Псы')
+        with self.assertRaises(Http404):
+            get_group('birds')
+
+    def test_feed_updated_incrementally(self):
+        """Создание, перенос и удаление постов меняют список на месте, без
+        перестроения из БД."""
+        GroupFeed(self.group)
+        with self.assertNumQueries(0):
+            feed = GroupFeed(self.group)
+        self.assertEqual(feed.count(), 5)
+        self.assertEqual(len(feed.state['entries']), 4)
+
+        with run_on_commit():
+            new = Post.objects.create(author=self.author, text='Новый',
+                                      group=self.group)
+            moved = self.posts[3]
+            moved.group = self.other
+            moved.save()
+            self.posts[4].delete()
+            self.posts[0].text = 'Исправленный'
+            self.posts[0].save()
+        GroupFeed(self.other)
+        with run_on_commit():
+            old = Post.objects.create(
+                author=self.author, text='Старый', group=self.other)
+        Post.objects.filter(pk=old.pk).update(
+            pub_date=timezone.now() - dt.timedelta(days=1))
+        old.refresh_from_db()
+        with run_on_commit():
+            old.group = self.group
+            old.save()
+
+        with self.assertNumQueries(1):
+            feed = GroupFeed(self.group)
+            ids = [post.pk for post in feed[0:4]]
+        self.assertEqual(feed.count(), 5)
+        self.assertEqual(ids, self.db_ids(self.group)[:4])
+        self.assertEqual(ids[0], new.pk)
+        self.assertEqual(self.feed_ids(self.other), [moved.pk])
+        self.assertEqual(GroupFeed(self.other).count(), 1)
+
+    def test_rolled_back_post_not_in_feed(self):
+        """Пост из откаченной транзакции не попадает в список ленты."""
+        GroupFeed(self.group)
+        with run_on_commit():
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic():
+                    Post.objects.create(author=self.author, text='Откат',
+                                        group=self.group)
+                    raise RuntimeError
+        self.assertEqual(GroupFeed(self.group).count(), 5)
+        self.assertEqual(self.feed_ids(self.group), self.db_ids(self.group))
+
+    def test_pages_beyond_cached_list_read_db(self):
+        """Страницы за концом списка читаются из БД."""
+        feed = GroupFeed(self.group)
+        self.assertEqual(self.feed_ids(self.group), self.db_ids(self.group))
+        self.assertEqual([post.pk for post in feed[4:6]],
+                         self.db_ids(self.group)[4:6])
+        response = self.guest_client.get(
+            reverse('posts:group_list', kwargs={'slug': 'dogs'}),
+            {'page': 3})
+        self.assertEqual([post.pk for post in response.context['page_obj']],
+                         self.db_ids(self.group)[4:])
+        self.assertEqual(response.context['page_obj'].paginator.num_pages, 3)
+
+    def test_group_page_queries(self):
+        """Страница группы с теплыми кэшами читает только посты
+        страницы."""
+        url = reverse('posts:group_list', kwargs={'slug': 'dogs'})
+        self.guest_client.get(url)
+        with override_settings(PAGE_CACHE_TIMEOUT=0):
+            with self.assertNumQueries(1):
+                response = self.guest_client.get(url, {'page': 2})
+        self.assertEqual([post.pk for post in response.context['page_obj']],
+                         self.db_ids(self.group)[2:4])
+        with self.assertNumQueries(0):
+            self.guest_client.get(url)
+
+    def test_deleted_group_resets_feed(self):
+        """Удаление группы и импорт постов сбрасывают список ленты."""
+        group = Group.objects.create(title='Птицы', slug='birds',
+                                     description='Блог о птицах')
+        GroupFeed(group)
+        importer = PostImporter().run([(1, {
+            'author': 'Pupkin', 'text': 'Импорт', 'group': 'birds',
+            'pub_date': '2020-01-01T00:00:00+00:00'})])
+        self.assertEqual(importer.imported, 1)
+        self.assertIsNone(cache.get(GROUP_FEED_KEY.format(group.pk)))
+        self.assertEqual(GroupFeed(group).count(), 1)
+        pk = group.pk
+        group.delete()
+        self.assertIsNone(cache.get(GROUP_FEED_KEY.format(pk)))
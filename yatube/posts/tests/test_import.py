@@ -0,0 +1,191 @@
+import csv
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from ..counters import get_stats
+from ..models import Comment, Follow, Group, Post, TimelineEntry
+from ..search import search_posts
+
+User = get_user_model()
+
+
+class BulkImportTest(TestCase):
+    """Тестируем загрузку таблиц командой bulk_import."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Pupkin')
+        cls.reader = User.objects.create_user(username='Pechkin')
+        cls.group = Group.objects.create(title='Собаки', slug='dogs',
+                                         description='Блог о собаках')
+        Follow.objects.create(user=cls.reader, author=cls.user)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def write(self, name, rows):
+        path = os.path.join(self.directory, name)
+        if name.endswith('.csv'):
+            with open(path, 'w', newline='', encoding='utf-8') as file:
+                writer = csv.DictWriter(file, fieldnames=list(rows[0]))
+                writer.writeheader()
+                writer.writerows(rows)
+        else:
+            opener = gzip.open if name.endswith('.gz') else open
+            with opener(path, 'wt', encoding='utf-8') as file:
+                for row in rows:
+                    file.write(json.dumps(row, ensure_ascii=False) + '\n')
+        return path
+
+    def load(self, *args, **options):
+        stdout, stderr = StringIO(), StringIO()
+        call_command('bulk_import', *args, stdout=stdout, stderr=stderr,
+                     **options)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_import_posts(self):
+        """Посты загружаются пачками с датами из файла, обновляются
+        счетчики, ленты подписчиков и поиск."""
+        path = self.write('posts.ndjson', [
+            {'text': f'Импортированный пост {i}', 'author': 'Pupkin',
+             'group': 'dogs', 'pub_date': f'2020-01-0{i}T10:00:00'}
+            for i in range(1, 6)
+        ])
+        stdout, _ = self.load('posts', path, batch_size=2)
+        self.assertIn('Загружено: 5, пропущено: 0', stdout)
+        self.assertIn('строк/с', stdout)
+        posts = Post.objects.filter(author=self.user)
+        self.assertEqual(posts.count(), 5)
+        self.assertEqual(posts.filter(group=self.group).count(), 5)
+        self.assertEqual(posts.first().pub_date.year, 2020)
+        self.user.refresh_from_db()
+        self.assertEqual(get_stats(self.user).posts_count, 5)
+        self.assertEqual(TimelineEntry.objects.filter(
+            user=self.reader).count(), 5)
+        self.assertEqual(search_posts('импортированный').count(), 5)
+
+    def test_invalid_rows_skipped(self):
+        """Неверные строки пропускаются с номером строки, остальные
+        загружаются."""
+        path = self.write('posts.csv', [
+            {'text': 'Хороший пост', 'author': 'Pupkin', 'group': ''},
+            {'text': 'Нет автора', 'author': 'Nobody', 'group': ''},
+            {'text': 'Нет группы', 'author': 'Pupkin', 'group': 'cats'},
+            {'text': '', 'author': 'Pupkin', 'group': ''},
+        ])
+        stdout, stderr = self.load('posts', path)
+        self.assertIn('Загружено: 1, пропущено: 3', stdout)
+        self.assertIn("Строка 3: нет пользователя 'Nobody'", stderr)
+        self.assertIn("Строка 4: нет группы 'cats'", stderr)
+        self.assertTrue(Post.objects.filter(text='Хороший пост').exists())
+
+    def test_import_comments(self):
+        """Комментарии загружаются к существующим постам и увеличивают их
+        счетчики."""
+        post = Post.objects.create(author=self.user, text='Пост')
+        path = self.write('comments.ndjson.gz', [
+            {'post_id': post.pk, 'author__username': 'Pechkin',
+             'text': 'Комментарий 1'},
+            {'post_id': post.pk, 'author__username': 'Pechkin',
+             'text': 'Комментарий 2'},
+            {'post_id': post.pk + 100, 'author__username': 'Pechkin',
+             'text': 'К несуществующему посту'},
+        ])
+        stdout, _ = self.load('comments', path)
+        self.assertIn('Загружено: 2, пропущено: 1', stdout)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 2)
+        self.assertEqual(Comment.objects.filter(post=post).count(), 2)
+
+    def test_import_follows(self):
+        """Подписки на себя и повторные подписки пропускаются, ленты и
+        счетчики новых подписчиков заполняются."""
+        Post.objects.create(author=self.reader, text='Пост Печкина')
+        path = self.write('follows.ndjson', [
+            {'user': 'Pupkin', 'author': 'Pechkin'},
+            {'user': 'Pupkin', 'author': 'Pechkin'},
+            {'user': 'Pupkin', 'author': 'Pupkin'},
+            {'user': 'Pechkin', 'author': 'Pupkin'},
+        ])
+        stdout, stderr = self.load('follows', path)
+        self.assertIn('Загружено: 1, пропущено: 3', stdout)
+        self.assertIn('Строка 3: нельзя подписаться на самого себя', stderr)
+        self.assertEqual(Follow.objects.count(), 2)
+        self.user.refresh_from_db()
+        self.reader.refresh_from_db()
+        self.assertEqual(get_stats(self.user).following_count, 1)
+        self.assertEqual(get_stats(self.reader).followers_count, 1)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user, post__author=self.reader).exists())
+
+    def test_import_queries_do_not_scale(self):
+        """Число запросов зависит от числа пачек, а не строк."""
+        queries = []
+        for size in (5, 50):
+            path = self.write(f'posts{size}.ndjson', [
+                {'text': f'Пост {i}', 'author': 'Pupkin', 'group': 'dogs'}
+                for i in range(size)
+            ])
+            with CaptureQueriesContext(connection) as context:
+                self.load('posts', path, batch_size=100)
+            queries.append(len(context))
+        self.assertEqual(queries[0], queries[1])
+
+    def test_export_import_round_trip(self):
+        """Выгрузка export_data загружается обратно с теми же id."""
+        post = Post.objects.create(author=self.user, text='Пост',
+                                   group=self.group)
+        path = os.path.join(self.directory, 'posts.csv')
+        call_command('export_data', 'posts', fmt='csv', output=path,
+                     stdout=StringIO(), stderr=StringIO())
+        pk = post.pk
+        post.delete()
+        self.load('posts', path, keep_ids=True)
+        imported = Post.objects.get(pk=pk)
+        self.assertEqual(imported.text, 'Пост')
+        self.assertEqual(imported.group, self.group)
+        self.assertEqual(imported.pub_date, post.pub_date)
+
+    def test_taken_ids_skipped(self):
+        """С --keep-ids строки с уже занятым или повторным id пропускаются
+        как неверные, остальные загружаются."""
+        post = Post.objects.create(author=self.user, text='Пост')
+        comment = Comment.objects.create(post=post, author=self.reader,
+                                         text='Комментарий')
+        path = self.write('posts.ndjson', [
+            {'id': post.pk, 'text': 'Занятый id', 'author': 'Pupkin'},
+            {'id': post.pk + 1, 'text': 'Новый id', 'author': 'Pupkin'},
+            {'id': post.pk + 1, 'text': 'Повторный id', 'author': 'Pupkin'},
+        ])
+        stdout, stderr = self.load('posts', path, keep_ids=True)
+        self.assertIn('Загружено: 1, пропущено: 2', stdout)
+        self.assertIn(f'Строка 1: id {post.pk} уже занят', stderr)
+        self.assertIn(f'Строка 3: id {post.pk + 1} уже занят', stderr)
+        self.assertEqual(Post.objects.get(pk=post.pk).text, 'Пост')
+        self.assertEqual(Post.objects.get(pk=post.pk + 1).text, 'Новый id')
+        path = self.write('comments.ndjson', [
+            {'id': comment.pk, 'post_id': post.pk, 'author': 'Pechkin',
+             'text': 'Занятый id'},
+        ])
+        stdout, _ = self.load('comments', path, keep_ids=True)
+        self.assertIn('Загружено: 0, пропущено: 1', stdout)
+        self.assertEqual(Comment.objects.count(), 1)
+
+    def test_missing_file(self):
+        with self.assertRaises(CommandError):
+            self.load('posts', os.path.join(self.directory, 'missing.csv'))
@@ -0,0 +1,88 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Q
+from django.test import TestCase
+
+from ..common import (KeysetPaginator, author_feed, group_feed, index_feed,
+                      post_comments_list)
+from ..models import Follow, Group, Post
+from ..timeline import follow_feed
+
+User = get_user_model()
+
+
+class FeedIndexesTest(TestCase):
+    """Тестируем, что выборки лент используют индексы и не сортируют строки
+    во временном B-дереве."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Pupkin')
+        cls.author = User.objects.create_user(username='Pechkin')
+        cls.group = Group.objects.create(title='Собаки', slug='dogs',
+                                         description='Блог о собаках')
+        cls.post = Post.objects.create(author=cls.author, text='Пост',
+                                       group=cls.group)
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    def query_plan(self, queryset):
+        """Функция возвращает строки EXPLAIN QUERY PLAN выборки."""
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [str(row[-1]) for row in cursor.fetchall()]
+
+    def assertReadsIndexes(self, queryset):
+        """Проверяет, что выборка не сортирует строки во временном
+        B-дереве и не читает таблицы целиком."""
+        plan = self.query_plan(queryset[:10])
+        for step in plan:
+            self.assertNotIn('TEMP B-TREE', step, plan)
+            if step.startswith('SCAN'):
+                self.assertIn('USING', step, plan)
+
+    def orderings(self, queryset, field='pub_date'):
+        """Возвращает выборки, которые строят паджинаторы лент: страницу по
+        номеру, первую страницу по курсору, страницы после курсора и перед
+        ним."""
+        paginator = KeysetPaginator(queryset, 10, field=field)
+        ordered = paginator.object_list
+        date = getattr(self.post, field, self.post.pub_date)
+        after = ordered.filter(Q(**{f'{field}__lt': date})
+                               | Q(**{field: date, 'pk__lt': 1}))
+        before = ordered.filter(Q(**{f'{field}__gt': date})
+                                | Q(**{field: date, 'pk__gt': 1}))
+        return {'page': queryset, 'first': ordered, 'after': after,
+                'before': before.reverse()}
+
+    def test_feed_queries_read_indexes(self):
+        """Выборки, которые листают index, group_posts, profile и
+        комментарии post_detail, читаются по индексам в нужном порядке."""
+        if connection.vendor != 'sqlite':
+            self.skipTest('EXPLAIN QUERY PLAN поддерживается только SQLite')
+        feeds = {
+            'index': self.orderings(index_feed()),
+            'group_posts': self.orderings(group_feed(self.group)),
+            'profile': self.orderings(author_feed(self.author)),
+            'post_detail': self.orderings(post_comments_list(self.post.pk),
+                                          field='created'),
+        }
+        for name, querysets in feeds.items():
+            for kind, queryset in querysets.items():
+                with self.subTest(view=name, page=kind):
+                    self.assertReadsIndexes(queryset)
+
+    def test_follow_feed_reads_ranges_of_indexes(self):
+        """Лента подписок и посты популярных авторов читаются по индексам
+        в обоих направлениях, в том числе после курсора."""
+        if connection.vendor != 'sqlite':
+            self.skipTest('EXPLAIN QUERY PLAN поддерживается только SQLite')
+        feed = follow_feed(self.user)
+        feed.authors = [self.author.pk]
+        after = Q(pub_date__lt=self.post.pub_date) | Q(
+            pub_date=self.post.pub_date, pk__lt=self.post.pk)
+        for ordered in (feed, feed.reverse(), feed.filter(after)):
+            for source in ordered.sources():
+                with self.subTest(source=str(source.query)):
+                    self.assertReadsIndexes(source)
@@ -0,0 +1,118 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from core.holes import hole_marker
+from core.testing import QueryBudgetMixin, run_on_commit
+
+from ..models import Follow, Group, Post
+
+User = get_user_model()
+
+
+class PageCacheTest(QueryBudgetMixin, TestCase):
+    """Тестируем кэш целых страниц и дыры, зависящие от пользователя."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Pupkin',
+                                              first_name='Василий')
+        cls.reader = User.objects.create_user(username='Pechkin',
+                                              first_name='Игорь')
+        cls.group = Group.objects.create(title='Собаки', slug='dogs',
+                                         description='Блог о собаках')
+        cls.post = Post.objects.create(author=cls.author, text='Пост',
+                                       group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.profile_url = reverse('posts:profile',
+                                   kwargs={'username': self.author})
+        self.post_url = reverse('posts:post_detail',
+                                kwargs={'post_id': self.post.pk})
+        self.urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            self.profile_url,
+            self.post_url,
+        ]
+
+    def test_page_served_from_cache(self):
+        """Повторный запрос не рисует страницу и не читает посты: остаются
+        только поиск группы или автора и дата последнего поста."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                first = self.guest_client.get(url)
+                self.assertTrue(first.templates)
+                with self.assertQueryBudget(2):
+                    again = self.guest_client.get(url)
+                self.assertNotIn('page_obj', again.context or {})
+                self.assertEqual(again.content, first.content)
+
+    def test_cached_page_has_no_user_data(self):
+        """Страница, закэшированная для пользователя, отдается гостю без
+        его имени, формы комментария и кнопки подписки."""
+        for url in self.urls:
+            self.reader_client.get(url)
+        for url in self.urls:
+            with self.subTest(url=url):
+                content = self.guest_client.get(url).content.decode()
+                self.assertIn('Войти', content)
+                self.assertNotIn('Игорь', content)
+                self.assertNotIn('Подписаться', content)
+                self.assertNotIn('csrfmiddlewaretoken', content)
+                self.assertNotIn('<!--hole:', content)
+
+    def test_holes_filled_per_user(self):
+        """Авторизованные получают закэшированную страницу со своими
+        шапкой, вкладками, кнопкой подписки и формой комментария."""
+        self.guest_client.get(self.profile_url)
+        self.guest_client.get(self.post_url)
+        content = self.reader_client.get(self.profile_url).content.decode()
+        self.assertIn('Пользователь: Игорь', content)
+        self.assertIn('Избранные авторы', content)
+        self.assertIn('Подписаться', content)
+        content = self.reader_client.get(self.post_url).content.decode()
+        self.assertIn('csrfmiddlewaretoken', content)
+        self.assertNotIn('редактировать', content)
+        content = self.author_client.get(self.post_url).content.decode()
+        self.assertIn('Пользователь: Василий', content)
+        self.assertIn('редактировать', content)
+        content = self.author_client.get(self.profile_url).content.decode()
+        self.assertNotIn('Подписаться', content)
+
+    def test_follow_button_changes(self):
+        """Кнопка подписки отражает подписку пользователя."""
+        self.reader_client.get(self.profile_url)
+        Follow.objects.create(user=self.reader, author=self.author)
+        content = self.reader_client.get(self.profile_url).content.decode()
+        self.assertIn('Отписаться', content)
+
+    def test_new_post_invalidates_page(self):
+        """Новый пост виден сразу: ключ страницы включает версию лент."""
+        for url in self.urls[:3]:
+            self.guest_client.get(url)
+        with run_on_commit():
+            Post.objects.create(author=self.author, text='Свежий пост',
+                                group=self.group)
+        for url in self.urls[:3]:
+            with self.subTest(url=url):
+                self.assertContains(self.guest_client.get(url),
+                                    'Свежий пост')
+
+    def test_marker_in_post_text_is_escaped(self):
+        """Метка дыры в тексте поста экранируется и не заполняется."""
+        marker = hole_marker('header', {})
+        post = Post.objects.create(author=self.author, text=marker)
+        url = reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        self.guest_client.get(url)
+        content = self.guest_client.get(url).content.decode()
+        self.assertEqual(content.count('Регистрация'), 1)
+        self.assertIn('&lt;!--hole:', content)
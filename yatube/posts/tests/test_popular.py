@@ -0,0 +1,171 @@
+import datetime as dt
+from http import HTTPStatus
+from importlib import import_module
+from io import StringIO
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from ..models import Comment, Post
+from ..popular import (POPULAR_KEY, PopularFeed, engagement, post_score,
+                       rescore_posts)
+
+User = get_user_model()
+HALF_LIFE = 60 * 60
+
+
+@override_settings(POPULAR_HALF_LIFE=HALF_LIFE, POPULAR_SIZE=3)
+class PopularFeedTest(TestCase):
+    """Тестируем рейтинг постов и вкладку "Популярное"."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Pupkin')
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.author)
+        self.posts = [Post.objects.create(author=self.author,
+                                          text=f'Пост {number}')
+                      for number in range(3)]
+
+    def age(self, post, seconds):
+        """Сдвигает публикацию поста и его комментарии в прошлое и
+        пересчитывает рейтинг."""
+        moment = timezone.now() - dt.timedelta(seconds=seconds)
+        Post.objects.filter(pk=post.pk).update(pub_date=moment)
+        Comment.objects.filter(post=post).update(created=moment)
+        rescore_posts([post.pk])
+        cache.delete(POPULAR_KEY)
+
+    def comment(self, post, text='Комментарий'):
+        return Comment.objects.create(post=post, author=self.author,
+                                      text=text)
+
+    def popular_ids(self):
+        return PopularFeed().ids
+
+    def test_score_decays(self):
+        """Вовлеченность нового поста равна весу поста и вдвое падает за
+        период полураспада."""
+        now = timezone.now()
+        self.assertAlmostEqual(engagement(post_score(now), now), 1)
+        self.assertAlmostEqual(
+            engagement(post_score(now - dt.timedelta(seconds=HALF_LIFE)),
+                       now), 0.5)
+
+    def test_comments_change_score_incrementally(self):
+        """Комментарий прибавляет свой вклад к рейтингу, удаление -
+        вычитает; результат совпадает с пересчетом по комментариям."""
+        post = self.posts[0]
+        initial = Post.objects.get(pk=post.pk).score
+        comments = [self.comment(post) for _ in range(3)]
+        score = Post.objects.get(pk=post.pk).score
+        self.assertGreater(score, initial)
+        rescore_posts([post.pk])
+        self.assertAlmostEqual(Post.objects.get(pk=post.pk).score, score,
+                               places=5)
+        for comment in comments:
+            comment.delete()
+        self.assertAlmostEqual(Post.objects.get(pk=post.pk).score, initial,
+                               places=5)
+
+    def test_ranking(self):
+        """Свежие комментарии поднимают пост выше более новых, а затухшие
+        обсуждения пропадают из списка."""
+        old, fresh, discussed = self.posts
+        self.age(old, HALF_LIFE * 2)
+        self.comment(old)
+        self.comment(old)
+        self.age(discussed, HALF_LIFE)
+        self.comment(discussed)
+        self.assertEqual(self.popular_ids(),
+                         [old.pk, discussed.pk, fresh.pk])
+        self.age(old, HALF_LIFE * 2)
+        self.assertEqual(self.popular_ids(),
+                         [discussed.pk, fresh.pk, old.pk])
+        self.age(old, HALF_LIFE * 10)
+        self.assertEqual(self.popular_ids(), [discussed.pk, fresh.pk])
+
+    def test_top_list_is_bounded(self):
+        """В списке не больше POPULAR_SIZE постов; обсуждаемый пост
+        попадает в него без перестроения списка."""
+        self.age(self.posts[0], HALF_LIFE)
+        PopularFeed()
+        new = Post.objects.create(author=self.author, text='Новый')
+        self.assertNotIn(self.posts[0].pk, self.popular_ids())
+        self.assertEqual(len(self.popular_ids()), 3)
+        for _ in range(3):
+            self.comment(self.posts[0])
+        with self.assertNumQueries(0):
+            ids = self.popular_ids()
+        self.assertEqual(ids[0], self.posts[0].pk)
+        self.assertIn(new.pk, ids)
+        self.posts[0].delete()
+        self.assertNotIn(self.posts[0].pk, self.popular_ids())
+
+    def test_popular_page(self):
+        """Страница читает только посты страницы, без таблицы
+        комментариев, и есть на вкладках."""
+        self.comment(self.posts[0])
+        url = reverse('posts:popular')
+        with override_settings(PAGE_CACHE_TIMEOUT=0):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.authorized_client.get(url)
+        self.assertEqual(
+            [post.pk for post in response.context['page_obj']][0],
+            self.posts[0].pk)
+        self.assertFalse([query for query in queries.captured_queries
+                          if 'posts_comment' in query['sql']])
+        self.assertContains(response, 'Популярное')
+        self.assertContains(self.authorized_client.get(reverse(
+            'posts:index')), f'href="{url}"')
+        self.guest_client.get(url)
+        with self.assertNumQueries(0):
+            self.guest_client.get(url)
+
+    def test_popular_page_shows_new_comments(self):
+        """Комментарий к посту из списка меняет страницу и ее ETag, даже
+        если порядок постов не изменился."""
+        url = reverse('posts:popular')
+        response = self.guest_client.get(url)
+        self.assertContains(response, 'Комментариев: 0', count=3)
+        etag = response['ETag']
+        first = response.context['page_obj'][0]
+        for _ in range(2):
+            self.comment(first)
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertContains(response, 'Комментариев: 2')
+
+    def test_update_popular_command(self):
+        """Команда пересчитывает рейтинги и строит список заново."""
+        Post.objects.update(score=0)
+        out = StringIO()
+        call_command('update_popular', '--rescore', stdout=out)
+        self.assertIn('Популярных постов: 3', out.getvalue())
+        self.assertEqual(len(cache.get(POPULAR_KEY)['entries']), 3)
+
+    def test_migration_fills_scores(self):
+        """Миграция 0020 считает рейтинги существующих постов, и они
+        сразу попадают во вкладку без update_popular."""
+        self.comment(self.posts[0])
+        scores = dict(Post.objects.values_list('pk', 'score'))
+        Post.objects.update(score=0)
+        migration = import_module('posts.migrations.0020_post_score')
+        migration.fill_scores(apps, None)
+        for pk, score in Post.objects.values_list('pk', 'score'):
+            self.assertAlmostEqual(score, scores[pk], places=5)
+        cache.delete(POPULAR_KEY)
+        self.assertEqual(self.popular_ids()[0], self.posts[0].pk)
@@ -0,0 +1,120 @@
+from itertools import count
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from core.testing import QueryBudgetMixin, run_on_commit
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class QueryBudgetTest(QueryBudgetMixin, TestCase):
+    """Тестируем, что число запросов страниц не зависит от количества
+    постов и комментариев на них и укладывается в бюджет."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Pupkin')
+        cls.group = Group.objects.create(title='Собаки', slug='dogs',
+                                         description='Блог о собаках')
+        cls.post = Post.objects.create(author=cls.user, text='Пост номер 1',
+                                       group=cls.group)
+
+    def setUp(self):
+        self.numbers = count(1)
+        self.authorized_user = Client()
+        self.authorized_user.force_login(self.user)
+
+    def add_posts(self, amount, author=None, group=None):
+        """Добавляет посты новых авторов (на которых подписан self.user)
+        в новых группах, если автор и группа не заданы."""
+        for _ in range(amount):
+            number = next(self.numbers)
+            post_author = author or User.objects.create_user(
+                username=f'author_{number}', first_name=f'Автор {number}')
+            if author is None:
+                Follow.objects.create(user=self.user, author=post_author)
+            post_group = group or Group.objects.create(
+                title=f'Группа {number}', slug=f'group_{number}',
+                description='Описание')
+            Post.objects.create(author=post_author, group=post_group,
+                                text=f'Пост {number}')
+
+    def test_feed_pages_do_not_scale(self):
+        """Число запросов лент одинаково для одного и десяти постов."""
+        pages = {
+            reverse('posts:index'): self.add_posts,
+            reverse('posts:follow_index'): self.add_posts,
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}):
+                lambda amount: self.add_posts(amount, group=self.group),
+            reverse('posts:profile', kwargs={'username': self.user}):
+                lambda amount: self.add_posts(amount, author=self.user),
+        }
+        for url, add_objects in pages.items():
+            with self.subTest(url=url):
+                self.assertQueriesDoNotScale(
+                    self.authorized_user, url, add_objects,
+                    sizes=(1, settings.COUNT_OF_POSTS))
+
+    def test_post_detail_does_not_scale(self):
+        """Число запросов страницы поста не зависит от числа
+        комментариев."""
+        def add_comments(amount):
+            for _ in range(amount):
+                number = next(self.numbers)
+                author = User.objects.create_user(username=f'reader_{number}')
+                Comment.objects.create(post=self.post, author=author,
+                                       text=f'Комментарий {number}')
+
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        self.assertQueriesDoNotScale(self.authorized_user, url, add_comments)
+
+    def test_post_detail_in_two_queries(self):
+        """Страница поста с группой и комментариями строится с пустым
+        кэшем не больше чем двумя запросами для гостя (пост со связанными
+        данными и комментарии) и четырьмя для пользователя (плюс сессия и
+        пользователь); повторный запрос гостя читает только пост для
+        ключа страницы, а страница отдается из кэша."""
+        Comment.objects.create(post=self.post, author=self.user,
+                               text='Комментарий')
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        guest_client = Client()
+        for client, budget in ((guest_client, 2), (self.authorized_user, 4)):
+            with self.subTest(budget=budget):
+                cache.clear()
+                with self.assertQueryBudget(budget):
+                    response = client.get(url)
+                self.assertContains(response, self.group.title)
+                self.assertContains(response, 'Комментарий')
+        with self.assertQueryBudget(1):
+            guest_client.get(url)
+
+    def test_pages_fit_query_budget(self):
+        """Страницы укладываются в бюджет QUERY_BUDGET."""
+        self.add_posts(settings.COUNT_OF_POSTS)
+        pages = [
+            reverse('posts:index'),
+            reverse('posts:follow_index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        ]
+        for url in pages:
+            with self.subTest(url=url):
+                with self.assertQueryBudget(settings.QUERY_BUDGET):
+                    self.authorized_user.get(url)
+
+    def test_add_comment_fits_query_budget(self):
+        """Комментарий вместе с письмом автору поста укладывается в бюджет
+        add_comment из QUERY_BUDGET_VIEWS."""
+        url = reverse('posts:add_comment', kwargs={'post_id': self.post.pk})
+        budget = settings.QUERY_BUDGET_VIEWS['posts:add_comment']
+        with self.assertQueryBudget(budget), run_on_commit():
+            self.authorized_user.post(url, {'text': 'Комментарий'})
+        self.assertTrue(Comment.objects.filter(post=self.post).exists())
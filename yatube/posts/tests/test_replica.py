@@ -0,0 +1,186 @@
+import os
+import shutil
+import tempfile
+import time
+from http import HTTPStatus
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connections, router
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.db.router import replica_alias
+from core.testing import run_on_commit
+
+from ..groups import GROUP_FEED_KEY
+from ..popular import POPULAR_KEY
+from ..models import Follow, Group, Post
+
+User = get_user_model()
+REPLICA = settings.REPLICA_DATABASE
+COOKIE = settings.REPLICA_STICKY_COOKIE
+
+
+@override_settings(PAGE_CACHE_TIMEOUT=0)
+class ReplicaRoutingTest(TestCase):
+    """Тестируем чтение лент с реплики. Основная база и реплика - два
+    отдельных файла SQLite без репликации между ними, поэтому реплика
+    всегда "отстает": в ней есть только пользователи."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.mkdtemp()
+        # Реплика из настроек (DB_REPLICA_PATH) в тестах - зеркало
+        # основной базы; на время теста ее заменяет отдельный файл
+        cls.saved = None
+        if REPLICA in connections.databases:
+            cls.saved = (connections.databases[REPLICA], connections[REPLICA])
+            del connections[REPLICA]
+        connections.databases[REPLICA] = {
+            **settings.DATABASES['default'],
+            'NAME': os.path.join(cls.directory, 'replica.sqlite3'),
+        }
+        # Роутер не пускает миграции на реплику: здесь это отдельный файл
+        # без репликации, и схему в нем создает тест
+        with override_settings(DATABASE_ROUTERS=[]):
+            call_command('migrate', database=REPLICA, verbosity=0)
+        cls.user = User.objects.create_user(username='Pupkin')
+        cls.author = User.objects.create_user(username='Pechkin')
+        User.objects.using(REPLICA).bulk_create(
+            User(pk=user.pk, username=user.username)
+            for user in (cls.user, cls.author))
+        cls.post = Post.objects.create(author=cls.author,
+                                       text='Пост в основной базе')
+
+    @classmethod
+    def tearDownClass(cls):
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.databases[REPLICA]
+        if cls.saved is not None:
+            connections.databases[REPLICA], connections[REPLICA] = cls.saved
+        shutil.rmtree(cls.directory, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_feeds_read_replica(self):
+        """Лента читается с реплики, страница поста - с основной базы."""
+        with CaptureQueriesContext(connections[REPLICA]) as replica:
+            response = self.guest_client.get(reverse('posts:index'))
+        self.assertTrue(replica.captured_queries)
+        self.assertNotContains(response, self.post.text)
+        self.assertNotIn(COOKIE, response.cookies)
+        with CaptureQueriesContext(connections[REPLICA]) as replica:
+            response = self.guest_client.get(reverse(
+                'posts:post_detail', kwargs={'post_id': self.post.pk}))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(replica.captured_queries, [])
+
+    def test_group_feed_from_replica_expires_early(self):
+        """Список ленты группы, построенный по реплике, хранится не
+        дольше REPLICA_CACHE_TIMEOUT, и изменения на месте его не
+        продлевают."""
+        group = Group.objects.create(title='Собаки', slug='dogs',
+                                     description='Блог о собаках')
+        Group.objects.using(REPLICA).bulk_create([Group(
+            pk=group.pk, title=group.title, slug=group.slug,
+            description=group.description)])
+        self.guest_client.get(reverse('posts:group_list',
+                                      kwargs={'slug': group.slug}))
+        key = GROUP_FEED_KEY.format(group.pk)
+        expires = cache.get(key)['expires']
+        self.assertLessEqual(expires - time.time(),
+                             settings.REPLICA_CACHE_TIMEOUT)
+        with run_on_commit():
+            Post.objects.create(author=self.author, text='Пост в группе',
+                                group=group)
+        self.assertEqual(cache.get(key)['count'], 1)
+        self.assertEqual(cache.get(key)['expires'], expires)
+
+    def test_popular_from_replica_expires_early(self):
+        """Список популярных постов, построенный по реплике, хранится не
+        дольше REPLICA_CACHE_TIMEOUT."""
+        self.guest_client.get(reverse('posts:popular'))
+        self.assertLessEqual(cache.get(POPULAR_KEY)['expires'] - time.time(),
+                             settings.REPLICA_CACHE_TIMEOUT)
+
+    def test_read_your_writes_after_post_create(self):
+        """После создания поста автор видит его в лентах, пока действует
+        cookie; без нее ленты снова читаются с реплики."""
+        response = self.authorized_client.post(
+            reverse('posts:post_create'), {'text': 'Новый пост'},
+            follow=True)
+        self.assertIn(COOKIE, self.authorized_client.cookies)
+        self.assertContains(response, 'Новый пост')
+        self.assertContains(
+            self.authorized_client.get(reverse('posts:index')), 'Новый пост')
+        del self.authorized_client.cookies[COOKIE]
+        self.assertNotContains(
+            self.authorized_client.get(reverse('posts:index')), 'Новый пост')
+
+    def test_writes_set_sticky_cookie(self):
+        """Комментарий, правка поста и подписка включают чтение основной
+        базы; запись уходит в основную базу."""
+        author_client = Client()
+        author_client.force_login(self.author)
+        requests = [
+            (self.authorized_client, reverse(
+                'posts:add_comment', kwargs={'post_id': self.post.pk}),
+             {'text': 'Комментарий'}),
+            (author_client, reverse(
+                'posts:post_edit', kwargs={'post_id': self.post.pk}),
+             {'text': 'Исправленный пост'}),
+            (self.authorized_client, reverse(
+                'posts:profile_follow', kwargs={'username': self.author}),
+             None),
+        ]
+        for client, url, data in requests:
+            with self.subTest(url=url):
+                client.cookies.pop(COOKIE, None)
+                response = client.post(url, data) if data else client.get(url)
+                self.assertIn(COOKIE, response.cookies)
+        self.assertTrue(Follow.objects.filter(user=self.user,
+                                              author=self.author).exists())
+        self.assertFalse(Follow.objects.using(REPLICA).exists())
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertContains(response, 'Исправленный пост')
+
+
+class ReplicaSettingsTest(TestCase):
+    """Тестируем настройку реплики: миграции и тестовое зеркало."""
+
+    def test_replica_not_migrated(self):
+        """Миграции применяются только к основной базе."""
+        self.assertTrue(router.allow_migrate(DEFAULT_DB_ALIAS, 'posts'))
+        self.assertFalse(router.allow_migrate(REPLICA, 'posts'))
+
+    def test_mirror_reads_primary(self):
+        """Реплика, указывающая на основную базу (зеркало в тестах), не
+        читается отдельным соединением."""
+        mirror = {**connections.databases[DEFAULT_DB_ALIAS],
+                  'TEST': {'MIRROR': DEFAULT_DB_ALIAS}}
+        with mock.patch.dict(connections.databases, {REPLICA: mirror}):
+            self.assertIsNone(replica_alias())
+
+
+class NoReplicaTest(TestCase):
+    """Без реплики все читается из основной базы, а cookie не ставится."""
+
+    def test_no_sticky_cookie(self):
+        user = User.objects.create_user(username='Pupkin')
+        client = Client()
+        client.force_login(user)
+        response = client.post(reverse('posts:post_create'),
+                               {'text': 'Новый пост'})
+        self.assertNotIn(COOKIE, response.cookies)
@@ -0,0 +1,119 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Comment, Post, SearchTerm
+from ..search import FTS5Search, TermSearch, filter_posts, search_backend
+
+User = get_user_model()
+
+
+class SearchTestMixin:
+    """Общие проверки поиска для обоих бэкендов."""
+    backend = None
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='Pupkin')
+        self.guest_client = Client()
+        self.dogs = Post.objects.create(
+            author=self.user, text='Собака лает, караван идет')
+        self.cats = Post.objects.create(
+            author=self.user, text='Кошки гуляют сами по себе')
+        self.mixed = Post.objects.create(
+            author=self.user, text='Собака и кошка, кошка и собака')
+
+    def search(self, query):
+        response = self.guest_client.get(reverse('posts:search'),
+                                         {'q': query})
+        return list(response.context['page_obj'])
+
+    def test_backend(self):
+        """Выбран ожидаемый бэкенд."""
+        self.assertIs(search_backend(), self.backend)
+
+    def test_results_ranked_by_relevance(self):
+        """Пост с большим числом вхождений слова выше в выдаче."""
+        self.assertEqual(self.search('собака'), [self.mixed, self.dogs])
+
+    def test_all_terms_required_and_prefix_match(self):
+        """Находятся посты со всеми словами запроса, слово ищется по
+        началу."""
+        self.assertEqual(self.search('кошк собак'), [self.mixed])
+        self.assertEqual(self.search('КАРАВАН'), [self.dogs])
+        self.assertEqual(self.search(''), [])
+        self.assertEqual(self.search('"*)('), [])
+
+    def test_index_follows_changes(self):
+        """Изменения и удаление поста и комментариев сразу видны в
+        поиске."""
+        self.dogs.text = 'Верблюд'
+        self.dogs.save()
+        self.assertEqual(self.search('караван'), [])
+        comment = Comment.objects.create(post=self.cats, author=self.user,
+                                         text='Верблюды не кошки')
+        self.assertEqual(set(self.search('верблюд')), {self.dogs, self.cats})
+        comment.delete()
+        self.assertEqual(self.search('верблюд'), [self.dogs])
+        self.dogs.delete()
+        self.assertEqual(self.search('верблюд'), [])
+
+    def test_comment_match_ranks_below_text_match(self):
+        """Совпадение в комментарии весит меньше, чем в тексте поста."""
+        Comment.objects.create(post=self.cats, author=self.user,
+                               text='Караван')
+        self.assertEqual(self.search('караван'), [self.dogs, self.cats])
+
+    def test_terms_found_across_post_and_comments(self):
+        """Слова запроса ищутся во всем обсуждении: пост находится, если
+        одно слово есть в тексте, а другое - в комментарии, и одинаково в
+        обоих бэкендах."""
+        Comment.objects.create(post=self.cats, author=self.user,
+                               text='Караван')
+        Comment.objects.create(post=self.dogs, author=self.user,
+                               text='Верблюд')
+        Comment.objects.create(post=self.dogs, author=self.user,
+                               text='Пустыня')
+        self.assertEqual(self.search('кошки караван'), [self.cats])
+        self.assertEqual(self.search('верблюд пустыня'), [self.dogs])
+        self.assertEqual(list(filter_posts(Post.objects.all(),
+                                           'кошки караван')), [self.cats])
+
+    def test_search_is_paginated(self):
+        """Результаты поиска разбиваются на страницы по 10 постов, ссылки
+        паджинатора сохраняют запрос."""
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'Собака номер {i}')
+            for i in range(12))
+        if self.backend is TermSearch:
+            call_command('rebuild_search_index', stdout=StringIO())
+        response = self.guest_client.get(reverse('posts:search'),
+                                         {'q': 'собака', 'page': 2})
+        self.assertEqual(response.context['page_obj'].paginator.count, 14)
+        self.assertEqual(len(response.context['page_obj']), 4)
+        self.assertContains(response, '?q=%D1%81%D0%BE%D0%B1%D0%B0%D0%BA%D0'
+                                      '%B0&amp;page=1')
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке фильтрует посты через индекс."""
+        posts = filter_posts(Post.objects.order_by('pk'), 'кошк')
+        self.assertEqual(list(posts), [self.cats, self.mixed])
+
+
+class FTS5SearchTest(SearchTestMixin, TestCase):
+    """Тестируем поиск по таблицам FTS5."""
+    backend = FTS5Search
+
+
+@override_settings(SEARCH_BACKEND='python')
+class TermSearchTest(SearchTestMixin, TestCase):
+    """Тестируем поиск по обратному индексу SearchTerm."""
+    backend = TermSearch
+
+    def test_rebuild_command(self):
+        """Команда rebuild_search_index восстанавливает индекс."""
+        SearchTerm.objects.all().delete()
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.search('караван'), [self.dogs])
@@ -0,0 +1,151 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.models import Task
+
+from ..models import Post
+from ..thumbnails import generate_thumbnail, resolve_thumbnails
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+User = get_user_model()
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailsTest(TestCase):
+    """Тестируем построение миниатюр картинок постов при загрузке."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Pupkin')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_user = Client()
+        self.authorized_user.force_login(self.user)
+        self.post = Post.objects.create(
+            author=self.user, text='Пост номер 1',
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'))
+
+    def test_generate_thumbnail_stores_url(self):
+        """Миниатюра строится и ее URL сохраняется в посте, а страницы
+        выводят сохраненный URL."""
+        url = generate_thumbnail(self.post.pk)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.image_thumbnail, url)
+        self.assertTrue(url.startswith(settings.MEDIA_URL))
+        response = self.authorized_user.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}))
+        self.assertContains(response, f'src="{url}"')
+
+    def test_post_create_enqueues_thumbnail(self):
+        """Создание поста с картинкой ставит миниатюру в очередь."""
+        with mock.patch('posts.views.enqueue_thumbnail') as enqueue:
+            self.authorized_user.post(reverse('posts:post_create'), data={
+                'text': 'Пост номер 2',
+                'image': SimpleUploadedFile('small2.gif', SMALL_GIF,
+                                            'image/gif'),
+            })
+        enqueue.assert_called_once_with(Post.objects.get(text='Пост номер 2'))
+
+    def test_post_edit_resets_thumbnail_of_new_image(self):
+        """Замена картинки сбрасывает миниатюру и ставит новую в очередь,
+        а правка текста миниатюру не трогает."""
+        generate_thumbnail(self.post.pk)
+        page = reverse('posts:post_edit', kwargs={'post_id': self.post.pk})
+        with mock.patch('posts.views.enqueue_thumbnail') as enqueue:
+            self.authorized_user.post(page, data={'text': 'Новый текст'})
+            enqueue.assert_not_called()
+            self.post.refresh_from_db()
+            self.assertNotEqual(self.post.image_thumbnail, '')
+            self.authorized_user.post(page, data={
+                'text': 'Новый текст',
+                'image': SimpleUploadedFile('small3.gif', SMALL_GIF,
+                                            'image/gif'),
+            })
+            enqueue.assert_called_once()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.image_thumbnail, '')
+
+    def test_resolve_thumbnails_reads_cache_without_writes(self):
+        """URL миниатюр страницы, еще не сохраненные в постах, находятся
+        одним запросом к кэшу и подставляются без запросов к БД."""
+        posts = [self.post] + [
+            Post.objects.create(
+                author=self.user, text=f'Пост {i}',
+                image=SimpleUploadedFile(f'page{i}.gif', SMALL_GIF,
+                                         'image/gif'))
+            for i in range(2)
+        ]
+        urls = [generate_thumbnail(post.pk) for post in posts]
+        Post.objects.update(image_thumbnail='')
+        with self.assertNumQueries(0):
+            resolve_thumbnails(posts)
+        self.assertEqual([post.image_thumbnail for post in posts], urls)
+        self.assertEqual(Post.objects.filter(image_thumbnail='').count(), 3)
+
+    def test_resolve_thumbnails_enqueues_missing_once(self):
+        """Если миниатюры нет в кэше, она ставится в очередь один раз, а
+        построенная миниатюра снимает флаг постановки."""
+        cache.clear()
+        with mock.patch('posts.thumbnails.enqueue_thumbnail') as enqueue:
+            resolve_thumbnails([self.post])
+            resolve_thumbnails([self.post])
+        enqueue.assert_called_once_with(self.post)
+        self.assertEqual(self.post.image_thumbnail, '')
+        url = generate_thumbnail(self.post.pk)
+        post = Post.objects.get(pk=self.post.pk)
+        updated = post.updated
+        self.assertEqual(post.image_thumbnail, url)
+        generate_thumbnail(self.post.pk)
+        self.assertEqual(Post.objects.get(pk=self.post.pk).updated, updated)
+
+    @override_settings(TASKS_BACKEND='database')
+    def test_pages_do_not_write_thumbnails(self):
+        """Страницы с постом без миниатюры не пишут в посты и ставят одну
+        задачу на все просмотры."""
+        cache.clear()
+        updated = Post.objects.get(pk=self.post.pk).updated
+        for _ in range(2):
+            self.authorized_user.get(reverse('posts:index'))
+            self.authorized_user.get(
+                reverse('posts:post_detail', kwargs={'post_id': self.post.pk}))
+        self.assertEqual(Post.objects.get(pk=self.post.pk).updated, updated)
+        self.assertEqual(Task.objects.count(), 1)
+
+    @override_settings(TASKS_BACKEND='database')
+    def test_feed_shows_placeholder_until_thumbnail_built(self):
+        """Пока миниатюры нет, лента выводит заглушку ее размера, а не
+        исходную картинку."""
+        cache.clear()
+        response = self.authorized_user.get(reverse('posts:index'))
+        self.assertNotContains(response, self.post.image.url)
+        self.assertContains(response, 'thumbnail_placeholder.svg')
+        self.assertContains(response, 'width="1200" height="600"')
+        url = generate_thumbnail(self.post.pk)
+        cache.clear()
+        response = self.authorized_user.get(reverse('posts:index'))
+        self.assertContains(response, url)
+        self.assertNotContains(response, 'thumbnail_placeholder.svg')
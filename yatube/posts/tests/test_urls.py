@@ -1,13 +1,15 @@
 from http import HTTPStatus
 
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 
 from ..models import Follow, Group, Post
 
 User = get_user_model()
 
 
+# Тесты проверяют шаблоны, поэтому страницы рисуются заново
+@override_settings(PAGE_CACHE_TIMEOUT=0)
 class PostsURLTests(TestCase):
     """Тестируем доступность страниц и проверку шаблонов приложения Posts."""
 
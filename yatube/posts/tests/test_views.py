@@ -1,24 +1,31 @@
 import shutil
 import tempfile
 from datetime import timedelta
+from http import HTTPStatus
 from unittest import mock
 
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 
-from ..models import Follow, Group, Post
+from core.testing import run_on_commit
+
+from ..counters import recount_user
+from ..models import Comment, Follow, Group, Post, TimelineEntry
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 User = get_user_model()
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+# Тесты проверяют контекст шаблонов, поэтому страницы рисуются заново
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, PAGE_CACHE_TIMEOUT=0)
 class PostsPagesTests(TestCase):
     """Тестируем какие шаблоны и контекст используют
     view-функции приложения Posts."""
@@ -145,9 +152,10 @@ class PostsPagesTests(TestCase):
         time_test_now = timezone.now() + timedelta(minutes=1)
         with mock.patch("django.utils.timezone.now") as mock_now:
             mock_now.return_value = time_test_now
-            test_post = Post.objects.create(author=self.user,
-                                            text='Пост номер 2',
-                                            group_id=self.group_dogs.id)
+            with run_on_commit():
+                test_post = Post.objects.create(author=self.user,
+                                                text='Пост номер 2',
+                                                group_id=self.group_dogs.id)
         page_names = [*self.pages_with_page_obj, *self.pages_for_group_cats]
         for page in page_names:
             with self.subTest(page=page):
@@ -190,6 +198,9 @@ class PaginatorViewsTest(TestCase):
             posts.append(Post(author=cls.user, text=f'Пост номер {i}',
                               group_id=cls.group_dogs.id))
         Post.objects.bulk_create(posts)
+        # bulk_create не вызывает сигналы, счетчики пересчитываются как
+        # после импорта
+        recount_user(cls.user.pk)
 
     def setUp(self):
         self.authorized_user = Client()
@@ -218,6 +229,137 @@ class PaginatorViewsTest(TestCase):
                 self.assertEqual(count, 3)
 
 
+@override_settings(PAGE_CACHE_TIMEOUT=0)
+class KeysetPaginatorViewsTest(TestCase):
+    """Тестируем keyset-паджинацию по параметру cursor."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Pupkin')
+        cls.group_dogs = Group.objects.create(title='Собаки', slug='dogs',
+                                              description='Блог о собаках')
+        posts = []
+        for i in range(1, 14):
+            posts.append(Post(author=cls.user, text=f'Пост номер {i}',
+                              group_id=cls.group_dogs.id))
+        Post.objects.bulk_create(posts)
+        Follow.objects.create(
+            user=User.objects.create_user(username='Pechkin'),
+            author=cls.user)
+
+    def setUp(self):
+        self.authorized_user = Client()
+        self.authorized_user.force_login(self.user)
+        self.follower = Client()
+        self.follower.force_login(User.objects.get(username='Pechkin'))
+        self.page_names = [reverse('posts:index'),
+                           reverse('posts:group_list',
+                                   kwargs={'slug': self.group_dogs.slug}),
+                           reverse('posts:profile',
+                                   kwargs={'username': self.user})]
+
+    def walk_pages(self, client, page):
+        """Функция проходит ленту page по курсорам next_cursor и
+        возвращает список страниц."""
+        pages = [client.get(page + '?cursor=').context['page_obj']]
+        while pages[-1].has_next():
+            response = client.get(f'{page}?cursor={pages[-1].next_cursor}')
+            pages.append(response.context['page_obj'])
+        return pages
+
+    def test_cursor_pages_contain_all_records(self):
+        """Проверка: по курсорам выдаются 10 и 3 поста без повторов."""
+        expected = list(Post.objects.order_by('-pub_date', '-pk'))
+        for page in self.page_names:
+            with self.subTest(page=page):
+                pages = self.walk_pages(self.authorized_user, page)
+                self.assertEqual([len(obj) for obj in pages], [10, 3])
+                self.assertEqual(
+                    [post for obj in pages for post in obj], expected)
+
+    def test_follow_index_cursor_pages(self):
+        """Проверка: keyset-паджинация работает в ленте подписок."""
+        pages = self.walk_pages(self.follower, reverse('posts:follow_index'))
+        self.assertEqual([len(obj) for obj in pages], [10, 3])
+
+    def test_previous_cursor_returns_first_page(self):
+        """Проверка: курсор previous_cursor возвращает на первую страницу."""
+        page = reverse('posts:index')
+        first, second = self.walk_pages(self.authorized_user, page)
+        self.assertFalse(first.has_previous())
+        response = self.authorized_user.get(
+            f'{page}?cursor={second.previous_cursor}')
+        self.assertEqual(list(response.context['page_obj']), list(first))
+
+    def test_invalid_cursor_returns_first_page(self):
+        """Проверка: поврежденный курсор возвращает первую страницу."""
+        response = self.authorized_user.get(
+            reverse('posts:index') + '?cursor=broken')
+        self.assertEqual(len(response.context['page_obj']), 10)
+        self.assertFalse(response.context['page_obj'].has_previous())
+
+    @override_settings(PAGINATION_MODE='keyset')
+    def test_keyset_mode_renders_cursor_links(self):
+        """Проверка: в режиме keyset шаблон выводит ссылки с курсором."""
+        response = self.authorized_user.get(reverse('posts:index'))
+        page_obj = response.context['page_obj']
+        self.assertContains(response, f'?cursor={page_obj.next_cursor}')
+        self.assertNotContains(response, '?page=')
+
+
+@override_settings(COMMENTS_PER_PAGE=10)
+class CommentsPaginationViewsTest(TestCase):
+    """Тестируем постраничный вывод и подгрузку комментариев."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Pupkin')
+        cls.post = Post.objects.create(author=cls.user, text='Пост номер 1')
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.user, text=f'Комментарий {i}')
+            for i in range(1, 26))
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.detail_page = reverse('posts:post_detail',
+                                   kwargs={'post_id': self.post.id})
+        self.comments_page = reverse('posts:post_comments',
+                                     kwargs={'post_id': self.post.id})
+
+    def test_post_detail_shows_first_comments(self):
+        """На странице поста выводятся только новые комментарии и ссылка
+        на подгрузку следующих."""
+        response = self.guest_client.get(self.detail_page)
+        comments = response.context['comments']
+        self.assertEqual(len(comments), 10)
+        self.assertEqual(comments[0].text, 'Комментарий 25')
+        self.assertContains(
+            response, f'{self.comments_page}?cursor={comments.next_cursor}')
+
+    def test_fragment_returns_all_comments_by_cursor(self):
+        """Фрагмент по курсорам отдает все комментарии без повторов."""
+        texts = []
+        cursor = ''
+        while cursor is not None:
+            response = self.guest_client.get(self.comments_page,
+                                             {'cursor': cursor})
+            self.assertTemplateUsed(response, 'posts/includes/comments.html')
+            comments = response.context['comments']
+            texts.extend(comment.text for comment in comments)
+            cursor = comments.next_cursor
+        self.assertEqual(texts,
+                         [f'Комментарий {i}' for i in range(25, 0, -1)])
+        self.assertNotContains(response, 'Показать еще')
+
+    def test_fragment_of_missing_post(self):
+        """Фрагмент комментариев несуществующего поста - 404."""
+        response = self.guest_client.get(
+            reverse('posts:post_comments', kwargs={'post_id': 0}))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
 class FollowingViewsTest(TestCase):
     """Тестируем подписку на автора"""
 
@@ -258,8 +400,9 @@ class FollowingViewsTest(TestCase):
     def test_new_post_appears_only_subscriber(self):
         """Новая запись пользователя появляется только у подписчиков"""
         Follow.objects.create(user=self.user_1, author=self.author_1)
-        post = Post.objects.create(author=self.author_1,
-                                   text='Для подписчиков')
+        with run_on_commit():
+            post = Post.objects.create(author=self.author_1,
+                                       text='Для подписчиков')
         page = reverse('posts:follow_index')
         response_1 = self.authorized_user_1.get(page)
         response_2 = self.authorized_user_2.get(page)
@@ -267,3 +410,104 @@ class FollowingViewsTest(TestCase):
         test_post_2 = response_2.context['page_obj']
         self.assertIn(post, test_post_1)
         self.assertNotIn(post, test_post_2)
+
+    def test_new_post_fanned_out_to_timeline(self):
+        """Новая запись автора попадает в материализованную ленту
+        подписчика, а после отписки удаляется из нее."""
+        Follow.objects.create(user=self.user_1, author=self.author_1)
+        with run_on_commit():
+            post = Post.objects.create(author=self.author_1, text='В ленту')
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user_1, post=post).exists())
+        self.authorized_user_1.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': self.author_1}))
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.user_1).exists())
+
+    def test_follow_backfills_timeline(self):
+        """После подписки в ленте появляются ранее опубликованные посты
+        автора."""
+        post = Post.objects.create(author=self.author_1, text='Старый пост')
+        self.authorized_user_1.get(reverse(
+            'posts:profile_follow', kwargs={'username': self.author_1}))
+        response = self.authorized_user_1.get(reverse('posts:follow_index'))
+        self.assertIn(post, response.context['page_obj'])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=2)
+    def test_popular_author_read_on_fan_out(self):
+        """Посты популярного автора не раскладываются по лентам, но
+        выводятся подписчикам при чтении."""
+        Follow.objects.create(user=self.user_1, author=self.author_1)
+        Follow.objects.create(user=self.user_2, author=self.author_1)
+        with run_on_commit():
+            post = Post.objects.create(author=self.author_1,
+                                       text='Популярный')
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        for client in (self.authorized_user_1, self.authorized_user_2):
+            with self.subTest(client=client):
+                response = client.get(reverse('posts:follow_index'))
+                self.assertIn(post, response.context['page_obj'])
+
+    @override_settings(COUNT_OF_POSTS=2)
+    def test_timeline_page_read_by_offset(self):
+        """Страница ленты без популярных авторов читает из ленты только
+        свои записи: смещение выполняется в БД."""
+        Follow.objects.create(user=self.user_1, author=self.author_1)
+        with run_on_commit():
+            posts = [Post.objects.create(author=self.author_1,
+                                         text=f'Пост {number}')
+                     for number in range(5)]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_user_1.get(
+                reverse('posts:follow_index'), {'page': 2})
+        self.assertEqual([post.pk for post in response.context['page_obj']],
+                         [posts[2].pk, posts[1].pk])
+        timeline = [query['sql'] for query in queries.captured_queries
+                    if query['sql'].startswith(
+                        'SELECT "posts_timelineentry"."pub_date"')]
+        self.assertEqual(len(timeline), 1)
+        self.assertIn('LIMIT 2 OFFSET 2', timeline[0])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=2, COUNT_OF_POSTS=2)
+    def test_popular_author_merged_into_timeline(self):
+        """Посты популярного автора сливаются с лентой по дате без
+        повторов; такая лента листается только курсором."""
+        author_2 = User.objects.create_user(username='author_2')
+        Follow.objects.create(user=self.user_1, author=author_2)
+        Follow.objects.create(user=self.user_1, author=self.author_1)
+        with run_on_commit():
+            early = Post.objects.create(author=self.author_1, text='Ранний')
+        Follow.objects.create(user=self.user_2, author=self.author_1)
+        with run_on_commit():
+            posts = [early] + [
+                Post.objects.create(author=author, text=f'Пост {number}')
+                for number, author in enumerate(
+                    [author_2, self.author_1, author_2, self.author_1])]
+        expected = [post.pk for post in reversed(posts)]
+        page = reverse('posts:follow_index')
+        response = self.authorized_user_1.get(page, {'page': 3})
+        self.assertTrue(response.context['page_obj'].paginator.keyset)
+        ids = []
+        cursor = ''
+        while cursor is not None:
+            page_obj = self.authorized_user_1.get(
+                page, {'cursor': cursor}).context['page_obj']
+            ids.extend(post.pk for post in page_obj)
+            cursor = page_obj.next_cursor
+        self.assertEqual(ids, expected)
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=2)
+    def test_timelines_refilled_when_author_stops_being_popular(self):
+        """Посты, опубликованные, пока автор был популярным, попадают в
+        ленты подписчиков, когда подписчиков становится меньше порога."""
+        Follow.objects.create(user=self.user_1, author=self.author_1)
+        Follow.objects.create(user=self.user_2, author=self.author_1)
+        with run_on_commit():
+            post = Post.objects.create(author=self.author_1,
+                                       text='Популярный')
+            self.authorized_user_2.get(reverse(
+                'posts:profile_unfollow', kwargs={'username': self.author_1}))
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user_1, post=post).exists())
+        response = self.authorized_user_1.get(reverse('posts:follow_index'))
+        self.assertIn(post, response.context['page_obj'])
@@ -0,0 +1,109 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+from sorl.thumbnail import get_thumbnail
+
+from core.tasks import task
+
+from .models import Post
+
+THUMBNAIL_KEY = 'posts:thumbnail:{}'
+THUMBNAIL_PENDING_KEY = 'posts:thumbnail_pending:{}'
+
+_executor = None
+
+
+@task
+def generate_thumbnail(post_id):
+    """Функция generate_thumbnail строит миниатюру картинки поста по
+    геометрии POST_THUMBNAIL_GEOMETRY и сохраняет ее URL в поле
+    image_thumbnail, а пару (имя картинки, URL) - в общем кэше для
+    resolve_thumbnails. Если картинку успели заменить, URL не
+    сохраняется."""
+    post = Post.objects.filter(pk=post_id).only('image').first()
+    if post is None or not post.image:
+        return None
+    if not post.image.storage.exists(post.image.name):
+        return None
+    thumbnail = get_thumbnail(post.image, settings.POST_THUMBNAIL_GEOMETRY,
+                              **settings.POST_THUMBNAIL_OPTIONS)
+    cache.set(THUMBNAIL_KEY.format(post_id), (post.image.name, thumbnail.url),
+              settings.FEED_CACHE_TIMEOUT)
+    Post.objects.filter(pk=post_id, image=post.image.name).exclude(
+        image_thumbnail=thumbnail.url).update(
+        image_thumbnail=thumbnail.url, updated=timezone.now())
+    cache.delete(THUMBNAIL_PENDING_KEY.format(post_id))
+    return thumbnail.url
+
+
+def _generate_in_worker(post_id):
+    try:
+        generate_thumbnail(post_id)
+    finally:
+        connection.close()
+
+
+def enqueue_thumbnail(post):
+    """Функция enqueue_thumbnail после фиксации транзакции передает
+    построение миниатюры поста пулу фоновых потоков. При
+    THUMBNAIL_WORKERS = 0 миниатюра строится сразу, а при TASKS_BACKEND =
+    'database' ставится в очередь задач для воркеров."""
+    global _executor
+    if not post.image:
+        return
+    if settings.TASKS_BACKEND == 'database':
+        generate_thumbnail.delay(post.pk)
+        return
+    if not settings.THUMBNAIL_WORKERS:
+        transaction.on_commit(lambda: generate_thumbnail(post.pk))
+        return
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            thread_name_prefix='thumbnails')
+    transaction.on_commit(
+        lambda: _executor.submit(_generate_in_worker, post.pk))
+
+
+def request_thumbnail(post):
+    """Функция request_thumbnail ставит построение миниатюры поста, если
+    оно еще не поставлено: флаг в общем кэше живет TASK_TIMEOUT секунд,
+    поэтому страницы, которые выводят пост, пока миниатюра строится, не
+    ставят ее повторно."""
+    if cache.add(THUMBNAIL_PENDING_KEY.format(post.pk), True,
+                 settings.TASK_TIMEOUT):
+        enqueue_thumbnail(post)
+
+
+def resolve_thumbnails(posts):
+    """Функция resolve_thumbnails одним запросом к кэшу (get_many) находит
+    URL миниатюр постов страницы, которые еще не сохранены в
+    image_thumbnail (например, на отстающей реплике), и подставляет их в
+    посты без записи в БД. Для миниатюр, которых нет и в кэше, ставится
+    фоновая генерация; она же сохраняет URL в посте."""
+    pending = {THUMBNAIL_KEY.format(post.pk): post for post in posts
+               if post.image and not post.image_thumbnail}
+    if not pending:
+        return posts
+    found = cache.get_many(list(pending))
+    for key, post in pending.items():
+        image, url = found.get(key, (None, None))
+        if image == post.image.name:
+            post.image_thumbnail = url
+        else:
+            request_thumbnail(post)
+    return posts
+
+
+def page_thumbnails(page_obj):
+    """Функция page_thumbnails лениво разрешает миниатюры всех постов
+    страницы page_obj пачкой: запросы выполняются только при выводе
+    постов, а не при попадании в кэш фрагмента."""
+    posts = page_obj.object_list
+    page_obj.object_list = SimpleLazyObject(
+        lambda: resolve_thumbnails(list(posts)))
+    return page_obj
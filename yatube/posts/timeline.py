@@ -0,0 +1,220 @@
+import heapq
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Count, Q
+from django.utils.functional import SimpleLazyObject
+
+from core.tasks import task
+
+from .fragments import bump_feed_version
+from .models import Follow, Post, TimelineEntry
+
+User = get_user_model()
+
+
+def is_popular(author):
+    """Функция is_popular проверяет, превышает ли число подписчиков автора
+    порог TIMELINE_FANOUT_LIMIT. Посты таких авторов не раскладываются по
+    лентам при записи, а подмешиваются при чтении."""
+    followers = Follow.objects.filter(author=author)
+    return followers[:settings.TIMELINE_FANOUT_LIMIT].count() >= (
+        settings.TIMELINE_FANOUT_LIMIT)
+
+
+def fan_out_post(post):
+    """Функция fan_out_post добавляет новый пост в ленты всех подписчиков
+    автора (fan-out-on-write)."""
+    if is_popular(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author=post.author_id).values_list('user_id', flat=True)
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+         for user_id in followers.iterator()],
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+    )
+
+
+@task
+def fan_out(post_id):
+    """Задача fan_out раскладывает пост post_id по лентам подписчиков.
+    Пост мог быть удален, пока задача ждала в очереди. Задача выполняется
+    после фиксации поста, поэтому ленты, закэшированные в промежутке,
+    инвалидируются еще раз."""
+    post = Post.objects.filter(pk=post_id).only(
+        'pk', 'author', 'pub_date').first()
+    if post is not None:
+        fan_out_post(post)
+        bump_feed_version()
+
+
+def fill_timelines(user_ids, author):
+    """Функция fill_timelines добавляет в ленты пользователей user_ids
+    последние TIMELINE_BACKFILL постов автора; записи, которые уже есть в
+    лентах, пропускаются."""
+    posts = list(Post.objects.filter(author=author).values_list(
+        'pk', 'pub_date')[:settings.TIMELINE_BACKFILL])
+    for user_id in user_ids:
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+             for pk, pub_date in posts],
+            batch_size=settings.TIMELINE_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+
+
+def backfill_timeline(user, author):
+    """Функция backfill_timeline добавляет в ленту пользователя последние
+    TIMELINE_BACKFILL постов автора, на которого он подписался. Ленты
+    подписчиков популярного автора заполняются, когда он перестает быть
+    популярным (см. refill_timelines)."""
+    if not is_popular(author):
+        fill_timelines([user.pk], author)
+
+
+@task
+def refill_timelines(author_id):
+    """Задача refill_timelines заполняет ленты всех подписчиков автора,
+    который перестал быть популярным: пока его посты подмешивались при
+    чтении, они не раскладывались по лентам, а новые подписчики не
+    получали его постов."""
+    if is_popular(author_id):
+        return
+    followers = Follow.objects.filter(author=author_id).values_list(
+        'user_id', flat=True)
+    fill_timelines(followers.iterator(), author_id)
+    bump_feed_version()
+
+
+def prune_timeline(user, author):
+    """Функция prune_timeline удаляет из ленты пользователя посты автора,
+    от которого он отписался. Если после отписки число подписчиков автора
+    опустилось ниже TIMELINE_FANOUT_LIMIT, ленты остальных подписчиков
+    заполняются его постами."""
+    TimelineEntry.objects.filter(user=user, post__author=author).delete()
+    followers = Follow.objects.filter(author=author)
+    if followers[:settings.TIMELINE_FANOUT_LIMIT].count() == (
+            settings.TIMELINE_FANOUT_LIMIT - 1):
+        refill_timelines.delay(author)
+
+
+def popular_authors(user):
+    """Функция popular_authors возвращает id популярных авторов, на которых
+    подписан пользователь."""
+    authors = Follow.objects.filter(user=user).values('author')
+    return list(User.objects.filter(pk__in=authors).annotate(
+        followers=Count('following')).filter(
+        followers__gte=settings.TIMELINE_FANOUT_LIMIT).values_list(
+        'pk', flat=True))
+
+
+def _timeline_condition(condition):
+    """Функция _timeline_condition переводит условие на ключ поста
+    (pub_date, pk) в условие на записи ленты, где id поста - post_id."""
+    translated = Q()
+    translated.connector = condition.connector
+    translated.negated = condition.negated
+    for child in condition.children:
+        if isinstance(child, Q):
+            child = _timeline_condition(child)
+        elif child[0] == 'pk' or child[0].startswith('pk__'):
+            child = ('post_id' + child[0][2:], child[1])
+        translated.children.append(child)
+    return translated
+
+
+class FollowFeed:
+    """Лента подписок для Paginator и KeysetPaginator. Записи
+    материализованной ленты пользователя читаются по индексу
+    (user, pub_date, post), посты популярных авторов - по индексу
+    (author, pub_date) (fan-out-on-read). Ключи (pub_date, id) постов
+    сливаются без сортировки в БД, и читаются только посты среза; пост,
+    который есть и в ленте, и среди постов популярного автора, выводится
+    один раз."""
+
+    def __init__(self, user, authors=None, condition=None, reverse=False):
+        self.user = user
+        self.authors = popular_authors(user) if authors is None else authors
+        self.condition = condition or Q()
+        self.reversed = reverse
+
+    def _clone(self, **kwargs):
+        options = {'authors': self.authors, 'condition': self.condition,
+                   'reverse': self.reversed, **kwargs}
+        return FollowFeed(self.user, **options)
+
+    def order_by(self, *fields):
+        # Лента всегда упорядочена по (-pub_date, -id) поста
+        return self
+
+    def filter(self, condition):
+        return self._clone(condition=self.condition & condition)
+
+    def reverse(self):
+        return self._clone(reverse=not self.reversed)
+
+    def _order(self, *fields):
+        return [field if self.reversed else f'-{field}' for field in fields]
+
+    def sources(self):
+        """Возвращает выборки ключей (pub_date, id поста): ленту
+        пользователя и посты каждого популярного автора."""
+        timeline = TimelineEntry.objects.filter(user=self.user).filter(
+            _timeline_condition(self.condition)).values_list('pub_date',
+                                                             'post_id')
+        yield timeline.order_by(*self._order('pub_date', 'post_id'))
+        for author in self.authors:
+            yield Post.objects.filter(author=author).filter(
+                self.condition).order_by(
+                *self._order('pub_date', 'pk')).values_list('pub_date', 'pk')
+
+    def count(self):
+        count = TimelineEntry.objects.filter(user=self.user).filter(
+            _timeline_condition(self.condition)).count()
+        if self.authors:
+            count += Post.objects.filter(author__in=self.authors).filter(
+                self.condition).count()
+            count -= TimelineEntry.objects.filter(
+                user=self.user, post__author__in=self.authors).filter(
+                _timeline_condition(self.condition)).count()
+        return count
+
+    def __len__(self):
+        return self.count()
+
+    def keys(self, start, stop):
+        """Возвращает ключи ленты с start по stop. Без популярных авторов
+        источник один, и смещение выполняется в БД. Иначе каждый ключ среза
+        лежит среди первых stop ключей своего источника, поэтому из каждого
+        источника читается до stop строк: такие ленты листаются курсором
+        (см. views.follow_index), где start равен нулю."""
+        sources = list(self.sources())
+        if len(sources) == 1:
+            return list(sources[0][start:stop])
+        keys = []
+        for key in heapq.merge(*(list(source[:stop]) for source in sources),
+                               reverse=not self.reversed):
+            if not keys or keys[-1] != key:
+                keys.append(key)
+        return keys[start:stop]
+
+    def _slice(self, start, stop):
+        ids = [pk for _, pk in self.keys(start, stop)]
+        posts = Post.objects.select_related('author', 'group').in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self._slice(index, index + 1)[0]
+        start, stop = index.start or 0, index.stop
+        if stop is None:
+            stop = self.count()
+        # Посты читаются при выводе страницы, а не при попадании в кэш
+        # фрагмента
+        return SimpleLazyObject(lambda: self._slice(start, stop))
+
+
+def follow_feed(user):
+    """Функция follow_feed возвращает ленту подписок пользователя."""
+    return FollowFeed(user)
@@ -1,94 +1,214 @@
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.http import HttpResponseBadRequest, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.utils.http import urlencode
 
-from .common import page_list
+from core.db.router import replica_reads
+
+from .common import (KeysetPaginator, author_feed, index_feed, page_list,
+                     post_comments_list)
+from .conditional import (feed_validators, last_post_validators, latest,
+                          page_key)
+from .counters import get_stats
+from .export import FORMATS, ExportError, export_chunks
 from .forms import CommentForm, PostForm
-from .models import Comment, Follow, Group, Post
+from .groups import GroupFeed, get_group
+from .pages import page_response
+from .popular import PopularFeed
+from .fragments import feed_cache_context, feed_changed_at
+from .models import Comment, Follow, Post
+from .search import search_posts
+from .tasks import notify_post_author
+from .thumbnails import (enqueue_thumbnail, page_thumbnails,
+                         resolve_thumbnails)
+from .timeline import follow_feed
 
 User = get_user_model()
 
 
+@replica_reads
 def index(request):
     """Функция index передает словарь context в шаблон posts/index.html.
      В словаре хранится выборка из кол-ва постов равных значению
      COUNT_OF_POSTS, сгруппированная по убыванию даты.
      Также в context передается значение поля title страницы html.
+     Страница отдается из кэша, пока не изменятся ленты (см. posts/pages.py).
      """
-    post_list = Post.objects.select_related('author', 'group').all()
-    page_obj = page_list(request, post_list)
-    title = 'Последние обновления на сайте'
-    context = {
-        'page_obj': page_obj,
-        'title': title,
-    }
-    return render(request, 'posts/index.html', context)
+    post_list = index_feed()
+    key, last_modified = feed_validators(request, post_list)
+
+    def build():
+        return {
+            'page_obj': page_thumbnails(page_list(request, post_list)),
+            'title': 'Последние обновления на сайте',
+            **feed_cache_context(),
+        }
+    return page_response(request, key, last_modified, 'posts/index.html',
+                         build)
+
 
+@replica_reads
+def popular(request):
+    """Функция popular передает словарь context в шаблон posts/popular.html.
+    В словаре хранится страница постов с наибольшей вовлеченностью:
+    комментарии и свежесть поста затухают со временем (см. posts/popular.py).
+    Список постов читается из кэша, без обхода комментариев. Версия
+    списка меняется при каждом комментарии, поэтому входит в ключ
+    страницы вместе с id постов: на странице выводятся их счетчики
+    комментариев."""
+    post_list = PopularFeed()
+    key = page_key(request, post_list.ids, post_list.state['version'])
+    last_modified = latest([post_list.changed_at, feed_changed_at()])
 
+    def build():
+        return {
+            'page_obj': page_thumbnails(
+                page_list(request, post_list, keyset=False)),
+            'title': 'Популярное',
+            'popular_version': post_list.state['version'],
+            **feed_cache_context(),
+        }
+    return page_response(request, key, last_modified, 'posts/popular.html',
+                         build)
+
+
+@replica_reads
 def group_posts(request, slug):
     """Функция group_posts передает словарь context в шаблон
     posts/group_list.html. В словаре хранится выборка из кол-ва постов равных
     значению COUNT_OF_POSTS, отфильтрованная по наименованию группы и
-    сгруппированная по убыванию даты. Функция проверяет наличие соответствующей
-    группы в БД по значению slug в запросе. Также в context передается значение
+    сгруппированная по убыванию даты. Группа берется из кэша групп, а первые
+    страницы ленты - из списков id, которые обновляются при изменении
+    постов (см. posts/groups.py). Также в context передается значение
     поля title страницы html.
      """
-    group = get_object_or_404(Group, slug=slug)
-    post_group_list = group.posts.select_related('author').all()
-    page_obj = page_list(request, post_group_list)
-    title = 'Записи сообщества:'
+    group = get_group(slug)
+    post_group_list = GroupFeed(group)
+    key, last_modified = last_post_validators(request,
+                                              post_group_list.last_pub_date)
+
+    def build():
+        return {
+            'page_obj': page_thumbnails(page_list(request, post_group_list)),
+            'group': group,
+            'title': 'Записи сообщества:',
+            **feed_cache_context(),
+        }
+    return page_response(request, key, last_modified, 'posts/group_list.html',
+                         build)
+
+
+def search(request):
+    """Функция search передает словарь context в шаблон posts/search.html.
+    В словаре хранится страница постов, найденных по запросу ?q= в тексте
+    постов и комментариях, отсортированных по релевантности."""
+    query = request.GET.get('q', '').strip()
+    page_obj = page_thumbnails(
+        page_list(request, search_posts(query), keyset=False))
     context = {
         'page_obj': page_obj,
-        'group': group,
-        'title': title,
+        'query': query,
+        'page_query': urlencode({'q': query}) + '&',
+        'title': 'Поиск',
     }
-    return render(request, 'posts/group_list.html', context)
+    return render(request, 'posts/search.html', context)
 
 
+@replica_reads
 def profile(request, username):
     """Функция profile передает словарь context в шаблон posts/profile.html
-       все посты пользователя."""
+       все посты пользователя. Количество постов и подписчиков берется из
+       денормализованных счетчиков UserStats, кнопка подписки рисуется для
+       каждого пользователя отдельно поверх закэшированной страницы."""
     author = get_object_or_404(User, username=username)
-    post_author = author.posts.prefetch_related('group').all()
-    count_posts = post_author.count()
-    page_obj = page_list(request, post_author)
-    following = request.user.is_authenticated and Follow.objects.filter(
-        user=request.user, author=author).exists()
-    context = {
-        'author': author,
-        'page_obj': page_obj,
-        'count_posts': count_posts,
-        'following': following,
-    }
-    return render(request, 'posts/profile.html', context)
+    post_author = author_feed(author)
+    key, last_modified = feed_validators(request, post_author)
+
+    def build():
+        stats = get_stats(author)
+        page_obj = page_thumbnails(
+            page_list(request, post_author, count=stats.posts_count))
+        return {
+            'author': author,
+            'page_obj': page_obj,
+            'count_posts': stats.posts_count,
+            'stats': stats,
+            **feed_cache_context(),
+        }
+    return page_response(request, key, last_modified, 'posts/profile.html',
+                         build)
+
+
+def comments_page(request, post_id):
+    """Функция comments_page возвращает страницу комментариев поста,
+    следующую за курсором ?cursor=, по COMMENTS_PER_PAGE штук."""
+    paginator = KeysetPaginator(post_comments_list(post_id),
+                                settings.COMMENTS_PER_PAGE, field='created')
+    return paginator.get_page(request.GET.get('cursor'))
 
 
 def post_detail(request, post_id):
     """Функция post_detail передает словарь context в шаблон
-       posts/post_detail.html всю информацию о конкретном посте."""
-    post = get_object_or_404(Post, pk=post_id)
-    form = CommentForm()
-    comments = Comment.objects.filter(post=post_id).select_related('author')
-    count_posts = Post.objects.filter(author=post.author).count()
+       posts/post_detail.html всю информацию о конкретном посте и первую
+       страницу комментариев; следующие подгружаются из post_comments.
+       Пост, автор, группа, счетчики автора и дата последнего комментария
+       читаются одним запросом, комментарии - вторым, только если
+       страницы этой версии нет в кэше."""
+    last_comment = Comment.objects.filter(
+        post=OuterRef('pk')).order_by('-created').values('created')[:1]
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'author__stats', 'group')
+        .annotate(last_comment=Subquery(last_comment)),
+        pk=post_id)
+    count_posts = get_stats(post.author).posts_count
+    key = page_key(request, post.updated, post.comments_count,
+                   post.last_comment, count_posts)
+
+    def build():
+        resolve_thumbnails([post])
+        return {
+            'post': post,
+            'post_id': post.pk,
+            'count_posts': count_posts,
+            'form': CommentForm(),
+            'comments': comments_page(request, post.pk),
+            **feed_cache_context(),
+        }
+    return page_response(request, key,
+                         latest([post.updated, post.last_comment]),
+                         'posts/post_detail.html', build)
+
+
+def post_comments(request, post_id):
+    """Функция post_comments отдает фрагмент posts/includes/comments.html
+    со следующей страницей комментариев поста для подгрузки на странице
+    поста."""
+    get_object_or_404(Post.objects.only('pk'), pk=post_id)
     context = {
-        'post': post,
-        'count_posts': count_posts,
-        'form': form,
-        'comments': comments,
+        'post_id': post_id,
+        'comments': comments_page(request, post_id),
     }
-    return render(request, 'posts/post_detail.html', context)
+    return render(request, 'posts/includes/comments.html', context)
 
 
 @login_required
+@transaction.atomic
 def post_create(request):
     """Функция post_create передает форму PostForm в шаблон
-       posts/create_post.html для создания нового поста."""
+       posts/create_post.html для создания нового поста. Миниатюра
+       картинки строится в фоне."""
     title = 'Новый пост'
     form = PostForm(request.POST or None, files=request.FILES or None)
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        enqueue_thumbnail(post)
         return redirect('posts:profile', username=post.author)
     return render(request, 'posts/create_post.html',
                   {'form': form, 'title': title})
@@ -104,7 +224,12 @@ def post_edit(request, post_id):
     form = PostForm(request.POST or None, files=request.FILES or None,
                     instance=post)
     if form.is_valid():
-        form.save()
+        post = form.save(commit=False)
+        if 'image' in form.changed_data:
+            post.image_thumbnail = ''
+        post.save()
+        if 'image' in form.changed_data:
+            enqueue_thumbnail(post)
         return redirect('posts:post_detail', post_id=post_id)
     context = {
         'title': 'Редактировать пост',
@@ -115,9 +240,11 @@ def post_edit(request, post_id):
 
 
 @login_required
+@transaction.atomic
 def add_comment(request, post_id):
     """Функция add_comment передает заполненную форму CommentForm в шаблон
-           posts/post_detail.html для создания нового комментария."""
+           posts/post_detail.html для создания нового комментария. Письмо
+           автору поста отправляется фоновой задачей."""
     post = get_object_or_404(Post, pk=post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
@@ -125,27 +252,38 @@ def add_comment(request, post_id):
         comment.author = request.user
         comment.post = post
         comment.save()
+        notify_post_author.delay(comment.pk)
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
+@replica_reads
 def follow_index(request):
     """Функция follow_index передает словарь context в шаблон
     posts/follow.html. В словаре хранится выборка из постов авторов на которых
-    подписан пользователь"""
+    подписан пользователь. Выборка читается из материализованной ленты
+    пользователя (см. posts/timeline.py). Ленту с постами популярных
+    авторов нельзя листать смещением без чтения всех предыдущих ключей
+    каждого источника, поэтому она всегда листается курсором."""
     user = request.user
-    post_follow_list = Post.objects.filter(
-        author__following__user=user).select_related('author', 'group')
-    page_obj = page_list(request, post_follow_list)
+    post_follow_list = follow_feed(user)
+    if post_follow_list.authors:
+        paginator = KeysetPaginator(post_follow_list, settings.COUNT_OF_POSTS)
+        page_obj = paginator.get_page(request.GET.get('cursor'))
+    else:
+        page_obj = page_list(request, post_follow_list)
+    page_obj = page_thumbnails(page_obj)
     title = 'Мои подписки'
     context = {
         'page_obj': page_obj,
         'title': title,
+        **feed_cache_context(),
     }
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
+@transaction.atomic
 def profile_follow(request, username):
     """Функция profile_follow создает в БД запись об имени пользователя и об
     авторе на которого подписался пользователь"""
@@ -157,6 +295,7 @@ def profile_follow(request, username):
 
 
 @login_required
+@transaction.atomic
 def profile_unfollow(request, username):
     """Функция profile_unfollow удаляет из БД запись об имени пользователя и об
        авторе на которого подписался пользователь"""
@@ -165,3 +304,28 @@ def profile_unfollow(request, username):
     unfollow_author = Follow.objects.filter(user=user, author=author)
     unfollow_author.delete()
     return redirect('posts:profile', username=username)
+
+
+@staff_member_required
+def export(request, table):
+    """Функция export потоково отдает сотрудникам выгрузку таблицы table
+    (posts, comments, follows, groups) в формате ?format=ndjson|csv,
+    при ?gzip=1 - сжатую. Фильтры: ?since=, ?until= (ГГГГ-ММ-ДД) и
+    ?author= (имя пользователя)."""
+    fmt = request.GET.get('format', 'ndjson')
+    compress = request.GET.get('gzip') == '1'
+    try:
+        chunks = export_chunks(
+            table, fmt=fmt, compress=compress,
+            since=request.GET.get('since'), until=request.GET.get('until'),
+            author=request.GET.get('author'))
+    except ExportError as error:
+        return HttpResponseBadRequest(str(error))
+    filename = f'{table}.{fmt}'
+    content_type = FORMATS[fmt]
+    if compress:
+        filename += '.gz'
+        content_type = 'application/gzip'
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
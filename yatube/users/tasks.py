@@ -0,0 +1,21 @@
+from django.contrib.auth import get_user_model
+from django.core.mail import send_mail
+
+from core.tasks import task
+
+User = get_user_model()
+
+
+@task
+def send_welcome_email(user_id):
+    """Задача send_welcome_email отправляет письмо новому пользователю."""
+    user = User.objects.filter(pk=user_id).first()
+    if user is None or not user.email:
+        return
+    send_mail(
+        'Добро пожаловать в Yatube',
+        f'{user.first_name or user.username}, вы зарегистрировались в '
+        f'Yatube под логином {user.username}.',
+        None,
+        [user.email],
+    )
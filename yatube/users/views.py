@@ -2,9 +2,17 @@ from django.urls import reverse_lazy
 from django.views.generic import CreateView
 
 from .forms import CreationForm
+from .tasks import send_welcome_email
 
 
 class SignUp(CreateView):
     form_class = CreationForm
     success_url = reverse_lazy('posts:index')
     template_name = 'users/signup.html'
+
+    def form_valid(self, form):
+        """Сохраняет пользователя и ставит в очередь приветственное
+        письмо."""
+        response = super().form_valid(form)
+        send_welcome_email.delay(self.object.pk)
+        return response
@@ -0,0 +1,20 @@
+"""
+ASGI config for yatube project.
+
+It exposes the ASGI callable as a module-level variable named
+``application``, e.g. for ``uvicorn yatube.asgi:application``.
+
+Django 2.2 has no native ASGI support, so the WSGI handler is served
+from a thread pool of ``ASGI_THREADS`` workers (see core/asgi.py).
+"""
+
+import os
+
+from django.conf import settings
+from django.core.wsgi import get_wsgi_application
+
+from core.asgi import ASGIHandler
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+application = ASGIHandler(get_wsgi_application(), settings.ASGI_THREADS)
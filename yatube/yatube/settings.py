@@ -48,11 +48,17 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Бюджет запросов к БД на запрос (см. QUERY_BUDGET)
+    'core.middleware.query_budget.QueryBudgetMiddleware',
+    # Чтение своих записей при работе с репликой (см. core/db/router.py)
+    'core.middleware.replica.PrimaryStickinessMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # Ограничение частоты записи (см. RATE_LIMITS)
+    'core.middleware.ratelimit.RateLimitMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -79,16 +85,48 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
+# ASGI-точка входа (uvicorn yatube.asgi:application): представления
+# выполняются в пуле из ASGI_THREADS потоков
+ASGI_APPLICATION = 'yatube.asgi.application'
+ASGI_THREADS = int(os.environ.get('ASGI_THREADS', 16))
 
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# SQLite с журналом WAL и настройками соединений из core/db/base.py;
+# PRAGMA в OPTIONS['pragmas'] дополняют и переопределяют настройки по
+# умолчанию. Соединения переиспользуются между запросами DB_CONN_MAX_AGE
+# секунд (0 - новое соединение на каждый запрос)
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'ENGINE': 'core.db',
+        'NAME': os.environ.get('DB_PATH', os.path.join(BASE_DIR,
+                                                       'db.sqlite3')),
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 600)),
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'pragmas': {},
+        },
     }
 }
+# Реплика для чтения лент: задается переменной окружения DB_REPLICA_PATH.
+# Ленты (index, group_posts, profile, follow_index) читают реплику, все
+# записи идут в основную базу, а пользователь, который только что писал,
+# REPLICA_STICKY_SECONDS секунд читает основную базу. Страницы и
+# фрагменты, прочитанные с реплики, хранятся в кэше не дольше
+# REPLICA_CACHE_TIMEOUT секунд. Миграции применяются только к основной
+# базе, а в тестах реплика - зеркало тестовой основной базы
+REPLICA_DATABASE = 'replica'
+if os.environ.get('DB_REPLICA_PATH'):
+    DATABASES[REPLICA_DATABASE] = {
+        **DATABASES['default'],
+        'NAME': os.environ['DB_REPLICA_PATH'],
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['core.db.router.PrimaryReplicaRouter']
+REPLICA_STICKY_COOKIE = 'read_primary'
+REPLICA_STICKY_SECONDS = 10
+REPLICA_CACHE_TIMEOUT = 60
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -132,7 +170,80 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 # CONSTANTS
 COUNT_OF_POSTS = 10
+# Комментариев на странице поста и в каждой подгружаемой порции
+COMMENTS_PER_PAGE = 20
 OUTPUT_ELEMENTS_OF_POSTS = 15
+# Режим паджинации лент: 'page' (?page=N) или 'keyset' (?cursor=...)
+PAGINATION_MODE = 'page'
+# Лента подписок: порог подписчиков, после которого посты автора не
+# раскладываются по лентам, а читаются напрямую; глубина заполнения ленты
+# при подписке и размер пачки вставки
+TIMELINE_FANOUT_LIMIT = 1000
+TIMELINE_BACKFILL = 1000
+TIMELINE_BATCH_SIZE = 300
+# Время жизни фрагментов лент в кэше; до его истечения фрагмент
+# инвалидируется сменой версии при изменении постов, групп и пользователей
+FEED_CACHE_TIMEOUT = 60 * 60 * 24
+# Ленты групп: первые GROUP_FEED_PAGES страниц хранятся в кэше списками id
+# постов, которые обновляются при создании, переносе и удалении постов;
+# GROUP_FEED_TIMEOUT ограничивает жизнь списка, если обновление пропущено
+GROUP_FEED_PAGES = 5
+GROUP_FEED_TIMEOUT = 60 * 60
+# Вкладка "Популярное" (posts/popular.py): вклад поста и его комментариев
+# затухает вдвое за POPULAR_HALF_LIFE секунд; показываются до POPULAR_SIZE
+# постов с вовлеченностью не ниже POPULAR_MIN_ENGAGEMENT. Список хранится
+# в кэше POPULAR_TIMEOUT секунд и перестраивается командой update_popular
+POPULAR_HALF_LIFE = 60 * 60 * 24
+POPULAR_POST_WEIGHT = 1
+POPULAR_COMMENT_WEIGHT = 1
+POPULAR_MIN_ENGAGEMENT = 0.1
+POPULAR_SIZE = 100
+POPULAR_TIMEOUT = 60 * 60
+# Cache-Control публичных страниц для анонимов: сколько секунд страницу
+# хранит браузер без проверки и сколько - обратный прокси
+PAGE_MAX_AGE = 0
+PAGE_PROXY_MAX_AGE = 60
+# Время жизни целых страниц лент и постов в кэше; ключ страницы включает
+# версию лент, поэтому устаревшие страницы просто перестают читаться;
+# 0 выключает кэш страниц
+PAGE_CACHE_TIMEOUT = 60 * 60
+# Поиск по постам и комментариям: 'auto' - FTS5, если SQLite собран с
+# ним, иначе обратный индекс в таблице SearchTerm; 'fts5' или 'python'
+# задают бэкенд явно. Совпадения в комментариях весят меньше, чем в тексте
+SEARCH_BACKEND = 'auto'
+SEARCH_COMMENT_WEIGHT = 0.5
+
+# Бюджет запросов к БД на один запрос: представления, выполнившие больше
+# QUERY_BUDGET запросов (или больше указанного для них в QUERY_BUDGET_VIEWS)
+# либо потратившие на запросы больше QUERY_TIME_BUDGET_MS миллисекунд,
+# попадают в лог yatube.queries
+QUERY_BUDGET = 10
+QUERY_BUDGET_VIEWS = {
+    # Создание поста и подписка обновляют счетчики и ленты подписчиков
+    'posts:post_create': 20,
+    # Комментарий обновляет счетчик и рейтинг поста, а письмо автору
+    # поста отправляется после фиксации в том же запросе
+    'posts:add_comment': 15,
+    'posts:profile_follow': 30,
+}
+QUERY_TIME_BUDGET_MS = 200
+
+# Ограничение частоты запросов (core/ratelimit.py): у каждого пользователя
+# (анонима или при 'key': 'ip' - IP-адреса) для представления есть корзина
+# из burst запросов, пополняемая со скоростью rate; запросы методами
+# methods (по умолчанию POST) сверх нее получают ответ 429. Адрес клиента
+# берется из RATE_LIMIT_IP_HEADER (за прокси - 'HTTP_X_FORWARDED_FOR')
+RATE_LIMIT_ENABLED = True
+RATE_LIMIT_IP_HEADER = 'REMOTE_ADDR'
+RATE_LIMITS = {
+    'posts:post_create': {'rate': '30/h', 'burst': 5},
+    'posts:add_comment': {'rate': '10/m', 'burst': 10},
+    'posts:profile_follow': {'rate': '30/m', 'burst': 30,
+                             'methods': ['GET', 'POST']},
+    'posts:profile_unfollow': {'rate': '30/m', 'burst': 30,
+                               'methods': ['GET', 'POST']},
+    'users:signup': {'rate': '10/h', 'burst': 3, 'key': 'ip'},
+}
 
 # USER AUTH URL
 LOGIN_URL = 'users:login'
@@ -145,9 +256,74 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'yatube': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+        },
+    },
+}
+
+# Миниатюры картинок постов строятся при загрузке пулом из
+# THUMBNAIL_WORKERS потоков (0 - сразу в запросе), а при TASKS_BACKEND =
+# 'database' - воркерами очереди задач
+POST_THUMBNAIL_GEOMETRY = '1200x600'
+POST_THUMBNAIL_OPTIONS = {'crop': 'center', 'upscale': True}
+THUMBNAIL_WORKERS = 2
+
+# Фоновые задачи (core/tasks.py): 'immediate' - выполнять в запросе после
+# фиксации его транзакции, 'database' - складывать в таблицу Task для
+# воркеров (python manage.py run_workers). Упавшая задача повторяется до
+# TASK_MAX_ATTEMPTS раз с паузой TASK_RETRY_DELAY секунд, удваивающейся
+# с каждой попыткой; задача, выполняемая дольше TASK_TIMEOUT секунд,
+# возвращается в очередь
+TASKS_BACKEND = os.environ.get('TASKS_BACKEND', 'immediate')
+TASK_MAX_ATTEMPTS = 3
+TASK_RETRY_DELAY = 10
+TASK_TIMEOUT = 60 * 5
+TASK_POLL_INTERVAL = 1.0
+TASK_CLAIM_BATCH = 10
+
 # CACHES
-CACHES = {
-    'default': {
+# Общий для всех воркеров кэш. Переменная окружения CACHE_BACKEND выбирает
+# бэкенд: 'sqlite' (по умолчанию, без внешних сервисов), 'file',
+# 'memcached', 'redis' (нужен пакет django-redis) или 'locmem'. Тесты
+# работают с locmem (yatube/settings_test.py)
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'sqlite')
+CACHE_DIR = os.environ.get('CACHE_DIR', os.path.join(BASE_DIR, 'cache'))
+CACHE_BACKENDS = {
+    'sqlite': {
+        'BACKEND': 'core.cache.sqlite.SQLiteCache',
+        'LOCATION': os.path.join(CACHE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {'MAX_ENTRIES': 10000, 'CULL_EVERY': 100},
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CACHE_DIR,
+    },
+    'memcached': {
+        'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+        'LOCATION': os.environ.get('CACHE_LOCATION', '127.0.0.1:11211'),
+    },
+    'redis': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': os.environ.get('CACHE_LOCATION',
+                                   'redis://127.0.0.1:6379/1'),
+    },
+    'locmem': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+    },
+}
+CACHES = {
+    'default': CACHE_BACKENDS[CACHE_BACKEND],
 }
+# Сессии читаются из общего кэша, а БД остается источником истины
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
@@ -0,0 +1,11 @@
+"""Настройки для тестов (manage.py test и pytest).
+
+Тесты очищают кэш, поэтому работают с locmem и не задевают общий кэш
+разработчика или сайта.
+"""
+
+from .settings import *  # noqa: F401,F403
+from .settings import CACHE_BACKENDS
+
+CACHE_BACKEND = 'locmem'
+CACHES = {'default': CACHE_BACKENDS[CACHE_BACKEND]}
@@ -20,6 +20,7 @@ from django.urls import include, path
 
 urlpatterns = [
     path('', include('posts.urls', namespace='posts')),
+    path('api/v1/', include('posts.api_urls', namespace='api')),
     path('about/', include('about.urls', namespace='about')),
     path('admin/', admin.site.urls),
     path('auth/', include('users.urls', namespace='users')),